@@ -0,0 +1,5 @@
+"""Benchmarks of the request paths against a local stand-in of the API.
+
+See :mod:`benchmarks.run` for the benchmarks and :mod:`benchmarks.server`
+for the server, which can also be run on its own.
+"""
@@ -0,0 +1,337 @@
+"""Payloads served by the benchmark server.
+
+Every endpoint of the wrapper has a route here returning a payload shaped
+like the real response. Payloads are synthesized deterministically from the
+request path, their list lengths multiplied by a size scale, unless a
+recorded payload of the route exists in the fixtures directory (see
+:func:`record`), in which case it is served as is.
+"""
+
+import gzip
+import json
+import os
+import random
+import re
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+DAY = 86400
+START = 1577836800  # 2020-01-01
+
+CHAINS = ['Ethereum', 'Arbitrum', 'BSC', 'Polygon', 'Optimism', 'Base', 'Avalanche', 'Solana']
+CATEGORIES = ['Dexes', 'Lending', 'CDP', 'Yield', 'Bridge', 'Liquid Staking']
+
+Query = Dict[str, List[str]]
+
+
+def _count(base: int, scale: float) -> int:
+    return max(1, int(base * scale))
+
+
+def _series(rng: random.Random, days: int, key: str, date: str = 'date') -> List[Dict]:
+    return [{date: START + day * DAY, key: rng.uniform(1e6, 1e9)} for day in range(days)]
+
+
+def _pairs(rng: random.Random, days: int) -> List[List]:
+    return [[START + day * DAY, rng.uniform(1e5, 1e8)] for day in range(days)]
+
+
+def _coins(path: str) -> List[str]:
+    return [coin for coin in unquote(path).split(',') if coin]
+
+
+def _quote(rng: random.Random, coin: str) -> Dict[str, any]:
+    return {'price': rng.uniform(0.01, 5000), 'symbol': coin.split(':')[-1][:6].upper(),
+            'timestamp': START + rng.randrange(1000) * DAY, 'confidence': 0.99, 'decimals': 18}
+
+
+def protocol(rng: random.Random, index: int) -> Dict[str, any]:
+    chains = rng.sample(CHAINS, rng.randint(1, 4))
+    return {
+        'id': str(index), 'name': f'Protocol {index}', 'address': None,
+        'symbol': f'P{index}', 'url': f'https://protocol{index}.example',
+        'description': 'Synthetic protocol', 'chain': chains[0], 'logo': None,
+        'audits': '2', 'audit_note': None, 'gecko_id': f'protocol-{index}',
+        'cmcId': None, 'category': rng.choice(CATEGORIES), 'chains': chains,
+        'module': f'protocol-{index}', 'twitter': None,
+        'forkedFrom': rng.choice([[], ['Uniswap V2'], ['Compound V2']]),
+        'oracles': rng.sample(['Chainlink', 'Pyth', 'RedStone'], rng.randint(0, 2)),
+        'listedAt': START + rng.randrange(1500) * DAY, 'slug': f'protocol-{index}',
+        'tvl': rng.uniform(1e4, 1e10),
+        'chainTvls': {chain: rng.uniform(1e4, 1e9) for chain in chains},
+        'change_1h': rng.uniform(-2, 2), 'change_1d': rng.uniform(-10, 10),
+        'change_7d': rng.uniform(-30, 30), 'mcap': rng.uniform(1e6, 1e10),
+    }
+
+
+def pool(rng: random.Random, index: int) -> Dict[str, any]:
+    apy_base = rng.uniform(0, 20)
+    apy_reward = rng.choice([None, rng.uniform(0, 10)])
+    return {
+        'pool': f'{index:08x}-0000-4000-8000-{index:012x}', 'chain': rng.choice(CHAINS),
+        'project': f'protocol-{rng.randrange(500)}', 'symbol': rng.choice(['USDC', 'WETH', 'USDT-DAI']),
+        'tvlUsd': rng.uniform(1e3, 1e9), 'apyBase': apy_base, 'apyReward': apy_reward,
+        'apy': apy_base + (apy_reward or 0), 'rewardTokens': None if apy_reward is None else ['0xabc'],
+        'apyPct1D': rng.uniform(-1, 1), 'apyPct7D': rng.uniform(-3, 3), 'apyPct30D': rng.uniform(-5, 5),
+        'stablecoin': rng.random() < 0.3, 'ilRisk': rng.choice(['no', 'yes']),
+        'exposure': rng.choice(['single', 'multi']),
+        'predictions': {'predictedClass': 'Stable/Up', 'predictedProbability': 70, 'binnedConfidence': 2},
+        'poolMeta': None, 'mu': apy_base, 'sigma': 0.1, 'count': 700, 'outlier': False,
+        'underlyingTokens': ['0xdef'], 'il7d': None, 'apyBase7d': None, 'apyMean30d': apy_base,
+        'volumeUsd1d': None, 'volumeUsd7d': None, 'apyBaseInception': None,
+    }
+
+
+def _summary(rng: random.Random, index: int) -> Dict[str, any]:
+    chains = rng.sample(CHAINS, rng.randint(1, 3))
+    return {
+        'name': f'Protocol {index}', 'disabled': False, 'displayName': f'Protocol {index}',
+        'module': f'protocol-{index}', 'category': rng.choice(CATEGORIES), 'logo': None,
+        'change_1d': rng.uniform(-10, 10), 'change_7d': rng.uniform(-30, 30),
+        'change_1m': rng.uniform(-50, 50), 'total24h': rng.uniform(1e3, 1e9),
+        'total48hto24h': rng.uniform(1e3, 1e9), 'total7d': rng.uniform(1e4, 1e10),
+        'total30d': rng.uniform(1e5, 1e11), 'totalAllTime': rng.uniform(1e6, 1e12),
+        'breakdown24h': {chain: {f'protocol-{index}': rng.uniform(1e3, 1e8)} for chain in chains},
+        'chains': chains, 'protocolType': 'protocol', 'latestFetchIsOk': True,
+    }
+
+
+def _overview(rng: random.Random, scale: float, query: Query) -> Dict[str, any]:
+    charts = query.get('excludeTotalDataChart', ['false'])[0] != 'true'
+    return {
+        'totalDataChart': _pairs(rng, _count(1000, scale)) if charts else [],
+        'totalDataChartBreakdown': [],
+        'protocols': [_summary(rng, index) for index in range(_count(800, scale))],
+        'allChains': CHAINS, 'chain': None, 'total24h': 1e9, 'total7d': 7e9,
+    }
+
+
+def _detail(rng: random.Random, scale: float, name: str) -> Dict[str, any]:
+    summary = _summary(rng, 0)
+    summary.update(name=name, totalDataChart=_pairs(rng, _count(1000, scale)),
+                   totalDataChartBreakdown=[])
+    return summary
+
+
+def _stablecoin(rng: random.Random, index: int) -> Dict[str, any]:
+    amount = {'peggedUSD': rng.uniform(1e6, 1e11)}
+    return {
+        'id': str(index), 'name': f'Stable {index}', 'symbol': f'S{index}', 'gecko_id': None,
+        'pegType': 'peggedUSD', 'pegMechanism': rng.choice(['fiat-backed', 'crypto-backed']),
+        'priceSource': 'defillama', 'circulating': amount, 'circulatingPrevDay': amount,
+        'circulatingPrevWeek': amount, 'circulatingPrevMonth': amount,
+        'chainCirculating': {chain: {'current': amount} for chain in rng.sample(CHAINS, 3)},
+        'chains': CHAINS[:3], 'price': rng.uniform(0.98, 1.02),
+    }
+
+
+def _bridge(rng: random.Random, index: int) -> Dict[str, any]:
+    return {
+        'id': index, 'name': f'bridge-{index}', 'displayName': f'Bridge {index}', 'icon': None,
+        'volumePrevDay': rng.uniform(1e5, 1e9), 'volumePrev2Day': rng.uniform(1e5, 1e9),
+        'lastHourlyVolume': rng.uniform(1e3, 1e7), 'currentDayVolume': rng.uniform(1e5, 1e9),
+        'lastDailyVolume': rng.uniform(1e5, 1e9), 'dayBeforeLastVolume': rng.uniform(1e5, 1e9),
+        'weeklyVolume': rng.uniform(1e6, 1e10), 'monthlyVolume': rng.uniform(1e7, 1e11),
+        'chains': rng.sample(CHAINS, 3), 'destinationChain': 'false',
+    }
+
+
+def _transaction(rng: random.Random, timestamp: int) -> Dict[str, any]:
+    return {
+        'tx_hash': f'0x{rng.getrandbits(256):064x}', 'ts': timestamp,
+        'tx_block': 15000000 + timestamp // 12, 'tx_from': '0xfrom', 'tx_to': '0xto',
+        'token': '0xtoken', 'amount': str(rng.randrange(10 ** 20)), 'is_deposit': True,
+        'chain': 'ethereum', 'bridge_name': 'bridge-1', 'usd_value': str(rng.uniform(1, 1e6)),
+        'sourceChain': 'ethereum',
+    }
+
+
+def _transactions(rng: random.Random, scale: float, query: Query) -> List[Dict[str, any]]:
+    start = int(query.get('starttimestamp', [START])[0])
+    end = int(query.get('endtimestamp', [start + DAY])[0])
+    limit = int(query.get('limit', [100])[0])
+    # One transaction every 10 minutes, the newest first
+    step = max(1, int(600 / scale))
+    timestamps = range(end - (end - start) % step, start - 1, -step)
+
+    return [_transaction(rng, timestamp) for timestamp in list(timestamps)[:limit]]
+
+
+def _chart(rng: random.Random, coins: List[str], query: Query, scale: float) -> Dict[str, any]:
+    span = int(query.get('span', [0])[0] or _count(100, scale))
+    period = query.get('period', ['24h'])[0]
+    step = int(period[:-1]) * {'m': 60, 'h': 3600, 'd': DAY, 'w': 7 * DAY}[period[-1].lower()]
+    start = int(query.get('start', [0])[0] or int(query.get('end', [START])[0]) - span * step)
+
+    return {'coins': {coin: {'symbol': 'TKN', 'confidence': 0.99, 'decimals': 18,
+                             'prices': [{'timestamp': start + index * step,
+                                         'price': rng.uniform(1, 5000)} for index in range(span)]}
+                      for coin in coins}}
+
+
+def _batch(rng: random.Random, query: Query) -> Dict[str, any]:
+    coins = json.loads(query.get('coins', ['{}'])[0])
+
+    return {'coins': {coin: {'symbol': 'TKN', 'prices': [
+        {'timestamp': int(timestamp), 'price': rng.uniform(1, 5000), 'confidence': 0.99}
+        for timestamp in timestamps]} for coin, timestamps in coins.items()}}
+
+
+def _signatures(query: Query) -> Dict[str, any]:
+    signatures = {}
+    for key in ('functions', 'events'):
+        for signature in ','.join(query.get(key, [])).split(','):
+            if signature:
+                signatures[signature] = {'name': 'transfer', 'signature': 'transfer(address,uint256)',
+                                         'verified': True}
+    return signatures
+
+
+# (host, path pattern, generator of (rng, scale, groups, query))
+ROUTES: List[Tuple[str, str, Callable]] = [
+    # api.llama.fi: tvl, volumes, fees_revenue
+    ('api.llama.fi', r'/protocols', lambda rng, scale, groups, query:
+        [protocol(rng, index) for index in range(_count(3000, scale))]),
+    ('api.llama.fi', r'/protocol/([^/]+)', lambda rng, scale, groups, query: dict(
+        protocol(rng, 0), name=groups[0], tvl=_series(rng, _count(1000, scale), 'totalLiquidityUSD'),
+        chainTvls={chain: {'tvl': _series(rng, _count(1000, scale), 'totalLiquidityUSD'),
+                           'tokens': None, 'tokensInUsd': None} for chain in CHAINS[:2]})),
+    ('api.llama.fi', r'/tvl/([^/]+)', lambda rng, scale, groups, query: rng.uniform(1e6, 1e10)),
+    ('api.llama.fi', r'/chains', lambda rng, scale, groups, query: [
+        {'gecko_id': None, 'tvl': rng.uniform(1e6, 1e11), 'tokenSymbol': chain[:3].upper(),
+         'cmcId': None, 'name': chain, 'chainId': index} for index, chain in enumerate(CHAINS)]),
+    ('api.llama.fi', r'/charts(?:/([^/]+))?', lambda rng, scale, groups, query:
+        [{'date': str(point['date']), 'totalLiquidityUSD': point['totalLiquidityUSD']}
+         for point in _series(rng, _count(1500, scale), 'totalLiquidityUSD')]),
+    ('api.llama.fi', r'/v2/historicalChainTvl(?:/([^/]+))?', lambda rng, scale, groups, query:
+        _series(rng, _count(1500, scale), 'tvl')),
+    ('api.llama.fi', r'/overview/(?:dexs|options|fees)(?:/([^/]+))?', lambda rng, scale, groups, query:
+        _overview(rng, scale, query)),
+    ('api.llama.fi', r'/summary/(?:dexs|options|fees)/([^/]+)', lambda rng, scale, groups, query:
+        _detail(rng, scale, groups[0])),
+    # coins.llama.fi
+    ('coins.llama.fi', r'/prices/(?:current|first|historical/\d+)/([^/]+)', lambda rng, scale, groups, query:
+        {'coins': {coin: _quote(rng, coin) for coin in _coins(groups[0])}}),
+    ('coins.llama.fi', r'/batchHistorical', lambda rng, scale, groups, query: _batch(rng, query)),
+    ('coins.llama.fi', r'/chart/([^/]+)', lambda rng, scale, groups, query:
+        _chart(rng, _coins(groups[0]), query, scale)),
+    ('coins.llama.fi', r'/percentage/([^/]+)', lambda rng, scale, groups, query:
+        {'coins': {coin: rng.uniform(-10, 10) for coin in _coins(groups[0])}}),
+    ('coins.llama.fi', r'/block/([^/]+)/(\d+)', lambda rng, scale, groups, query:
+        {'height': 15000000 + int(groups[1]) // 12, 'timestamp': int(groups[1])}),
+    # yields.llama.fi
+    ('yields.llama.fi', r'/pools', lambda rng, scale, groups, query:
+        {'status': 'success', 'data': [pool(rng, index) for index in range(_count(15000, scale))]}),
+    ('yields.llama.fi', r'/chart/([^/]+)', lambda rng, scale, groups, query: {'status': 'success', 'data': [
+        {'timestamp': f"{time_string(START + day * DAY)}", 'tvlUsd': rng.uniform(1e3, 1e9),
+         'apy': rng.uniform(0, 20), 'apyBase': rng.uniform(0, 20), 'apyReward': None,
+         'il7d': None, 'apyBase7d': None} for day in range(_count(700, scale))]}),
+    # stablecoins.llama.fi
+    ('stablecoins.llama.fi', r'/stablecoins', lambda rng, scale, groups, query:
+        {'peggedAssets': [_stablecoin(rng, index) for index in range(_count(150, scale))]}),
+    ('stablecoins.llama.fi', r'/stablecoincharts/([^/]+)', lambda rng, scale, groups, query: [
+        {'date': str(START + day * DAY), 'totalCirculating': {'peggedUSD': rng.uniform(1e9, 1e11)},
+         'totalCirculatingUSD': {'peggedUSD': rng.uniform(1e9, 1e11)}}
+        for day in range(_count(1500, scale))]),
+    ('stablecoins.llama.fi', r'/stablecoin/(\d+)', lambda rng, scale, groups, query: dict(
+        _stablecoin(rng, int(groups[0])), tokens=[
+            {'date': START + day * DAY, 'circulating': {'peggedUSD': rng.uniform(1e9, 1e11)}}
+            for day in range(_count(1000, scale))])),
+    ('stablecoins.llama.fi', r'/stablecoinchains', lambda rng, scale, groups, query: [
+        {'gecko_id': None, 'totalCirculatingUSD': {'peggedUSD': rng.uniform(1e6, 1e11)},
+         'tokenSymbol': None, 'name': chain} for chain in CHAINS]),
+    ('stablecoins.llama.fi', r'/stablecoinprices', lambda rng, scale, groups, query: [
+        {'date': START + day * DAY, 'prices': {f'stable-{index}': rng.uniform(0.98, 1.02)
+                                               for index in range(20)}}
+        for day in range(_count(1000, scale))]),
+    # bridges.llama.fi
+    ('bridges.llama.fi', r'/bridges', lambda rng, scale, groups, query:
+        {'bridges': [_bridge(rng, index) for index in range(_count(60, scale))], 'chains': []}),
+    ('bridges.llama.fi', r'/bridge/(\d+)', lambda rng, scale, groups, query: dict(
+        _bridge(rng, int(groups[0])), chainBreakdown={chain: {} for chain in CHAINS[:3]})),
+    ('bridges.llama.fi', r'/bridgevolume/([^/]+)', lambda rng, scale, groups, query: [
+        {'date': str(START + day * DAY), 'depositUSD': rng.uniform(1e5, 1e9),
+         'withdrawUSD': rng.uniform(1e5, 1e9), 'depositTxs': 100, 'withdrawTxs': 90}
+        for day in range(_count(1000, scale))]),
+    ('bridges.llama.fi', r'/bridge(?:day)?stats/(\d+)/([^/]+)', lambda rng, scale, groups, query: {
+        'date': int(groups[0]), 'totalTokensDeposited': {}, 'totalTokensWithdrawn': {},
+        'totalAddressDeposited': {}, 'totalAddressWithdrawn': {}}),
+    ('bridges.llama.fi', r'/transactions/(\d+)', lambda rng, scale, groups, query:
+        _transactions(rng, scale, query)),
+    # abi-decoder.llama.fi
+    ('abi-decoder.llama.fi', r'/fetch/(?:signature|contract/[^/]+/[^/]+)', lambda rng, scale, groups, query:
+        _signatures(query)),
+]
+
+_COMPILED = [(host, re.compile(pattern + '$'), generator) for host, pattern, generator in ROUTES]
+
+
+def time_string(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def _name(host: str, path: str) -> str:
+    return re.sub(r'[^A-Za-z0-9]+', '_', f'{host}{path}').strip('_')
+
+
+def payload(host: str, path: str, query: Query, scale: float = 1.0,
+            directory: str = FIXTURES) -> Optional[bytes]:
+    """Return the JSON body served for a request.
+
+    Args:
+      host(str): Host of the real endpoint, e.g. 'api.llama.fi'.
+
+      path(str): Path of the request, without the query.
+
+      query(Query): Parsed query string.
+
+      scale(float): Multiplier of the list lengths of synthesized payloads.
+
+      directory(str): Directory of the recorded payloads.
+
+    Returns:
+      Optional[bytes]: Body, or None if no route matches.
+
+    """
+
+    recorded = os.path.join(directory, _name(host, path) + '.json.gz')
+    if os.path.exists(recorded):
+        with gzip.open(recorded, 'rb') as file:
+            return file.read()
+
+    for route_host, pattern, generator in _COMPILED:
+        match = pattern.match(path) if route_host == host else None
+        if match:
+            rng = random.Random(f'{host}{path}')
+            return json.dumps(generator(rng, scale, match.groups(), query)).encode()
+
+    return None
+
+
+def record(urls: List[str], directory: str = FIXTURES) -> None:
+    """Record real responses to be served instead of synthesized payloads.
+
+    Args:
+      urls(List[str]): URLs of the real API to record, e.g.
+        'https://api.llama.fi/protocols'.
+
+      directory(str): Directory of the recorded payloads.
+
+    """
+
+    from defillama.session import get_session
+
+    os.makedirs(directory, exist_ok=True)
+    for url in urls:
+        response = get_session().request(url)
+        response.raise_for_status()
+        parts = urlsplit(url)
+        with gzip.open(os.path.join(directory, _name(parts.netloc, parts.path) + '.json.gz'), 'wb') as file:
+            file.write(response.body)
+
+
+def parse_query(query: str) -> Query:
+    return parse_qs(query, keep_blank_values=True)
@@ -0,0 +1,419 @@
+"""Benchmarks of the serial, batch and async request paths.
+
+Each workload is run through each path against a local
+:class:`~benchmarks.server.MockServer`, every case in its own process so the
+peak RSS is its own. A case reports its throughput, the p50/p99 latency of
+its transfers, the time spent decoding bodies and its peak RSS:
+
+    $ python -m benchmarks.run --requests 500 --latency 0.02 --output results.json
+    $ python -m benchmarks.run --baseline results.json   # fails on regressions
+
+Workloads:
+
+* endpoints: every public function of the endpoint modules, once.
+* small: `requests` calls returning small bodies (TVL values, blocks,
+  prices).
+* large: `requests` / 10 calls returning large bodies (protocol details,
+  pool and volume charts).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pycurl
+
+from defillama import (abi_decoder, batch, bridges, coins, decoder, fees_revenue,
+                       stablecoins, tvl, volumes, yields)
+from defillama.aio import AsyncClient
+from defillama.session import Session, Transfer, set_session
+
+from .server import MockServer, patched
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = ('serial', 'batch', 'async')
+WORKLOADS = ('endpoints', 'small', 'large')
+
+Call = Tuple[Callable, tuple]
+
+# Compared metrics, whether higher is better and the change below which
+# they are considered noise
+METRICS: Dict[str, Tuple[bool, float]] = {
+    'requests_per_second': (True, 0.0),
+    'latency_p99': (False, 0.001),
+    'decode_seconds': (False, 0.01),
+    'peak_rss_mb': (False, 4.0),
+}
+
+_TOKENS = [{'ethereum': '0xdac17f958d2ee523a2206206994597c13d831ec7'}, {'coingecko': 'ethereum'}]
+_DAY = 86400
+_TIME = 1680000000
+
+
+def _endpoints(requests: int) -> List[Call]:
+    return [
+        (tvl.get_chains, ()),
+        (tvl.get_protocols, ()),
+        (tvl.get_protocols, ('protocol-1',)),
+        (tvl.get_historical_chains_tvl, ('Ethereum',)),
+        (tvl.get_charts, ('Ethereum',)),
+        (tvl.get_protocol_tvl, ('protocol-1',)),
+        (coins.get_current_prices, (_TOKENS,)),
+        (coins.get_historical_prices, (_TOKENS, _TIME)),
+        (coins.get_historical_batch, ({'coingecko:ethereum': [_TIME, _TIME + _DAY]},)),
+        (coins.get_charts, (_TOKENS, _TIME, None, 30)),
+        (coins.get_percentage, (_TOKENS, _TIME)),
+        (coins.get_first_prices, (_TOKENS,)),
+        (coins.get_nearest_block, ('ethereum', _TIME)),
+        (stablecoins.get_stablecoins, ()),
+        (stablecoins.get_charts, ('all',)),
+        (stablecoins.get_distribution, (1,)),
+        (stablecoins.get_chains, ()),
+        (stablecoins.get_prices, ()),
+        (yields.get_pools, ()),
+        (yields.get_pool_chart, ('pool-1',)),
+        (bridges.get_bridges, ()),
+        (bridges.get_bridge_by_id, (1,)),
+        (bridges.get_volume, ('Ethereum',)),
+        (bridges.get_stats, (_TIME, 'Ethereum')),
+        (bridges.get_transactions, (1, 'ethereum', 'ethereum:0xabc', _TIME, _TIME + _DAY)),
+        (volumes.get_dex_overview, ()),
+        (volumes.get_dex_summary, ('protocol-1',)),
+        (volumes.get_options_overview, ()),
+        (volumes.get_options_summary, ('protocol-1',)),
+        (fees_revenue.get_overview, ()),
+        (fees_revenue.get_summary, ('protocol-1',)),
+        (abi_decoder.get_signature_abi, (['0xa9059cbb'],)),
+        (abi_decoder.get_contract_signature_abi, ('ethereum', '0xabc', ['0xa9059cbb'])),
+    ]
+
+
+def _small(requests: int) -> List[Call]:
+    return [(tvl.get_protocol_tvl, (f'protocol-{index}',)) if index % 3 == 0
+            else (coins.get_nearest_block, ('ethereum', _TIME + index)) if index % 3 == 1
+            else (coins.get_current_prices, ([{'coingecko': f'token-{index}'}],))
+            for index in range(requests)]
+
+
+def _large(requests: int) -> List[Call]:
+    return [(tvl.get_protocols, (f'protocol-{index}',)) if index % 3 == 0
+            else (yields.get_pool_chart, (f'pool-{index}',)) if index % 3 == 1
+            else (volumes.get_dex_summary, (f'protocol-{index}',))
+            for index in range(max(1, requests // 10))]
+
+
+CALLS: Dict[str, Callable[[int], List[Call]]] = {
+    'endpoints': _endpoints,
+    'small': _small,
+    'large': _large,
+}
+
+
+class _TimedSession(Session):
+    """Session recording the total time of every transfer."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.timings: List[float] = []
+
+    def finish(self, curl: pycurl.Curl, url: str, transfer: Transfer):
+        self.timings.append(curl.getinfo(pycurl.TOTAL_TIME))
+
+        return super().finish(curl, url, transfer)
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _peak_rss() -> Optional[float]:
+    """Return the peak resident set size of the process in MiB."""
+
+    # The high-water mark of /proc is reset by exec, unlike ru_maxrss which
+    # starts from the RSS of the parent at fork
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2 ** 10
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def _serial(calls: List[Call], concurrency: int) -> int:
+    errors = 0
+    for func, args in calls:
+        try:
+            func(*args)
+        except Exception:
+            errors += 1
+
+    return errors
+
+
+def _batch(calls: List[Call], concurrency: int) -> int:
+    results = batch.run(calls, concurrency, return_exceptions=True)
+
+    return sum(isinstance(result, Exception) for result in results)
+
+
+def _async(calls: List[Call], concurrency: int) -> int:
+    async def main() -> int:
+        slots = asyncio.Semaphore(concurrency)
+
+        async def call(client: AsyncClient, func: Callable, args: tuple) -> any:
+            async with slots:
+                return await client.call(func, *args)
+
+        async with AsyncClient() as client:
+            results = await asyncio.gather(*(call(client, func, args) for func, args in calls),
+                                           return_exceptions=True)
+
+        return sum(isinstance(result, Exception) for result in results)
+
+    return asyncio.run(main())
+
+
+RUNNERS: Dict[str, Callable[[List[Call], int], int]] = {
+    'serial': _serial,
+    'batch': _batch,
+    'async': _async,
+}
+
+
+def run_case(workload: str, mode: str, url: str, requests: int, concurrency: int) -> Dict[str, any]:
+    """Run one workload through one path in the current process.
+
+    Args:
+      workload(str): One of :data:`WORKLOADS`.
+
+      mode(str): One of :data:`MODES`.
+
+      url(str): Base URL of the mock server.
+
+      requests(int): Size of the workload.
+
+      concurrency(int): Maximum number of requests in flight in the batch
+        and async paths.
+
+    Returns:
+      Dict[str, any]: Metrics of the case.
+
+    """
+
+    session = _TimedSession()
+    set_session(session)
+
+    decoding = [0.0]
+    loads = decoder.loads
+
+    def timed(data, backend=None):
+        start = time.perf_counter()
+        try:
+            return loads(data, backend)
+        finally:
+            decoding[0] += time.perf_counter() - start
+
+    decoder.loads = timed
+    calls = CALLS[workload](requests)
+
+    with patched(url):
+        start = time.perf_counter()
+        errors = RUNNERS[mode](calls, concurrency)
+        seconds = time.perf_counter() - start
+
+    decoder.loads = loads
+    bandwidth = session.bandwidth.stats()
+
+    return {
+        'workload': workload,
+        'mode': mode,
+        'calls': len(calls),
+        'transfers': len(session.timings),
+        'errors': errors,
+        'seconds': seconds,
+        'requests_per_second': len(session.timings) / seconds if seconds else None,
+        'latency_p50': _percentile(session.timings, 0.50),
+        'latency_p99': _percentile(session.timings, 0.99),
+        'decode_seconds': decoding[0],
+        'wire_bytes': sum(item['wire_bytes'] for item in bandwidth.values()),
+        'decoded_bytes': sum(item['decoded_bytes'] for item in bandwidth.values()),
+        'peak_rss_mb': _peak_rss(),
+    }
+
+
+def environment() -> Dict[str, any]:
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'libcurl': pycurl.version,
+        'decoder': decoder.get_backend(),
+        'time': int(time.time()),
+    }
+
+
+def run(workloads: List[str] = WORKLOADS,
+        modes: List[str] = MODES,
+        requests: int = 300,
+        concurrency: int = 32,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        scale: float = 1.0) -> Dict[str, any]:
+    """Run every workload through every path, each case in a subprocess.
+
+    Args:
+      workloads(List[str]): Workloads to run. Defaults to all of them.
+
+      modes(List[str]): Paths to run them through. Defaults to all of them.
+
+      requests(int): Size of the workloads. Defaults to 300.
+
+      concurrency(int): Maximum number of requests in flight in the batch
+        and async paths. Defaults to 32.
+
+      latency(float): Latency of the server in seconds. Defaults to 0.
+
+      jitter(float): Maximum random deviation of the latency. Defaults to 0.
+
+      scale(float): Multiplier of the payload sizes. Defaults to 1.
+
+    Returns:
+      Dict[str, any]: Environment, server settings and the metrics of each
+      case.
+
+    """
+
+    cases = []
+    with MockServer(latency=latency, jitter=jitter, scale=scale) as server:
+        def case(workload: str, mode: str) -> Dict[str, any]:
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.run', '--case', f'{workload}:{mode}',
+                 '--url', server.url, '--requests', str(requests),
+                 '--concurrency', str(concurrency)],
+                cwd=ROOT, check=True, stdout=subprocess.PIPE).stdout
+            return json.loads(output)
+
+        for workload in workloads:
+            # Unmeasured pass building the bodies of the workload on the server
+            case(workload, 'batch')
+            for mode in modes:
+                cases.append(case(workload, mode))
+
+    return {
+        'environment': environment(),
+        'server': {'latency': latency, 'jitter': jitter, 'scale': scale},
+        'requests': requests,
+        'concurrency': concurrency,
+        'cases': cases,
+    }
+
+
+def compare(results: Dict[str, any], baseline: Dict[str, any],
+            tolerance: float = 0.2) -> List[str]:
+    """Compare results against a baseline run.
+
+    Args:
+      results(Dict[str, any]): Results of :func:`run`.
+
+      baseline(Dict[str, any]): Earlier results of :func:`run`.
+
+      tolerance(float): Relative degradation tolerated. Defaults to 0.2.
+
+    Returns:
+      List[str]: Description of each regression.
+
+    """
+
+    before = {(case['workload'], case['mode']): case for case in baseline['cases']}
+    regressions = []
+
+    for case in results['cases']:
+        old = before.get((case['workload'], case['mode']))
+        if old is None:
+            continue
+        name = f"{case['workload']}:{case['mode']}"
+        for metric, (higher, noise) in METRICS.items():
+            new, previous = case.get(metric), old.get(metric)
+            if not new or not previous or abs(new - previous) < noise:
+                continue
+            change = new / previous - 1
+            if (-change if higher else change) > tolerance:
+                regressions.append(f'{name} {metric}: {previous:.4g} -> {new:.4g} ({change:+.0%})')
+
+    return regressions
+
+
+def _table(results: Dict[str, any]) -> str:
+    lines = [f"{'case':<18}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'decode s':>10}{'RSS MiB':>10}"]
+    for case in results['cases']:
+        lines.append(f"{case['workload'] + ':' + case['mode']:<18}"
+                     f"{case['requests_per_second'] or 0:>10.0f}"
+                     f"{(case['latency_p50'] or 0) * 1000:>10.2f}"
+                     f"{(case['latency_p99'] or 0) * 1000:>10.2f}"
+                     f"{case['decode_seconds']:>10.3f}"
+                     f"{case['peak_rss_mb'] or 0:>10.1f}")
+
+    return '\n'.join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workloads', nargs='+', choices=WORKLOADS, default=list(WORKLOADS))
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--requests', type=int, default=300, help='size of the workloads')
+    parser.add_argument('--concurrency', type=int, default=32, help='requests in flight')
+    parser.add_argument('--latency', type=float, default=0.0, help='server latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random latency deviation')
+    parser.add_argument('--scale', type=float, default=1.0, help='payload size multiplier')
+    parser.add_argument('--output', help='file to write the JSON results to')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='tolerated degradation')
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        workload, mode = args.case.split(':')
+        print(json.dumps(run_case(workload, mode, args.url, args.requests, args.concurrency)))
+        return
+
+    results = run(args.workloads, args.modes, args.requests, args.concurrency,
+                  args.latency, args.jitter, args.scale)
+    print(_table(results))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f'Regression: {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Local stand-in for the DeFiLlama hosts.
+
+Requests are made to ``http://127.0.0.1:{port}/{host}/{path}``, e.g.
+``/api.llama.fi/protocols``, and answered with the payloads of
+:mod:`benchmarks.fixtures` after a configurable latency. Bodies are built
+once per URL and gzip-compressed when the client accepts it.
+
+    $ python -m benchmarks.server --port 8080 --latency 0.05 --scale 2
+"""
+
+import argparse
+import gzip
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+from . import fixtures
+
+# Modules whose BASE_URL is pointed at the server
+MODULES = ('tvl', 'coins', 'stablecoins', 'yields', 'abi_decoder', 'bridges',
+           'volumes', 'fees_revenue')
+
+# Smallest body worth compressing
+MIN_COMPRESS = 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    server: 'MockServer'
+
+    def do_GET(self) -> None:
+        server = self.server
+        if server.latency or server.jitter:
+            time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+
+        body, gzipped = server.body(self.path, 'gzip' in self.headers.get('Accept-Encoding', ''))
+        if body is None:
+            self.send_response(404)
+            body = b'{"error":"not found"}'
+        else:
+            self.send_response(200)
+
+        self.send_header('Content-Type', 'application/json')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class MockServer(ThreadingHTTPServer):
+    """Threaded HTTP server answering with the benchmark payloads.
+
+    Args:
+      port(int): Port to listen on. Defaults to 0 (any free port).
+
+      latency(float): Seconds waited before answering. Defaults to 0.
+
+      jitter(float): Maximum random deviation of the latency. Defaults to 0.
+
+      scale(float): Multiplier of the list lengths of the payloads.
+        Defaults to 1.
+
+      directory(str): Directory of the recorded payloads.
+
+    """
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self,
+                 port: int = 0,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 scale: float = 1.0,
+                 directory: str = fixtures.FIXTURES):
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.scale = scale
+        self.directory = directory
+        self._bodies: Dict[Tuple[str, bool], Tuple[Optional[bytes], bool]] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def body(self, target: str, gzip_accepted: bool) -> Tuple[Optional[bytes], bool]:
+        """Return the body served for a request target, built once, and
+        whether it is gzip-compressed."""
+
+        key = (target, gzip_accepted)
+        with self._lock:
+            if key in self._bodies:
+                return self._bodies[key]
+
+        parts = urlsplit(target)
+        host, _, path = parts.path.lstrip('/').partition('/')
+        body = fixtures.payload(host, '/' + path, fixtures.parse_query(parts.query),
+                                self.scale, self.directory)
+        gzipped = body is not None and gzip_accepted and len(body) >= MIN_COMPRESS
+        if gzipped:
+            body = gzip.compress(body, 6)
+
+        with self._lock:
+            self._bodies[key] = body, gzipped
+
+        return body, gzipped
+
+    def start(self) -> 'MockServer':
+        """Serve in a background thread."""
+
+        self._thread = threading.Thread(target=self.serve_forever, name='mock-defillama', daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'MockServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+@contextmanager
+def patched(url: str) -> Iterator[None]:
+    """Point the endpoint modules at a mock server.
+
+    Args:
+      url(str): Base URL of the server, e.g. 'http://127.0.0.1:8080'.
+
+    """
+
+    import importlib
+
+    modules = [importlib.import_module(f'defillama.{name}') for name in MODULES]
+    saved = [module.BASE_URL for module in modules]
+    for module, base in zip(modules, saved):
+        module.BASE_URL = f'{url}/{urlsplit(base).netloc}'
+    try:
+        yield
+    finally:
+        for module, base in zip(modules, saved):
+            module.BASE_URL = base
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before each answer')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random latency deviation')
+    parser.add_argument('--scale', type=float, default=1.0, help='payload size multiplier')
+    args = parser.parse_args()
+
+    server = MockServer(args.port, args.latency, args.jitter, args.scale)
+    print(f'Serving the DeFiLlama hosts at {server.url}/{{host}}/...')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -15,7 +15,35 @@
    - tvl: Retrieve TVL data
    - volumes: Data from DeFiLlama's volumes dashboards
    - yields: Data from DeFiLlama's yields/APY dashboard
+
+   Requests are made through a shared session that keeps connections to the
+   DeFiLlama hosts alive between calls. The following submodules extend the
+   ones above:
+   - session: Shared session, with its connection pool
+   - batch: Concurrent runs of many calls of any of the above
+   - aio: asyncio versions of all of them
+   - decoder: Decoding by the fastest installed JSON library
+   - models: Typed records of the responses
+   - frame: Historical series as NumPy columns
+   - analytics: Vectorized helpers over those columns
+   - cache: In-memory or on-disk caching and revalidation of responses
+   - store: Permanent store of settled historical data
+   - broker: Price lookups of concurrent callers merged into batched requests
+   - ratelimit: Per-host limits of the request rate and concurrency
+   - retry: Retries with backoff, and deadlines bounding calls
+   - metrics: Phase timings of the requests, exported to Prometheus or
+     OpenTelemetry
+   - cassette: Record and network-free replay of responses
+   - sync: Local copy of the protocol histories, only fetching the changes
+   - backfill: Long price histories of many tokens, streamed
+   - export: Endpoint results written to partitioned Parquet or Arrow datasets
+   - snapshot: Yield pools shared between processes through a memory-mapped
+     file
+   - index: Filter and top-N queries over the protocol listing
 """
 
-__all__ = ['__version__', '_utils', 'tvl', 'coins', 'stablecoins', 'yields',
-           'abi_decoder', 'bridges', 'volumes', 'fees_revenue']
+__all__ = ['__version__', '_utils', 'session', 'batch', 'aio', 'decoder',
+           'models', 'frame', 'analytics', 'cache', 'store', 'broker',
+           'ratelimit', 'retry', 'metrics', 'cassette', 'sync', 'backfill',
+           'export', 'snapshot', 'index', 'tvl', 'coins', 'stablecoins',
+           'yields', 'abi_decoder', 'bridges', 'volumes', 'fees_revenue']
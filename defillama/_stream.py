@@ -0,0 +1,134 @@
+import codecs
+from json import JSONDecoder, JSONDecodeError
+from typing import Iterator, List, Tuple
+
+_WHITESPACE = ' \t\n\r'
+# Characters a number may continue with
+_NUMBER = '0123456789.eE+-'
+_MORE = object()
+
+
+class ItemParser:
+    """Incremental parser yielding the items of an array inside a JSON
+    document as its bytes arrive.
+
+    Only the array pointed to by `path` is decoded item by item; everything
+    before it is skipped and everything after it is ignored. The parser holds
+    no more than the item currently being received, so memory stays flat
+    whatever the size of the document.
+
+    Args:
+      path(Tuple[str, ...]): Keys leading from the top-level object to the
+        array. An empty path means the document itself is the array.
+
+    """
+
+    def __init__(self, path: Tuple[str, ...] = ()):
+        self.path = path
+        self._decoder = JSONDecoder()
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+        self._walk = self._document()
+
+    def feed(self, chunk: bytes) -> List[any]:
+        """Feed the next chunk of the document.
+
+        Args:
+          chunk(bytes): Next bytes of the document.
+
+        Returns:
+          List[any]: Items completed by the chunk.
+
+        """
+
+        self._buf = self._buf[self._pos:] + self._text.decode(chunk)
+        self._pos = 0
+
+        return self._resume()
+
+    def close(self) -> List[any]:
+        """Signal the end of the document.
+
+        Returns:
+          List[any]: Items completed by the end of the document.
+
+        """
+
+        self._buf = self._buf[self._pos:] + self._text.decode(b'', final=True)
+        self._pos = 0
+        self._eof = True
+
+        return self._resume()
+
+    def _resume(self) -> List[any]:
+        items = []
+        for item in self._walk:
+            if item is _MORE:
+                break
+            items.append(item)
+
+        return items
+
+    def _skip_whitespace(self) -> Iterator:
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return
+            if self._eof:
+                raise JSONDecodeError('Unexpected end of document', self._buf, self._pos)
+            yield _MORE
+
+    def _expect(self, chars: str) -> Iterator:
+        yield from self._skip_whitespace()
+        char = self._buf[self._pos]
+        if char not in chars:
+            raise JSONDecodeError(f'Expecting one of {chars!r}', self._buf, self._pos)
+        self._pos += 1
+
+        return char
+
+    def _value(self) -> Iterator:
+        yield from self._skip_whitespace()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except JSONDecodeError:
+                if self._eof:
+                    raise
+            else:
+                # A value ending with the buffer, or a number followed by a
+                # character it may continue with (e.g. '1500' out of
+                # '1500.'), may continue in the next chunk.
+                if self._eof or (end < len(self._buf) and not (
+                        isinstance(value, (int, float)) and self._buf[end] in _NUMBER)):
+                    self._pos = end
+                    return value
+            yield _MORE
+
+    def _document(self) -> Iterator:
+        for key in self.path:
+            yield from self._expect('{')
+            while True:
+                yield from self._skip_whitespace()
+                if self._buf[self._pos] == '}':
+                    return
+                name = yield from self._value()
+                yield from self._expect(':')
+                if name == key:
+                    break
+                yield from self._value()
+                if (yield from self._expect(',}')) == '}':
+                    return
+
+        yield from self._expect('[')
+        yield from self._skip_whitespace()
+        if self._buf[self._pos] == ']':
+            return
+
+        while True:
+            yield (yield from self._value())
+            if (yield from self._expect(',]')) == ']':
+                return
@@ -1,40 +1,191 @@
-import pycurl
-import certifi
-from json import loads, dumps
-from io import BytesIO
-from typing import List, Dict, Union
+from json import dumps
+from contextvars import ContextVar
+from typing import List, Dict, Union, Optional, Iterator, Tuple
+from . import models
+from ._stream import ItemParser
+from .session import USERAGENT, get_session
 
-USERAGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/111.0.0.0 Safari/537.36'
+# Responses already fetched by a batch or async run, keyed by URL. When set,
+# get() answers from it instead of making a request.
+_prefetched: ContextVar[Optional[Dict[str, any]]] = ContextVar('prefetched', default=None)
 
 
-def get(url: str) -> any:
+class PendingRequest(Exception):
+    """Raised by :func:`get` when a batch or async run still has to fetch a
+    URL before the calling function can complete."""
+
+    def __init__(self, urls: List[str]):
+        super().__init__(urls)
+        self.urls = urls
+
+
+def get(url: str, json_backend: str = None) -> any:
     """Utility function for GET request to API
     
-    Function uses PyCurl to make a GET request to the API.
+    Function uses the shared PyCurl session to make a GET request to the API.
+    Connections are kept alive and reused between calls.
     A user-agent is used to mimic a browser request.
+    The response bytes are decoded by the current JSON backend.
 
     Args:
       url(str): String of the URL to make the request to.
       url: str: 
+      json_backend(str): JSON backend to use, see :mod:`defillama.decoder`.
+        Defaults to the current backend.
 
     Returns:
       any: Response from the API.
 
     """
 
-    buffer = BytesIO()
-    curl = pycurl.Curl()
-    curl.setopt(pycurl.USERAGENT, USERAGENT)
-    curl.setopt(pycurl.URL, url)
-    curl.setopt(pycurl.WRITEDATA, buffer)
-    curl.setopt(pycurl.CAINFO, certifi.where())
-    curl.perform()
-    curl.close()
+    prefetched = _prefetched.get()
+
+    if prefetched is not None:
+        if url not in prefetched:
+            raise PendingRequest([url])
+        response = prefetched[url]
+        if isinstance(response, BaseException):
+            raise response
+        return response
+
+    return get_session().get(url, json_backend)
+
+
+def get_many(urls: List[str], concurrency: int = 16) -> List[any]:
+    """Utility function for concurrent GET requests to API
+
+    Function fetches the URLs concurrently over the shared session and
+    returns their decoded responses in order. The first failed request
+    raises its exception once every request has completed. A URL already
+    being fetched by another request of the session shares its transfer.
+
+    Args:
+      urls(List[str]): URLs to make the requests to.
+      concurrency(int): Maximum number of requests in flight.
+        Defaults to 16.
+
+    Returns:
+      List[any]: Response of each URL.
+
+    """
+
+    prefetched = _prefetched.get()
+
+    if prefetched is not None:
+        missing = [url for url in urls if url not in prefetched]
+        if missing:
+            raise PendingRequest(missing)
+        responses = prefetched
+    else:
+        from .batch import _MultiDriver
+
+        driver = _MultiDriver(get_session(), concurrency)
+        for url in urls:
+            driver.add(url)
+        try:
+            responses = dict(driver.results())
+        finally:
+            driver.close()
 
-    response = buffer.getvalue()
-    response = loads(response.decode('utf-8'))
+    for url in urls:
+        if isinstance(responses[url], BaseException):
+            raise responses[url]
 
-    return response
+    return [responses[url] for url in urls]
+
+
+def get_records(url: str,
+                model: type,
+                path: Tuple[str, ...] = (),
+                container: type = list) -> Union[List, Dict]:
+    """Utility function for GET request to API returning typed records
+
+    Function decodes the response straight into records of the given
+    :mod:`defillama.models` type.
+
+    Args:
+      url(str): String of the URL to make the request to.
+      model(type): Record type, e.g. :class:`defillama.models.Pool`.
+      path(Tuple[str, ...]): Keys leading to the records in the response.
+        Defaults to the response itself.
+      container(type): ``list`` for a list of records or ``dict`` for records
+        keyed by name. Defaults to ``list``.
+
+    Returns:
+      List | Dict: Typed records.
+
+    """
+
+    if _prefetched.get() is not None:
+        response = get(url)
+        for key in path:
+            response = response[key]
+        return models.convert(response, model)
+
+    response = get_session().request(url)
+    response.raise_for_status()
+
+    return models.decode(response.body, model, path, container)
+
+
+def stream(url: str, path: Tuple[str, ...] = ()) -> Iterator[any]:
+    """Utility function for streaming GET request to API
+
+    Function yields the items of the array found at `path` in the JSON
+    response one at a time while the response is still being downloaded.
+    Only the item being received is held in memory.
+
+    Args:
+      url(str): String of the URL to make the request to.
+      path(Tuple[str, ...]): Keys leading to the array in the response.
+        Defaults to the response itself.
+
+    Returns:
+      Iterator[any]: Items of the array.
+
+    """
+
+    if _prefetched.get() is not None:
+        response = get(url)
+        for key in path:
+            response = response[key]
+        return iter(response)
+
+    return _stream_items(url, path)
+
+
+def _stream_items(url: str, path: Tuple[str, ...]) -> Iterator[any]:
+    parser = ItemParser(path)
+
+    for chunk in get_session().stream(url):
+        yield from parser.feed(chunk)
+
+    yield from parser.close()
+
+
+def replay(responses: Dict[str, any], func: callable, *args, **kwargs) -> any:
+    """Call a module function with get() answering from fetched responses
+
+    Function runs `func` with :func:`get` bound to `responses` so no request
+    is made. If the function needs a URL that is not in `responses` yet,
+    :class:`PendingRequest` is raised with the missing URL(s); the caller is
+    expected to fetch them, add them to `responses` and replay again.
+
+    Args:
+      responses(Dict[str, any]): Decoded responses (or the exception raised
+        while fetching them) keyed by URL.
+      func(callable): Module function to call.
+
+    Returns:
+      any: Return value of the function.
+
+    """
+
+    token = _prefetched.set(responses)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _prefetched.reset(token)
 
 
 def arg_parser(arg: Union[List[Dict[str, str]], Dict[str, List], List],
@@ -81,3 +232,27 @@ def arg_parser(arg: Union[List[Dict[str, str]], Dict[str, List], List],
         arg = ','.join(arg)
 
     return arg
+
+
+_UNITS = {'w': 604800, 'd': 86400, 'h': 3600, 'm': 60}
+
+
+def duration_seconds(duration: str) -> int:
+    """Convert a duration in chart notation (e.g. '6h', '1W') to seconds."""
+
+    return int(duration[:-1]) * _UNITS[duration[-1].lower()]
+
+
+def join_chunks(items: List[str], width: int) -> Iterator[str]:
+    """Join items into comma-separated lists of at most `width` characters."""
+
+    chunk, length = [], -1
+    for item in items:
+        if chunk and length + 1 + len(item) > width:
+            yield ','.join(chunk)
+            chunk, length = [], -1
+        chunk.append(item)
+        length += 1 + len(item)
+
+    if chunk:
+        yield ','.join(chunk)
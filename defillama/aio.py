@@ -0,0 +1,367 @@
+"""Asyncio versions of every public function of the endpoint modules.
+
+The namespaces of this module mirror the endpoint modules, with each function
+turned into a coroutine function taking the same arguments. Generator
+functions such as ``bridges.iter_transactions`` drive their own transfers
+while iterated and are left out:
+
+    >>> from defillama.aio import coins, yields
+    >>> prices, chart = await asyncio.gather(
+    ...     coins.get_current_prices([{'coingecko': 'ethereum'}]),
+    ...     yields.get_pool_chart('747c1d2a-c668-4682-b9f9-296708a3dd90'))
+
+Transfers are driven by a ``pycurl.CurlMulti`` handle in socket mode whose
+sockets and timers are registered directly on the running event loop, so no
+threads are used and thousands of concurrent requests only cost the event
+loop the readiness callbacks of their sockets. This requires an event loop
+supporting ``add_reader``/``add_writer`` (on Windows, the selector event
+loop).
+"""
+
+import asyncio
+import functools
+import inspect
+import pycurl
+import weakref
+from types import ModuleType
+from typing import Dict, Optional, Tuple
+from . import (tvl as _tvl, coins as _coins, stablecoins as _stablecoins,
+               yields as _yields, abi_decoder as _abi_decoder,
+               bridges as _bridges, volumes as _volumes,
+               fees_revenue as _fees_revenue)
+from ._utils import PendingRequest, replay
+from .retry import DeadlineExceeded, check_deadline, remaining
+from .session import Response, Session, get_session
+
+
+class AsyncClient:
+    """Non-blocking request client bound to an asyncio event loop.
+
+    The client must be created while its event loop is running.
+
+    Args:
+      session(Session): Session providing the Curl handles. Defaults to
+        the shared session at the time of each request, so that the
+        client follows :func:`~defillama.session.set_session`.
+
+      max_connections(int): Maximum number of open connections. Transfers
+        above the limit are queued by libcurl. Defaults to 0 (no limit).
+
+    """
+
+    def __init__(self, session: Session = None, max_connections: int = 0):
+        self._session = session
+        self._loop = asyncio.get_running_loop()
+        self._transfers: Dict[pycurl.Curl, Tuple[Session, str, any, asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._watched: Dict[int, int] = {}
+        self._flights: Dict[Tuple[Session, str], asyncio.Future] = {}
+        self._closed = False
+
+        self._multi = pycurl.CurlMulti()
+        self._multi.setopt(pycurl.M_SOCKETFUNCTION, self._on_socket)
+        self._multi.setopt(pycurl.M_TIMERFUNCTION, self._on_timer)
+        if hasattr(pycurl, 'PIPE_MULTIPLEX'):
+            self._multi.setopt(pycurl.M_PIPELINING, pycurl.PIPE_MULTIPLEX)
+        if max_connections:
+            self._multi.setopt(pycurl.M_MAX_TOTAL_CONNECTIONS, max_connections)
+
+    @property
+    def session(self) -> Session:
+        """Session the next requests are made with."""
+
+        return self._session if self._session is not None else get_session()
+
+    def _on_socket(self, what: int, fd: int, multi: pycurl.CurlMulti, data: any) -> None:
+        previous = self._watched.pop(fd, pycurl.POLL_NONE)
+        if previous in (pycurl.POLL_IN, pycurl.POLL_INOUT):
+            self._loop.remove_reader(fd)
+        if previous in (pycurl.POLL_OUT, pycurl.POLL_INOUT):
+            self._loop.remove_writer(fd)
+
+        if what == pycurl.POLL_REMOVE:
+            return
+
+        if what in (pycurl.POLL_IN, pycurl.POLL_INOUT):
+            self._loop.add_reader(fd, self._action, fd, pycurl.CSELECT_IN)
+        if what in (pycurl.POLL_OUT, pycurl.POLL_INOUT):
+            self._loop.add_writer(fd, self._action, fd, pycurl.CSELECT_OUT)
+        self._watched[fd] = what
+
+    def _on_timer(self, timeout_ms: int) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if timeout_ms >= 0:
+            self._timer = self._loop.call_later(timeout_ms / 1000, self._action,
+                                                pycurl.SOCKET_TIMEOUT, 0)
+
+    def _action(self, fd: int, events: int) -> None:
+        if fd == pycurl.SOCKET_TIMEOUT:
+            self._timer = None
+
+        self._multi.socket_action(fd, events)
+
+        queued = 1
+        while queued:
+            queued, ok, failed = self._multi.info_read()
+            for curl in ok:
+                self._done(curl, None)
+            for curl, errno, errmsg in failed:
+                self._done(curl, pycurl.error(errno, errmsg))
+
+    def _done(self, curl: pycurl.Curl, error: Optional[pycurl.error]) -> None:
+        session, url, state, future = self._transfers.pop(curl)
+        self._multi.remove_handle(curl)
+
+        if error is not None:
+            session.discard(url, curl)
+        else:
+            try:
+                response = session.finish(curl, url, state)
+            except Exception as e:
+                curl.close()
+                error = e
+            else:
+                session.release(url, curl)
+
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(response)
+
+    async def get(self, url: str) -> any:
+        """Make a GET request without blocking the event loop.
+
+        Concurrent calls for the same URL share a single transfer. Failed
+        attempts are retried, and slow ones hedged, according to the session.
+
+        Args:
+          url(str): URL to make the request to.
+
+        Returns:
+          any: Response from the API.
+
+        """
+
+        session = self.session
+        response = session.lookup(url)
+        if response is not None:
+            delay = session.hold(url)
+            if delay:
+                await asyncio.sleep(delay)
+            return response.json()
+
+        key = (session, url)
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = asyncio.ensure_future(self._fetch(session, url))
+            flight.add_done_callback(functools.partial(self._landed, key))
+
+        return await asyncio.shield(flight)
+
+    def _landed(self, key: Tuple[Session, str], flight: asyncio.Future) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.cancelled():
+            # Mark the exception as retrieved when every caller was cancelled
+            flight.exception()
+
+    async def _fetch(self, session: Session, url: str) -> any:
+        attempt = 0
+
+        while True:
+            check_deadline(url)
+            try:
+                response = await self._hedged(session, url)
+            except pycurl.error as e:
+                left = remaining()
+                if left is not None and left <= 0:
+                    raise DeadlineExceeded(f"Deadline exceeded while requesting {url}") from e
+                delay = session.retry.delay(attempt, error=e)
+                if delay is None:
+                    raise
+            else:
+                delay = session.retry.delay(attempt, response=response)
+                if delay is None:
+                    response.raise_for_status()
+                    return response.json()
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _hedged(self, session: Session, url: str) -> Response:
+        threshold = session.latency.threshold(url) if session.hedge else None
+        if threshold is None:
+            return await self._transfer(session, url)
+
+        pending = {asyncio.ensure_future(self._transfer(session, url))}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=threshold)
+            if not done and session.admit(url) == 0:
+                pending.add(asyncio.ensure_future(self._transfer(session, url, admitted=True)))
+
+            while True:
+                succeeded = [task for task in done if task.exception() is None]
+                if succeeded:
+                    return succeeded[0].result()
+                if done and not pending:
+                    return done.pop().result()
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _transfer(self, session: Session, url: str, admitted: bool = False) -> Response:
+        delay = 0 if admitted else session.admit(url)
+        while delay:
+            await asyncio.sleep(delay)
+            check_deadline(url)
+            delay = session.admit(url)
+
+        curl = session.acquire(url)
+        state = session.prepare(curl, url)
+        future = self._loop.create_future()
+        self._transfers[curl] = (session, url, state, future)
+        self._multi.add_handle(curl)
+
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if curl in self._transfers:
+                del self._transfers[curl]
+                self._multi.remove_handle(curl)
+                session.discard(url, curl, failed=False)
+            raise
+
+    async def call(self, func: callable, *args, **kwargs) -> any:
+        """Run a function of an endpoint module without blocking the
+        event loop.
+
+        Args:
+          func(callable): Module function, e.g. ``tvl.get_protocols``.
+
+        Returns:
+          any: Return value of the function.
+
+        """
+
+        responses = {}
+
+        while True:
+            try:
+                return replay(responses, func, *args, **kwargs)
+            except PendingRequest as pending:
+                urls = [url for url in pending.urls if url not in responses]
+                results = await asyncio.gather(*(self.get(url) for url in urls),
+                                               return_exceptions=True)
+                responses.update(zip(urls, results))
+
+    def close(self) -> None:
+        """Abort pending transfers and release the multi handle."""
+
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        for curl, (session, url, state, future) in list(self._transfers.items()):
+            self._multi.remove_handle(curl)
+            session.discard(url, curl, failed=False)
+            if not self._loop.is_closed():
+                future.cancel()
+        self._transfers.clear()
+
+        for fd in list(self._watched):
+            self._on_socket(pycurl.POLL_REMOVE, fd, self._multi, None)
+
+        self._multi.close()
+
+        if _clients.get(self._loop) is self:
+            del _clients[self._loop]
+
+    async def __aenter__(self) -> 'AsyncClient':
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.close()
+
+
+_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncClient]' = weakref.WeakKeyDictionary()
+
+
+def get_client() -> AsyncClient:
+    """Return the client of the running event loop, creating it on first use.
+
+    The clients of event loops closed since the last call are closed on the
+    way, releasing their multi handle and sockets. Close the client of a
+    loop explicitly (or use it as an async context manager) for its
+    resources to be released as soon as the loop is done.
+
+    Returns:
+      AsyncClient: Client bound to the running event loop.
+
+    """
+
+    for closed in [other for other in list(_clients.keys()) if other.is_closed()]:
+        _clients[closed].close()
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+
+    if client is None:
+        client = _clients[loop] = AsyncClient()
+
+    return client
+
+
+async def get(url: str) -> any:
+    """Make a GET request to the API without blocking the event loop.
+
+    Args:
+      url(str): String of the URL to make the request to.
+
+    Returns:
+      any: Response from the API.
+
+    """
+
+    return await get_client().get(url)
+
+
+def _coroutine(func: callable) -> callable:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await get_client().call(func, *args, **kwargs)
+
+    return wrapper
+
+
+def _mirror(module: ModuleType) -> ModuleType:
+    name = module.__name__.rsplit('.', 1)[-1]
+    mirror = ModuleType(f'{__name__}.{name}', module.__doc__)
+
+    for attr, value in vars(module).items():
+        # Generator functions drive their own transfers while iterated
+        if (not attr.startswith('_') and inspect.isfunction(value)
+                and not inspect.isgeneratorfunction(value)
+                and value.__module__ == module.__name__):
+            setattr(mirror, attr, _coroutine(value))
+
+    return mirror
+
+
+tvl = _mirror(_tvl)
+coins = _mirror(_coins)
+stablecoins = _mirror(_stablecoins)
+yields = _mirror(_yields)
+abi_decoder = _mirror(_abi_decoder)
+bridges = _mirror(_bridges)
+volumes = _mirror(_volumes)
+fees_revenue = _mirror(_fees_revenue)
@@ -0,0 +1,326 @@
+"""Vectorized analytics over TVL, volume and fees series.
+
+The functions work on NumPy arrays, either one series or a 2-D array holding
+one series per row, so thousands of series are processed in a single call
+instead of Python loops over their points. Series come from the columnar
+output of the endpoints (``tvl.get_charts(as_arrays=True)``), from the
+``totalDataChart`` of the volume and fees summaries through :func:`chart`,
+and are aligned on common timestamps with :func:`stack`:
+
+    >>> from defillama import analytics, volumes
+    >>> charts = [analytics.chart(volumes.get_dex_summary(slug)['totalDataChart'])
+    ...           for slug in slugs]
+    >>> dates, volume = analytics.stack(charts)         # one row per protocol
+    >>> weekly_dates, weekly = analytics.resample(dates, volume, 'week')
+    >>> analytics.share(weekly)                         # dominance of each
+    >>> analytics.rolling_mean(volume, 7)
+
+Missing points are NaN and are skipped by the aggregations.
+
+NumPy is required for this module.
+"""
+
+from typing import Iterable, List, Sequence, Tuple, Union
+from .frame import Frame, _require_numpy
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+Series = Union[Frame, Tuple['np.ndarray', 'np.ndarray']]
+
+_DAY = 86400
+
+
+def chart(points: Iterable[Sequence], name: str = 'value') -> Frame:
+    """Build a frame from ``[timestamp, value]`` pairs such as the
+    ``totalDataChart`` of the volume and fees responses.
+
+    Args:
+      points(Iterable[Sequence]): Pairs of UNIX timestamp and value.
+
+      name(str): Name of the value column. Defaults to 'value'.
+
+    Returns:
+      Frame: Frame with a 'date' column and the value column.
+
+    """
+
+    _require_numpy()
+
+    points = list(points)
+    dates = np.fromiter((point[0] for point in points), dtype=np.int64, count=len(points))
+    values = np.fromiter((np.nan if point[1] is None else point[1] for point in points),
+                         dtype=np.float64, count=len(points))
+
+    return Frame({'date': dates, name: values})
+
+
+def _series(series: Series, column: str = None) -> Tuple['np.ndarray', 'np.ndarray']:
+    if isinstance(series, Frame):
+        return series.time, series[column or list(series.columns)[1]]
+
+    return series
+
+
+def stack(series: Sequence[Series], column: str = None) -> Tuple['np.ndarray', 'np.ndarray']:
+    """Align series on the union of their timestamps.
+
+    Args:
+      series(Sequence[Series]): Frames or ``(times, values)`` pairs.
+
+      column(str): Column of the frames to use. Defaults to the first value
+        column of each frame.
+
+    Returns:
+      Tuple[np.ndarray, np.ndarray]: Sorted timestamps and a 2-D array with
+      one row per series, NaN where a series has no point.
+
+    """
+
+    _require_numpy()
+
+    pairs = [_series(item, column) for item in series]
+    if not pairs:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0))
+
+    times = np.unique(np.concatenate([item[0] for item in pairs]))
+    matrix = np.full((len(pairs), len(times)), np.nan)
+    for row, (item_times, values) in enumerate(pairs):
+        matrix[row, np.searchsorted(times, item_times)] = values
+
+    return times, matrix
+
+
+def _windows(values: 'np.ndarray', window: int) -> Tuple['np.ndarray', 'np.ndarray']:
+    """Return the sums and the numbers of valid values over trailing windows."""
+
+    valid = ~np.isnan(values)
+    sums = np.cumsum(np.where(valid, values, 0.0), axis=-1)
+    counts = np.cumsum(valid, axis=-1)
+    sums[..., window:] = sums[..., window:] - sums[..., :-window]
+    counts[..., window:] = counts[..., window:] - counts[..., :-window]
+
+    return sums, counts
+
+
+def rolling_sum(values: 'np.ndarray', window: int, min_periods: int = None) -> 'np.ndarray':
+    """Sum over trailing windows of points.
+
+    Args:
+      values(np.ndarray): Series, or 2-D array of one series per row.
+
+      window(int): Number of points per window, e.g. 7 for weekly sums of
+        daily series.
+
+      min_periods(int): Number of valid points needed for a value.
+        Defaults to the window.
+
+    Returns:
+      np.ndarray: Sums, NaN where a window has too few valid points.
+
+    """
+
+    _require_numpy()
+
+    values = np.asarray(values, dtype=np.float64)
+    sums, counts = _windows(values, window)
+
+    return np.where(counts >= (window if min_periods is None else min_periods), sums, np.nan)
+
+
+def rolling_mean(values: 'np.ndarray', window: int, min_periods: int = None) -> 'np.ndarray':
+    """Mean over trailing windows of points.
+
+    Args:
+      values(np.ndarray): Series, or 2-D array of one series per row.
+
+      window(int): Number of points per window.
+
+      min_periods(int): Number of valid points needed for a value.
+        Defaults to the window.
+
+    Returns:
+      np.ndarray: Means, NaN where a window has too few valid points.
+
+    """
+
+    _require_numpy()
+
+    values = np.asarray(values, dtype=np.float64)
+    sums, counts = _windows(values, window)
+    enough = counts >= max(1, window if min_periods is None else min_periods)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(enough, sums / counts, np.nan)
+
+
+def pct_change(values: 'np.ndarray', periods: int = 1) -> 'np.ndarray':
+    """Relative change from `periods` points earlier, e.g. day-over-day
+    change of a daily series.
+
+    Args:
+      values(np.ndarray): Series, or 2-D array of one series per row.
+
+      periods(int): Number of points between the compared values.
+        Defaults to 1.
+
+    Returns:
+      np.ndarray: Changes as fractions, NaN for the first points and where
+      the earlier value is 0 or missing.
+
+    """
+
+    _require_numpy()
+
+    values = np.asarray(values, dtype=np.float64)
+    changes = np.full_like(values, np.nan)
+    earlier = values[..., :-periods]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        changes[..., periods:] = np.where(earlier != 0, values[..., periods:] / earlier - 1, np.nan)
+
+    return changes
+
+
+def cumulative(values: 'np.ndarray') -> 'np.ndarray':
+    """Running total, skipping missing points.
+
+    Args:
+      values(np.ndarray): Series, or 2-D array of one series per row.
+
+    Returns:
+      np.ndarray: Running totals.
+
+    """
+
+    _require_numpy()
+
+    return np.nancumsum(np.asarray(values, dtype=np.float64), axis=-1)
+
+
+def drawdown(values: 'np.ndarray') -> 'np.ndarray':
+    """Fall from the running maximum, e.g. -0.4 for a TVL 40% below its
+    highest value so far.
+
+    Args:
+      values(np.ndarray): Series, or 2-D array of one series per row.
+
+    Returns:
+      np.ndarray: Drawdowns as non-positive fractions.
+
+    """
+
+    _require_numpy()
+
+    values = np.asarray(values, dtype=np.float64)
+    peaks = np.fmax.accumulate(values, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(peaks > 0, values / peaks - 1, np.nan)
+
+
+def share(values: 'np.ndarray') -> 'np.ndarray':
+    """Share of each series in the total of all series at each point, e.g.
+    the dominance of each DEX in the volume of all of them.
+
+    Args:
+      values(np.ndarray): 2-D array of one series per row, as returned by
+        :func:`stack`.
+
+    Returns:
+      np.ndarray: Shares as fractions, NaN where the total is 0.
+
+    """
+
+    _require_numpy()
+
+    values = np.asarray(values, dtype=np.float64)
+    totals = np.nansum(values, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(totals != 0, values / totals, np.nan)
+
+
+def _periods(times: 'np.ndarray', period: str) -> 'np.ndarray':
+    """Return the start of the period of each timestamp."""
+
+    if period == 'day':
+        return times - times % _DAY
+    if period == 'week':
+        # Weeks start on Monday, the epoch was a Thursday
+        return times - (times + 3 * _DAY) % (7 * _DAY)
+    if period in ('month', 'year'):
+        unit = 'datetime64[M]' if period == 'month' else 'datetime64[Y]'
+        return times.astype('datetime64[s]').astype(unit).astype('datetime64[s]').astype(np.int64)
+
+    raise ValueError(f"Unknown period '{period}', expected 'day', 'week', 'month' or 'year'")
+
+
+def resample(times: 'np.ndarray',
+             values: 'np.ndarray',
+             period: str = 'week',
+             how: str = 'sum') -> Tuple['np.ndarray', 'np.ndarray']:
+    """Aggregate series to days, weeks, months or years.
+
+    Args:
+      times(np.ndarray): Sorted UNIX timestamps of the points.
+
+      values(np.ndarray): Series, or 2-D array of one series per row.
+
+      period(str): 'day', 'week' (starting on Monday), 'month' or 'year'.
+        Defaults to 'week'.
+
+      how(str): 'sum' for flows such as volumes and fees, 'mean', or 'last'
+        for levels such as TVL. Defaults to 'sum'.
+
+    Returns:
+      Tuple[np.ndarray, np.ndarray]: Start of each period and the
+      aggregated values, NaN for periods without valid points.
+
+    """
+
+    _require_numpy()
+
+    times = np.asarray(times, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    if not len(times):
+        return times, values
+
+    starts, first = np.unique(_periods(times, period), return_index=True)
+    valid = ~np.isnan(values)
+    counts = np.add.reduceat(valid, first, axis=-1)
+
+    if how == 'last':
+        # Last valid point of each period
+        positions = np.where(valid, np.arange(values.shape[-1]), -1)
+        last = np.maximum.reduceat(positions, first, axis=-1)
+        result = np.take_along_axis(values, np.maximum(last, 0), axis=-1)
+        return starts, np.where(last >= 0, result, np.nan)
+
+    sums = np.add.reduceat(np.where(valid, values, 0.0), first, axis=-1)
+    if how == 'sum':
+        return starts, np.where(counts > 0, sums, np.nan)
+    if how == 'mean':
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return starts, np.where(counts > 0, sums / counts, np.nan)
+
+    raise ValueError(f"Unknown aggregation '{how}', expected 'sum', 'mean' or 'last'")
+
+
+def frames(times: 'np.ndarray', values: 'np.ndarray', name: str = 'value') -> List[Frame]:
+    """Split a 2-D array of series back into frames.
+
+    Args:
+      times(np.ndarray): Timestamps of the columns.
+
+      values(np.ndarray): 2-D array of one series per row.
+
+      name(str): Name of the value column. Defaults to 'value'.
+
+    Returns:
+      List[Frame]: One frame per row, sharing the timestamps.
+
+    """
+
+    _require_numpy()
+
+    return [Frame({'date': times, name: row}) for row in values]
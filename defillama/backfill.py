@@ -0,0 +1,341 @@
+"""Backfilling of long price histories for many tokens.
+
+``coins.get_charts`` returns a limited number of points per request and
+``coins.get_historical_batch`` packs every requested timestamp into its URL,
+so long histories of large token baskets have to be requested piece by
+piece. This module plans those pieces, time windows of at most
+:data:`MAX_SPAN` points and token groups of at most :data:`MAX_TOKENS`
+tokens fitting in ``coins.MAX_URL_LENGTH``, runs them concurrently as a
+batch and streams the stitched series in timestamp order, dropping the
+points returned twice by overlapping requests:
+
+    >>> from defillama import backfill
+    >>> for point in backfill.charts([{'coingecko': 'ethereum'}],
+    ...                              start=1640995200, end=1672531200,
+    ...                              period='1h'):
+    ...     print(point.timestamp, point.coin, point.price)
+
+Points are yielded as soon as every earlier window has arrived, and only
+the ``concurrency`` oldest windows not yielded yet are requested, so at most
+that many windows are held in memory, never the whole history.
+"""
+
+import heapq
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from . import batch, coins
+from ._utils import PendingRequest, arg_parser, duration_seconds, join_chunks, replay
+from .batch import _MultiDriver, _parse_spec
+from .session import get_session
+
+# Largest number of points requested from /chart at once.
+MAX_SPAN = 500
+
+# Largest number of tokens requested from /chart at once.
+MAX_TOKENS = 25
+
+
+class Point(NamedTuple):
+    """Price of a token at a timestamp."""
+
+    timestamp: int
+    coin: str
+    price: float
+
+
+class Window(NamedTuple):
+    """One /chart request of a backfill plan."""
+
+    start: int
+    span: int
+    coins: Tuple[str, ...]
+
+
+def _coins(tokens: Iterable) -> List[str]:
+    """Return tokens as '{chain}:{address}' strings."""
+
+    tokens = list(tokens)
+    if tokens and isinstance(tokens[0], dict):
+        return arg_parser(tokens, format='normal').split(',')
+
+    return tokens
+
+
+def _tokens(coins: Iterable[str]) -> List[Dict[str, str]]:
+    """Return '{chain}:{address}' strings in the form taken by ``coins``."""
+
+    return [dict([coin.split(':', 1)]) for coin in coins]
+
+
+def plan_charts(tokens: List,
+                start: int,
+                end: int,
+                period: str = '1h',
+                max_span: int = MAX_SPAN,
+                max_tokens: int = MAX_TOKENS) -> List[Window]:
+    """Split a chart backfill into requests within the server limits.
+
+    Args:
+      tokens(List): Tokens as {chain: address} dicts or '{chain}:{address}'
+        strings.
+
+      start(int): UNIX timestamp of the first point.
+
+      end(int): UNIX timestamp of the last point.
+
+      period(str): Duration between points, e.g. '1h' or '1d'.
+        Defaults to '1h'.
+
+      max_span(int): Maximum number of points per request.
+        Defaults to :data:`MAX_SPAN`.
+
+      max_tokens(int): Maximum number of tokens per request.
+        Defaults to :data:`MAX_TOKENS`.
+
+    Returns:
+      List[Window]: Requests in time order, each window split into token
+      groups.
+
+    """
+
+    step = duration_seconds(period)
+    count = max(0, (int(end) - int(start)) // step + 1)
+    names = _coins(tokens)
+
+    # Room left in the URL for the token list
+    width = coins.MAX_URL_LENGTH - len(f"{coins.BASE_URL}/chart/?start={end}&span={max_span}"
+                                       f"&period={period}&searchWidth=") - 16
+    groups = []
+    for offset in range(0, len(names), max(1, max_tokens)):
+        groups.extend(tuple(chunk.split(',')) for chunk
+                      in join_chunks(names[offset:offset + max_tokens], width))
+
+    windows = []
+    for first in range(0, count, max(1, max_span)):
+        span = min(max_span, count - first)
+        windows.extend(Window(int(start) + first * step, span, group) for group in groups)
+
+    return windows
+
+
+def _stitch(slots: List[Tuple[float, List[batch.Spec]]],
+            extract: Callable[[any], Iterable[Point]],
+            concurrency: int) -> Iterator[Point]:
+    """Run the requests of ordered time slots and merge their points.
+
+    Each slot is the time before which its points are final, i.e. before
+    which no later slot can return points, and the requests covering it.
+    Points are yielded in timestamp order once every earlier slot has
+    arrived; a point whose timestamp is not after the last point of its coin
+    is a duplicate. Only the `concurrency` oldest slots not yielded yet are
+    requested, so at most that many slots are held in memory.
+    """
+
+    calls = [[_parse_spec(spec) for spec in requests] for _, requests in slots]
+    driver = _MultiDriver(get_session(), concurrency)
+    responses: Dict[str, any] = {}
+    # Calls attempted again once the URL arrives, and the URLs of each slot
+    waiting: Dict[str, List[Tuple[int, int]]] = {}
+    urls: Dict[int, set] = {}
+    missing: Dict[int, int] = {}
+    points: Dict[int, List[Point]] = {}
+    merged: List[Point] = []
+    last: Dict[str, int] = {}
+    started = ready = 0
+
+    def attempt(slot: int, call: int) -> None:
+        func, args, kwargs = calls[slot][call]
+        try:
+            result = replay(responses, func, *args, **kwargs)
+        except PendingRequest as pending:
+            needed = [url for url in pending.urls if url not in responses]
+            for url in needed:
+                if url not in waiting and url not in urls[slot]:
+                    driver.add(url, again=True)
+                urls[slot].add(url)
+            waiting.setdefault(needed[0], []).append((slot, call))
+            return
+
+        points[slot].extend(extract(result))
+        missing[slot] -= 1
+
+    def drain(boundary: float) -> Iterator[Point]:
+        while merged and merged[0].timestamp < boundary:
+            point = heapq.heappop(merged)
+            if point.timestamp > last.get(point.coin, float('-inf')):
+                last[point.coin] = point.timestamp
+                yield point
+
+    def advance() -> Iterator[Point]:
+        nonlocal started, ready
+        while True:
+            while started < len(slots) and started - ready < max(1, concurrency):
+                urls[started], missing[started], points[started] = set(), len(calls[started]), []
+                for call in range(len(calls[started])):
+                    attempt(started, call)
+                started += 1
+
+            if ready == started or missing[ready]:
+                return
+
+            for point in points.pop(ready):
+                heapq.heappush(merged, point)
+            for url in urls.pop(ready):
+                responses.pop(url, None)
+            del missing[ready]
+            yield from drain(slots[ready][0])
+            ready += 1
+
+    try:
+        yield from advance()
+        for url, response in driver.results():
+            responses[url] = response
+            for slot, call in waiting.pop(url, ()):
+                attempt(slot, call)
+            yield from advance()
+    finally:
+        driver.close()
+
+    yield from drain(float('inf'))
+
+
+def _points(result: Dict[str, Dict[str, any]]) -> Iterator[Point]:
+    for coin, data in result.items():
+        for price in data.get('prices', ()):
+            yield Point(int(price['timestamp']), coin, price['price'])
+
+
+def charts(tokens: List,
+           start: int,
+           end: int,
+           period: str = '1h',
+           search_width: str = None,
+           concurrency: int = 8,
+           max_span: int = MAX_SPAN,
+           max_tokens: int = MAX_TOKENS) -> Iterator[Point]:
+    """**Streams the prices of tokens at regular intervals over any time
+    range.**
+
+    *Endpoint: GET /chart/{coins}*
+
+    Args:
+      tokens(List): Tokens as {chain: address} dicts or '{chain}:{address}'
+        strings.
+
+      start(int): UNIX timestamp of the first point.
+
+      end(int): UNIX timestamp of the last point.
+
+      period(str): Duration between points. Defaults to '1h'.
+
+      search_width(str): Time period on either side to find price data.
+        Defaults to the default of ``coins.get_charts``.
+
+      concurrency(int): Maximum number of requests in flight. Defaults to 8.
+
+      max_span(int): Maximum number of points per request.
+        Defaults to :data:`MAX_SPAN`.
+
+      max_tokens(int): Maximum number of tokens per request.
+        Defaults to :data:`MAX_TOKENS`.
+
+    Returns:
+      Iterator[Point]: Points in timestamp order, then token order.
+
+    """
+
+    kwargs = {'period': period}
+    if search_width is not None:
+        kwargs['search_width'] = search_width
+    margin = duration_seconds(search_width or '3h')
+
+    requests: Dict[int, List[batch.Spec]] = {}
+    for window in plan_charts(tokens, start, end, period, max_span, max_tokens):
+        requests.setdefault(window.start, []).append(
+            (coins.get_charts, (_tokens(window.coins), window.start, None, window.span), kwargs))
+
+    # The points of a window are final once the next window, widened by the
+    # search width, can no longer return earlier points
+    starts = list(requests)
+    slots = [(starts[index + 1] - margin if index + 1 < len(starts) else float('inf'), requests[first])
+             for index, first in enumerate(starts)]
+
+    return _stitch(slots, _points, concurrency)
+
+
+def plan_historical(tokens: Dict[str, List[int]],
+                    max_length: int = None) -> List[Dict[str, List[int]]]:
+    """Split a historical batch into requests fitting in a URL.
+
+    The (token, timestamp) pairs are packed in timestamp order, so each
+    request covers a time range that follows the one of the previous request.
+
+    Args:
+      tokens(Dict[str, List[int]]): Timestamps requested for each
+        '{chain}:{address}' token.
+
+      max_length(int): Maximum length of the URLs.
+        Defaults to ``coins.MAX_URL_LENGTH``.
+
+    Returns:
+      List[Dict[str, List[int]]]: Requests in time order.
+
+    """
+
+    width = (max_length or coins.MAX_URL_LENGTH) - len(f"{coins.BASE_URL}/batchHistorical"
+                                                       "?coins=%7B%7D&searchWidth=") - 16
+    pairs = sorted((int(timestamp), coin) for coin, timestamps in tokens.items()
+                   for timestamp in timestamps)
+
+    requests, current, length = [], {}, 0
+    for timestamp, coin in pairs:
+        # '%22{coin}%22:%5B%5D,' for a new coin, then '{timestamp},'
+        added = len(str(timestamp)) + 1 + (0 if coin in current else len(coin) + 15)
+        if current and length + added > width:
+            requests.append(current)
+            current, length = {}, 0
+            added = len(str(timestamp)) + 1 + len(coin) + 15
+        current.setdefault(coin, []).append(timestamp)
+        length += added
+
+    if current:
+        requests.append(current)
+
+    return requests
+
+
+def historical(tokens: Dict[str, List[int]],
+               search_width: str = '6h',
+               concurrency: int = 8) -> Iterator[Point]:
+    """**Streams the prices of tokens at many timestamps.**
+
+    *Endpoint: GET /batchHistorical*
+
+    Args:
+      tokens(Dict[str, List[int]]): Timestamps requested for each
+        '{chain}:{address}' token.
+
+      search_width(str): Time period on either side to find price data.
+        Defaults to '6h'.
+
+      concurrency(int): Maximum number of requests in flight. Defaults to 8.
+
+    Returns:
+      Iterator[Point]: Points in timestamp order, then token order.
+
+    """
+
+    requests = plan_historical(tokens)
+    margin = duration_seconds(search_width)
+
+    # Prices are found up to search_width away from the requested
+    # timestamps, so a request is final once the next one, widened by the
+    # search width, can no longer return earlier points
+    slots = []
+    for index, request in enumerate(requests):
+        if index + 1 < len(requests):
+            boundary = min(min(timestamps) for timestamps in requests[index + 1].values()) - margin
+        else:
+            boundary = float('inf')
+        slots.append((boundary, [(coins.get_historical_batch, (request, search_width))]))
+
+    return _stitch(slots, _points, concurrency)
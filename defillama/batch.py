@@ -0,0 +1,492 @@
+"""Concurrent batch fetching on top of ``pycurl.CurlMulti``.
+
+Any function of the endpoint modules can be batched. A batch takes a list of
+specs, each one either a URL or a ``(function, args)`` /
+``(function, args, kwargs)`` tuple, and keeps up to ``concurrency`` transfers
+in flight on a single multi handle without using threads:
+
+    >>> from defillama import batch, tvl, coins
+    >>> batch.run([(tvl.get_protocols, ('aave',)),
+    ...            (tvl.get_protocols, ('uniswap',)),
+    ...            (coins.get_nearest_block, ('ethereum', 1680000000))])
+
+Functions are first called with the request layer in record mode to learn the
+URL(s) they need, the URLs are fetched concurrently, and the functions are
+then called again with the fetched responses so their own post-processing
+runs unchanged.
+
+Decoding large responses holds the GIL, so a batch of big payloads is
+bound to one core. With ``processes``, the raw response bodies are decoded
+in a process pool instead, optionally together with a ``transform``
+flattening the responses of URL specs where they are decoded:
+
+    >>> batch.run([f'https://api.llama.fi/summary/dexs/{slug}' for slug in slugs],
+    ...           processes=8, transform=flatten)
+"""
+
+import heapq
+import itertools
+import time
+import pycurl
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, wait
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from . import decoder
+from ._utils import PendingRequest, get, replay
+from .retry import DeadlineExceeded, remaining
+from .session import Response, Session, _Flight, get_session
+
+Spec = Union[str, Tuple]
+
+# Seconds between checks of the transfers waited for in other threads
+_POLL = 0.005
+
+
+class _MultiDriver:
+    """Drives a queue of URLs through a ``pycurl.CurlMulti`` handle.
+
+    URLs can be added while results are being consumed, and results can be
+    consumed again after they ran out. Each URL is fetched once; adding an
+    URL that is queued, in flight or already done is a no-op unless `again`
+    is set. Transfers are shared with the other requests of the session:
+    an URL already in flight elsewhere waits for that transfer instead of
+    starting its own.
+
+    Args:
+      session(Session): Session providing the Curl handles.
+      concurrency(int): Maximum number of transfers in flight.
+      raw(bool): Whether to yield the undecoded :class:`Response` of each
+        URL instead of its decoded body.
+
+    """
+
+    def __init__(self, session: Session, concurrency: int, raw: bool = False):
+        self.session = session
+        self.concurrency = max(1, concurrency)
+        self.raw = raw
+        self.multi = pycurl.CurlMulti()
+        if hasattr(pycurl, 'PIPE_MULTIPLEX'):
+            self.multi.setopt(pycurl.M_PIPELINING, pycurl.PIPE_MULTIPLEX)
+
+        self._queue: Deque[str] = deque()
+        self._seen = set()
+        self._active: Dict[pycurl.Curl, Tuple[str, any]] = {}
+        self._delay = 0.0
+        self._attempts: Dict[str, int] = {}
+        self._retries: List[Tuple[float, str]] = []
+        # Looked-up responses held back by the session, see Session.hold
+        self._held: List[Tuple[float, int, str, Response]] = []
+        self._order = itertools.count()
+        # Transfers led by this driver, and led elsewhere and waited for
+        self._leading: Dict[str, _Flight] = {}
+        self._following: Dict[str, _Flight] = {}
+
+    def add(self, url: str, again: bool = False) -> None:
+        if again or url not in self._seen:
+            self._seen.add(url)
+            self._queue.append(url)
+
+    def _start(self) -> List[Tuple[str, any]]:
+        cached = []
+        self._delay = 0.0
+
+        now = time.monotonic()
+        while self._retries and self._retries[0][0] <= now:
+            self._queue.appendleft(heapq.heappop(self._retries)[1])
+        while self._held and self._held[0][0] <= now:
+            _, _, url, response = heapq.heappop(self._held)
+            cached.append(self._result(url, response))
+        cached.extend(self._landed())
+
+        while self._queue and len(self._active) + len(self._held) < self.concurrency:
+            url = self._queue.popleft()
+            try:
+                response = self.session.lookup(url)
+            except Exception as e:
+                # e.g. a URL missing from a replayed cassette, failing
+                # alone rather than the whole batch
+                cached.append((url, e))
+                continue
+            if response is not None:
+                delay = self.session.hold(url)
+                if delay:
+                    heapq.heappush(self._held, (now + delay, next(self._order), url, response))
+                else:
+                    cached.append(self._result(url, response))
+                continue
+            if url not in self._leading:
+                flight, leader = self.session.lead(url)
+                if not leader:
+                    self._following[url] = flight
+                    continue
+                self._leading[url] = flight
+            self._delay = self.session.admit(url)
+            if self._delay:
+                # Held back by the rate limiter, retried after the delay
+                self._queue.appendleft(url)
+                break
+            curl = self.session.acquire(url)
+            state = self.session.prepare(curl, url)
+            self._active[curl] = (url, state)
+            self.multi.add_handle(curl)
+
+        if self._retries and not self._queue:
+            wait = max(0.0, self._retries[0][0] - now)
+            self._delay = min(self._delay, wait) if self._delay else wait
+        if self._held:
+            wait = max(0.0, self._held[0][0] - now)
+            self._delay = min(self._delay, wait) if self._delay else wait
+        if self._following:
+            self._delay = min(self._delay, _POLL) if self._delay else _POLL
+
+        return cached
+
+    def _landed(self) -> List[Tuple[str, any]]:
+        """Collect the transfers waited for that landed elsewhere."""
+
+        results = []
+        left = remaining()
+        for url, flight in list(self._following.items()):
+            if not flight.done.is_set():
+                if left is not None and left <= 0:
+                    del self._following[url]
+                    results.append((url, DeadlineExceeded(f"Deadline exceeded while waiting for {url}")))
+                continue
+            del self._following[url]
+            if flight.taken_over():
+                self._queue.appendleft(url)
+            elif flight.error is not None:
+                results.append((url, flight.error))
+            else:
+                results.append(self._result(url, flight.response, land=False))
+
+        return results
+
+    def _land(self, url: str, response: Response = None, error: BaseException = None) -> None:
+        flight = self._leading.pop(url, None)
+        if flight is not None:
+            self.session.land(url, flight, response=response, error=error)
+
+    def _retry(self, url: str, error: BaseException = None, response: Response = None) -> bool:
+        """Schedule another attempt of a failed URL if the retry policy
+        allows it."""
+
+        attempt = self._attempts.get(url, 0)
+        delay = self.session.retry.delay(attempt, error, response)
+        if delay is None:
+            return False
+
+        self._attempts[url] = attempt + 1
+        heapq.heappush(self._retries, (time.monotonic() + delay, url))
+
+        return True
+
+    def _done(self, curl: pycurl.Curl, error: Optional[pycurl.error]) -> Optional[Tuple[str, any]]:
+        url, state = self._active.pop(curl)
+        self.multi.remove_handle(curl)
+
+        if error is not None:
+            self.session.discard(url, curl)
+            if self._retry(url, error=error):
+                return None
+            left = remaining()
+            if left is not None and left <= 0:
+                error = DeadlineExceeded(f"Deadline exceeded while requesting {url}")
+            self._land(url, error=error)
+            return url, error
+
+        try:
+            response = self.session.finish(curl, url, state)
+        except Exception as e:
+            curl.close()
+            self._land(url, error=e)
+            return url, e
+
+        self.session.release(url, curl)
+
+        if self._retry(url, response=response):
+            return None
+
+        return self._result(url, response)
+
+    def _result(self, url: str, response: Response, land: bool = True) -> Tuple[str, any]:
+        if land:
+            self._land(url, response=response)
+        try:
+            response.raise_for_status()
+            return url, response if self.raw else response.json()
+        except Exception as e:
+            return url, e
+
+    def results(self) -> Iterator[Tuple[str, any]]:
+        """Run the transfers and yield ``(url, response)`` as they complete.
+
+        The response is the decoded JSON body (the :class:`Response` in raw
+        mode), or the exception raised while fetching or decoding it.
+        """
+
+        try:
+            while self._queue or self._active or self._retries or self._held or self._following:
+                yield from self._start()
+                if not self._active:
+                    if self._delay:
+                        time.sleep(self._delay)
+                    continue
+
+                ret = pycurl.E_CALL_MULTI_PERFORM
+                while ret == pycurl.E_CALL_MULTI_PERFORM:
+                    ret, _ = self.multi.perform()
+
+                finished = []
+                queued = 1
+                while queued:
+                    queued, ok, failed = self.multi.info_read()
+                    finished.extend((curl, None) for curl in ok)
+                    finished.extend((curl, pycurl.error(errno, errmsg))
+                                    for curl, errno, errmsg in failed)
+
+                for curl, error in finished:
+                    result = self._done(curl, error)
+                    if result is not None:
+                        yield result
+
+                if not finished and self._active:
+                    timeout = self.multi.timeout()
+                    timeout = 1.0 if timeout < 0 else timeout / 1000
+                    if self._delay:
+                        timeout = min(timeout, self._delay)
+                    self.multi.select(timeout)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        """Abort the transfers in flight and release the multi handle."""
+
+        for curl, (url, _) in list(self._active.items()):
+            self.multi.remove_handle(curl)
+            self.session.discard(url, curl, failed=False)
+        self._active.clear()
+        self._held.clear()
+        # Followers elsewhere take the unfinished transfers over
+        for url in list(self._leading):
+            self._land(url)
+        self._following.clear()
+        self.multi.close()
+
+
+def _parse_spec(spec: Spec) -> Tuple[callable, tuple, dict]:
+    if isinstance(spec, str):
+        return get, (spec,), {}
+
+    func, args, kwargs = (tuple(spec) + ((), {}))[:3]
+
+    return func, tuple(args), dict(kwargs)
+
+
+def _decode(body: bytes, backend: str, transform: Optional[Callable], keep: bool) -> Tuple[any, any]:
+    """Decode a response body in a worker process.
+
+    Returns the decoded body if `keep` is set and the result of `transform`
+    on it if there is one, so that only what the caller needs is sent back.
+    """
+
+    data = decoder.loads(body, backend)
+
+    return (data if keep else None), (transform(data) if transform is not None else None)
+
+
+def as_completed(specs: Iterable[Spec],
+                 concurrency: int = 64,
+                 return_exceptions: bool = False,
+                 session: Session = None,
+                 processes: Union[int, Executor] = 0,
+                 transform: Callable[[any], any] = None) -> Iterator[Tuple[int, any]]:
+    """**Runs a batch of requests and yields results as they complete.**
+
+    Args:
+      specs(Iterable[Spec]): URLs or ``(function, args)`` /
+        ``(function, args, kwargs)`` tuples of any endpoint module function.
+
+      concurrency(int): Maximum number of requests in flight.
+        Defaults to 64.
+
+      return_exceptions(bool): Whether to yield the exception of a failed
+        spec as its result instead of raising it. Defaults to False.
+
+      session(Session): Session to use. Defaults to the shared session.
+
+      processes(Union[int, Executor]): Number of worker processes decoding
+        the response bodies, or an executor to decode them on, e.g. a
+        ``ProcessPoolExecutor`` shared by several batches. Defaults to 0
+        (decoding in the calling thread).
+
+      transform(Callable[[any], any]): Picklable function applied to the
+        decoded body of each URL spec, in the worker process with
+        `processes`, its return value becoming the result of the spec.
+        Returning a flattened form, e.g. a NumPy array, also keeps the
+        nested body from being sent back. Defaults to None.
+
+    Returns:
+      Iterator[Tuple[int, any]]: Index of the spec and its result, in
+      completion order.
+
+    """
+
+    if isinstance(processes, Executor):
+        pool, owned = processes, False
+    elif processes:
+        pool, owned = ProcessPoolExecutor(processes), True
+    else:
+        pool, owned = None, False
+
+    driver = _MultiDriver(session or get_session(), concurrency, raw=pool is not None)
+    parsed = [_parse_spec(spec) for spec in specs]
+    # Plain URL specs, whose result is the transformed body
+    plain: Dict[str, List[int]] = {}
+    responses: Dict[str, any] = {}
+    transformed: Dict[str, any] = {}
+    waiting: Dict[str, List[int]] = {}
+    needed = set()
+    decoding: Dict[Future, Tuple[str, bool]] = {}
+    backend = decoder.get_backend()
+
+    def fail(index: int, error: Exception) -> Iterator[Tuple[int, any]]:
+        if not return_exceptions:
+            raise error
+        yield index, error
+
+    def attempt(index: int) -> Iterator[Tuple[int, any]]:
+        func, args, kwargs = parsed[index]
+        try:
+            result = replay(responses, func, *args, **kwargs)
+        except PendingRequest as pending:
+            urls = [url for url in pending.urls if url not in responses]
+            for url in urls:
+                needed.add(url)
+                # A body only kept in its transformed form is fetched again
+                driver.add(url, again=url in transformed)
+                transformed.pop(url, None)
+            # Attempted again once the first URL is in, then after each
+            # of the others still missing
+            waiting.setdefault(urls[0], []).append(index)
+            return
+        except Exception as e:
+            yield from fail(index, e)
+            return
+
+        yield index, result
+
+    def arrived(url: str, response: any, result: any = None,
+                kept: bool = True) -> Iterator[Tuple[int, any]]:
+        for index in plain.pop(url, ()):
+            if isinstance(response, Exception):
+                yield from fail(index, response)
+            else:
+                yield index, result
+        if isinstance(response, Exception) or (kept and (url in needed or transform is None
+                                                         or pool is None)):
+            responses[url] = response
+            for index in waiting.pop(url, ()):
+                yield from attempt(index)
+        elif url in needed:
+            # Needed by a function spec after its body was sent to be
+            # decoded in transformed form only
+            driver.add(url, again=True)
+        else:
+            transformed[url] = result
+
+    def decoded(future: Future) -> Iterator[Tuple[int, any]]:
+        url, keep = decoding.pop(future)
+        try:
+            data, result = future.result()
+        except Exception as e:
+            yield from arrived(url, e)
+            return
+        yield from arrived(url, data, result if transform is not None else data, keep)
+
+    def received(url: str, response: any) -> Iterator[Tuple[int, any]]:
+        if isinstance(response, Exception):
+            yield from arrived(url, response)
+        elif pool is not None:
+            keep = url in needed or transform is None
+            decoding[pool.submit(_decode, response.body, backend,
+                                 transform if url in plain else None, keep)] = url, keep
+        elif transform is not None and url in plain:
+            try:
+                result = transform(response)
+            except Exception as e:
+                yield from arrived(url, e)
+                return
+            yield from arrived(url, response, result)
+        else:
+            yield from arrived(url, response, response)
+
+    try:
+        for index, (func, args, kwargs) in enumerate(parsed):
+            if (func is get and len(args) == 1 and not kwargs
+                    and (pool is not None or transform is not None)):
+                url = args[0]
+                plain.setdefault(url, []).append(index)
+                driver.add(url)
+            else:
+                yield from attempt(index)
+
+        while True:
+            for url, response in driver.results():
+                yield from received(url, response)
+                for future in [future for future in decoding if future.done()]:
+                    yield from decoded(future)
+            if not decoding:
+                break
+            done, _ = wait(list(decoding), return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from decoded(future)
+    finally:
+        driver.close()
+        for future in decoding:
+            future.cancel()
+        if owned:
+            pool.shutdown(wait=False)
+
+
+def run(specs: Iterable[Spec],
+        concurrency: int = 64,
+        return_exceptions: bool = False,
+        session: Session = None,
+        processes: Union[int, Executor] = 0,
+        transform: Callable[[any], any] = None) -> List[any]:
+    """**Runs a batch of requests and returns the results in spec order.**
+
+    Args:
+      specs(Iterable[Spec]): URLs or ``(function, args)`` /
+        ``(function, args, kwargs)`` tuples of any endpoint module function.
+
+      concurrency(int): Maximum number of requests in flight.
+        Defaults to 64.
+
+      return_exceptions(bool): Whether to return the exception of a failed
+        spec as its result instead of raising it. Defaults to False.
+
+      session(Session): Session to use. Defaults to the shared session.
+
+      processes(Union[int, Executor]): Number of worker processes decoding
+        the response bodies, or an executor to decode them on.
+        Defaults to 0 (decoding in the calling thread).
+
+      transform(Callable[[any], any]): Picklable function applied to the
+        decoded body of each URL spec. Defaults to None.
+
+    Returns:
+      List[any]: Result of each spec.
+
+    """
+
+    specs = list(specs)
+    results = [None] * len(specs)
+
+    for index, result in as_completed(specs, concurrency, return_exceptions, session,
+                                      processes, transform):
+        results[index] = result
+
+    return results
@@ -1,10 +1,18 @@
-from typing import List, Dict
-from ._utils import get
+import calendar
+import time
+from typing import Iterator, List, Dict, Optional, Tuple, Union
+from . import models
+from .batch import _MultiDriver
+from .frame import Frame
+from .session import get_session
+from .store import get_store, settled
+from ._utils import get, get_records
 
 BASE_URL = "https://bridges.llama.fi"
 
 
-def get_bridges(include_chains: bool = True) -> List[Dict[str, any]]:
+def get_bridges(include_chains: bool = True,
+                model: bool = False) -> List[Dict[str, any]]:
     """**Returns a list of bridges with summaries of their
     recent volumes.**
 
@@ -33,6 +41,9 @@ def get_bridges(include_chains: bool = True) -> List[Dict[str, any]]:
 
       include_chains: bool:  (Default value = True)
 
+      model(bool): Whether to return :class:`defillama.models.Bridge` records
+        instead of dicts. Defaults to False.
+
     Returns:
       List[Dict[str, any]]: Requested data
 
@@ -40,6 +51,9 @@ def get_bridges(include_chains: bool = True) -> List[Dict[str, any]]:
 
     url = f"{BASE_URL}/bridges?includeChains={str(include_chains).lower()}"
 
+    if model:
+        return get_records(url, models.Bridge, ('bridges',))
+
     return get(url)['bridges']
 
 
@@ -83,7 +97,8 @@ def get_bridge_by_id(id: int) -> Dict[str, any]:
 
 
 def get_volume(chain: str = 'all',
-               id: int = None) -> List[Dict[str, any]]:
+               id: int = None,
+               as_arrays: bool = False) -> Union[List[Dict[str, any]], Frame]:
     """**Returns histirical volume data for a bridge, chain, or bridge on a
     particular chain.**
 
@@ -103,8 +118,11 @@ def get_volume(chain: str = 'all',
 
       id(int): Bridge ID. Defaults to None.
 
+      as_arrays(bool): Whether to return a :class:`defillama.frame.Frame`
+        of NumPy arrays instead of a list of dicts. Defaults to False.
+
     Returns:
-      List[Dict[str, any]]: Requested data
+      List[Dict[str, any]] | Frame: Requested data
 
     """
 
@@ -113,6 +131,10 @@ def get_volume(chain: str = 'all',
     else:
         url = f"{BASE_URL}/bridgevolume/{chain}?id={id}"
 
+    if as_arrays:
+        return Frame.from_records(get(url), 'date',
+                                  ('depositUSD', 'withdrawUSD', 'depositTxs', 'withdrawTxs'))
+
     return get(url)
 
 
@@ -145,6 +167,9 @@ def get_stats(timestamp: int,
 
       id(int): Bridge ID. Defaults to None.
 
+    Statistics of past days are read from and saved to the store of
+    :mod:`defillama.store` when one is configured.
+
     Returns:
       Dict[str, any]: Requested data
 
@@ -155,7 +180,18 @@ def get_stats(timestamp: int,
     else:
         url = f"{BASE_URL}/bridgedaystats/{timestamp}/{chain}?id={id}"
 
-    return get(url)
+    day = int(timestamp) - int(timestamp) % 86400
+    store = get_store()
+    if store is None or not settled(day + 86400):
+        return get(url)
+
+    key = f"{chain}@{day}@{id}"
+    stats = store.get('bridge_stats', key)
+    if stats is None:
+        stats = get(url)
+        store.put('bridge_stats', key, stats)
+
+    return stats
 
 
 def get_transactions(id: int,
@@ -204,6 +240,169 @@ def get_transactions(id: int,
 
     """
 
-    url = f"{BASE_URL}/transactions/{id}?starttimestamp={start}&endtimestamp={end}&sourcechain={chain}&address={address}&limit={limit}"
+    return get(_transactions_url(id, chain, address, start, end, limit))
 
-    return get(url)
+
+def _transactions_url(id: int, chain: str, address: dict, start: int, end: int, limit: int) -> str:
+    return f"{BASE_URL}/transactions/{id}?starttimestamp={start}&endtimestamp={end}&sourcechain={chain}&address={address}&limit={limit}"
+
+
+class _Window:
+    """Time window of a transactions request, bounds included."""
+
+    __slots__ = ('first', 'last', 'requested', 'transactions')
+
+    def __init__(self, first: int, last: int):
+        self.first = first
+        self.last = last
+        self.requested = False
+        # Timestamps and transactions, once fetched
+        self.transactions: Optional[List[Tuple[int, Dict[str, any]]]] = None
+
+    def __len__(self) -> int:
+        return self.last - self.first + 1
+
+
+def _timestamp(value: any) -> Optional[int]:
+    """Return the UNIX timestamp of a transaction, given as a number, a
+    numeric string or an ISO 8601 string."""
+
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return calendar.timegm(time.strptime(value[:19], '%Y-%m-%dT%H:%M:%S'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _identity(transaction: Dict[str, any]) -> Tuple:
+    """Return the fields telling two transfers apart, one transaction
+    possibly moving several tokens."""
+
+    return (transaction.get('tx_hash'), transaction.get('token'), transaction.get('tx_from'),
+            transaction.get('tx_to'), transaction.get('amount'), transaction.get('is_deposit'))
+
+
+def iter_transactions(id: int,
+                      chain: str,
+                      address: dict,
+                      start: int,
+                      end: int,
+                      limit: int = 100,
+                      window: int = 86400,
+                      concurrency: int = 8) -> Iterator[Dict[str, any]]:
+    """**Streams all the transactions for a bridge within a date range,
+    however many there are.**
+
+    The range is requested in consecutive time windows, several at a time.
+    A window returning `limit` transactions may have been truncated, so it
+    is split in two halves that are requested instead, and the following
+    windows are made narrower; windows returning fewer than a quarter of
+    `limit` make the following ones wider. Transactions are yielded as soon
+    as every earlier window has arrived, and only the `concurrency` oldest
+    windows not yielded yet are requested, so at most `concurrency` windows
+    of transactions are held in memory.
+
+    The windows are fetched on a multi handle of the shared session, which
+    applies its cache and rate limiter, rather than through the module
+    functions: the iterator is not batched by :mod:`defillama.batch` and
+    has no asyncio version in :mod:`defillama.aio`.
+
+    *Endpoint: GET /transactions/{id}*
+
+    Args:
+      id(int): Bridge ID
+
+      chain(str): Chain slug
+
+      address(dict): Chain name and from/to address as key-value pair
+
+      start(int): Start timestamp for date range
+
+      end(int): End timestamp for date range
+
+      limit(int): Number of transactions per request.
+        Defaults to 100.
+
+      window(int): Duration in seconds of the first windows.
+        Defaults to 86400.
+
+      concurrency(int): Maximum number of requests in flight.
+        Defaults to 8.
+
+    Returns:
+      Iterator[Dict[str, any]]: Transactions in timestamp order, each
+      once. A single second holding more than `limit` transactions cannot
+      be split further and yields the first `limit` of them.
+
+    """
+
+    start, end = int(start), int(end)
+    span = max(1, min(int(window), end - start + 1))
+    driver = _MultiDriver(get_session(), concurrency)
+    # Windows in time order, from the oldest not yielded yet
+    windows: List[_Window] = []
+    requested: Dict[str, _Window] = {}
+    cursor = start
+
+    def fill() -> None:
+        nonlocal cursor
+        while len(windows) < concurrency and cursor <= end:
+            windows.append(_Window(cursor, min(end, cursor + span - 1)))
+            cursor = windows[-1].last + 1
+
+        # Halves of split windows may push the later windows past the
+        # oldest ones, which are requested once they move up
+        for item in windows[:concurrency]:
+            if not item.requested:
+                item.requested = True
+                url = _transactions_url(id, chain, address, item.first, item.last, limit)
+                requested[url] = item
+                driver.add(url, again=True)
+
+    fill()
+    # Identities of the transactions yielded at the current timestamp
+    seen, current = set(), None
+
+    try:
+        for url, result in driver.results():
+            item = requested.pop(url)
+            if isinstance(result, BaseException):
+                raise result
+
+            if len(result) >= limit and len(item) > 1:
+                # Possibly truncated: request both halves instead
+                middle = item.first + len(item) // 2
+                halves = [_Window(item.first, middle - 1), _Window(middle, item.last)]
+                index = next(index for index, other in enumerate(windows) if other is item)
+                windows[index:index + 1] = halves
+                span = max(1, min(span, len(item) // 2))
+            else:
+                # Transactions without a readable timestamp are kept at the
+                # start of their window
+                stamped = [(_timestamp(transaction.get('ts')), transaction) for transaction in result]
+                stamped = [(item.first if timestamp is None else timestamp, transaction)
+                           for timestamp, transaction in stamped]
+                stamped.sort(key=lambda pair: pair[0])
+                item.transactions = [pair for pair in stamped
+                                     if item.first <= pair[0] <= item.last]
+                if len(result) < limit // 4:
+                    span = min(span * 2, end - start + 1)
+
+            fill()
+
+            while windows and windows[0].transactions is not None:
+                transactions = windows.pop(0).transactions
+                fill()
+                for timestamp, transaction in transactions:
+                    if timestamp != current:
+                        seen.clear()
+                        current = timestamp
+                    identity = _identity(transaction)
+                    if identity not in seen:
+                        seen.add(identity)
+                        yield transaction
+    finally:
+        driver.close()
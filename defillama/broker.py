@@ -0,0 +1,217 @@
+"""Micro-batching of current price lookups made by many independent callers.
+
+A :class:`PriceBroker` collects the tokens requested by any number of threads
+and coroutines over a short window, requests all of them with a single call
+to ``coins.get_current_prices`` and hands each caller its own price:
+
+    >>> from defillama.broker import PriceBroker
+    >>> broker = PriceBroker(window=0.005)
+    >>> broker.get_price('coingecko:ethereum')                  # in a thread
+    >>> await broker.get_price_async({'ethereum': '0x...'})     # in a coroutine
+
+Under load, hundreds of lookups are served by one request per window instead
+of one request each.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+from . import coins
+
+Token = Union[str, Dict[str, str]]
+
+
+def _coin(token: Token) -> str:
+    """Return the '{chain}:{address}' form of a token."""
+
+    if isinstance(token, dict) and len(token) == 1:
+        (chain, address), = token.items()
+        token = f"{chain}:{address}"
+
+    if not isinstance(token, str) or not all(token.partition(':')[::2]):
+        raise ValueError(f"Token must be '{{chain}}:{{address}}' or {{chain: address}}, got {token!r}")
+
+    return token
+
+
+class PriceBroker:
+    """Merges the current price lookups of concurrent callers into batches.
+
+    A batch is requested when the first lookup of the batch is `window`
+    seconds old or when it holds `max_tokens` distinct tokens, whichever
+    comes first. Batches are requested on a small thread pool so lookups keep
+    being collected while earlier batches are in flight.
+
+    Args:
+      window(float): Longest time in seconds a lookup waits for others to
+        join its batch. Defaults to 5 ms.
+
+      max_tokens(int): Number of distinct tokens that triggers a batch
+        immediately. Defaults to 200.
+
+      search_width(str): Search width of the price requests, see
+        ``coins.get_current_prices``. Defaults to '6h'.
+
+      max_workers(int): Maximum number of batches in flight.
+        Defaults to 4.
+
+    """
+
+    def __init__(self,
+                 window: float = 0.005,
+                 max_tokens: int = 200,
+                 search_width: str = '6h',
+                 max_workers: int = 4):
+        self.window = window
+        self.max_tokens = max(1, max_tokens)
+        self.search_width = search_width
+
+        self._pending: Dict[str, List[Future]] = {}
+        self._deadline: Optional[float] = None
+        self._closed = False
+        self._counters = {'lookups': 0, 'requests': 0}
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='defillama-broker')
+        self._thread = threading.Thread(target=self._collect, name='defillama-broker', daemon=True)
+        self._thread.start()
+
+    def submit(self, token: Token) -> Future:
+        """Add a price lookup to the current batch.
+
+        Args:
+          token(Token): Token as '{chain}:{address}' or {chain: address}.
+            Can also use 'coingecko:{protocol}' for tokens listed on coingecko.
+
+        Returns:
+          Future: Future resolving to the price data of the token, or to None
+          if DeFiLlama has no price for it.
+
+        Raises:
+          ValueError: If the token is not in one of the above forms.
+
+        """
+
+        coin = _coin(token)
+        future = Future()
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('PriceBroker is closed')
+            self._pending.setdefault(coin, []).append(future)
+            self._counters['lookups'] += 1
+            if self._deadline is None:
+                self._deadline = time.monotonic() + self.window
+                self._cond.notify()
+            elif len(self._pending) >= self.max_tokens:
+                self._cond.notify()
+
+        return future
+
+    def get_price(self, token: Token, timeout: float = None) -> Optional[Dict[str, any]]:
+        """Look up the current price of a token, blocking until it is known.
+
+        Args:
+          token(Token): Token as '{chain}:{address}' or {chain: address}.
+
+          timeout(float): Maximum time to wait in seconds. Defaults to None
+            (no limit).
+
+        Returns:
+          Optional[Dict[str, any]]: Price data of the token as returned by
+          ``coins.get_current_prices``, or None if it has no price.
+
+        """
+
+        return self.submit(token).result(timeout)
+
+    async def get_price_async(self, token: Token) -> Optional[Dict[str, any]]:
+        """Look up the current price of a token without blocking the event
+        loop.
+
+        Args:
+          token(Token): Token as '{chain}:{address}' or {chain: address}.
+
+        Returns:
+          Optional[Dict[str, any]]: Price data of the token, or None if it
+          has no price.
+
+        """
+
+        return await asyncio.wrap_future(self.submit(token))
+
+    def flush(self) -> None:
+        """Request the current batch without waiting for its window to end."""
+
+        with self._cond:
+            if self._pending:
+                self._deadline = time.monotonic()
+                self._cond.notify()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of lookups received and requests made.
+
+        Returns:
+          Dict[str, int]: 'lookups' and 'requests'.
+
+        """
+
+        with self._cond:
+            return dict(self._counters)
+
+    def _collect(self) -> None:
+        with self._cond:
+            while True:
+                while not self._closed and (
+                        self._deadline is None
+                        or (len(self._pending) < self.max_tokens
+                            and time.monotonic() < self._deadline)):
+                    timeout = None if self._deadline is None else self._deadline - time.monotonic()
+                    self._cond.wait(timeout)
+
+                if self._pending:
+                    batch, self._pending, self._deadline = self._pending, {}, None
+                    self._counters['requests'] += 1
+                    self._executor.submit(self._request, batch)
+
+                if self._closed:
+                    return
+
+    def _request(self, batch: Dict[str, List[Future]]) -> None:
+        batch = {coin: [future for future in futures if future.set_running_or_notify_cancel()]
+                 for coin, futures in batch.items()}
+
+        try:
+            tokens = [dict([coin.split(':', 1)]) for coin, futures in batch.items() if futures]
+            if not tokens:
+                return
+            prices = coins.get_current_prices(tokens, self.search_width)
+            # Addresses may come back in another case than requested
+            lowered = {coin.lower(): price for coin, price in prices.items()}
+        except BaseException as e:
+            for futures in batch.values():
+                for future in futures:
+                    future.set_exception(e)
+            return
+
+        for coin, futures in batch.items():
+            price = prices.get(coin, lowered.get(coin.lower()))
+            for future in futures:
+                future.set_result(price)
+
+    def close(self) -> None:
+        """Request the pending lookups and stop the broker."""
+
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> 'PriceBroker':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,384 @@
+"""HTTP response cache for the session.
+
+Most DeFiLlama payloads only change every few minutes, and some (first
+prices, nearest blocks) never change at all. An :class:`HTTPCache` attached
+to a session serves repeated requests locally while they are fresh and
+revalidates them with ``If-None-Match``/``If-Modified-Since`` once they
+expire, so an unchanged payload costs a 304 instead of a full download:
+
+    >>> from defillama import cache
+    >>> cache.enable()                                 # in memory
+    >>> cache.enable(cache.DiskCache('~/.cache/defillama'))
+
+Freshness is decided per endpoint by :data:`DEFAULT_TTLS`, and both backends
+are bounded by a size limit with least-recently-used eviction.
+"""
+
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+from .session import Response, get_session
+
+# Time to live in seconds of the responses of each endpoint, matched in order
+# against '{host}{path}'. The first matching pattern wins.
+DEFAULT_TTLS: List[Tuple[str, float]] = [
+    (r'coins\.llama\.fi/prices/current/', 60),
+    (r'coins\.llama\.fi/percentage/', 60),
+    (r'coins\.llama\.fi/prices/first/', 7 * 86400),
+    (r'coins\.llama\.fi/block/', 7 * 86400),
+    (r'coins\.llama\.fi/(prices/historical|batchHistorical)', 3600),
+    (r'coins\.llama\.fi/chart/', 600),
+    (r'api\.llama\.fi/tvl/', 60),
+    (r'api\.llama\.fi/(overview|summary)/', 600),
+    (r'api\.llama\.fi/', 300),
+    (r'yields\.llama\.fi/chart/', 3600),
+    (r'yields\.llama\.fi/', 300),
+    (r'stablecoins\.llama\.fi/', 600),
+    (r'bridges\.llama\.fi/', 300),
+    (r'abi-decoder\.llama\.fi/', 7 * 86400),
+]
+
+DEFAULT_TTL = 60
+
+_HEADERS = ('etag', 'last-modified', 'content-type')
+
+
+class Entry:
+    """Cached response.
+
+    Args:
+      url(str): URL of the response.
+      body(bytes): Response body.
+      headers(Dict[str, str]): Validator and content headers of the response.
+      expires(float): UNIX time at which the entry becomes stale.
+
+    """
+
+    __slots__ = ('url', 'body', 'headers', 'expires')
+
+    def __init__(self, url: str, body: bytes, headers: Dict[str, str], expires: float):
+        self.url = url
+        self.body = body
+        self.headers = headers
+        self.expires = expires
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+    def fresh(self) -> bool:
+        return time.time() < self.expires
+
+    def validators(self) -> List[str]:
+        """Request headers revalidating the entry."""
+
+        headers = []
+        if 'etag' in self.headers:
+            headers.append(f"If-None-Match: {self.headers['etag']}")
+        if 'last-modified' in self.headers:
+            headers.append(f"If-Modified-Since: {self.headers['last-modified']}")
+
+        return headers
+
+    def response(self) -> Response:
+        return Response(self.url, 200, self.body, dict(self.headers))
+
+
+class MemoryCache:
+    """In-memory LRU cache backend.
+
+    Args:
+      max_bytes(int): Maximum total size of the cached bodies.
+        Defaults to 256 MiB.
+
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[str, Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, url: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+
+        return entry
+
+    def set(self, entry: Entry) -> None:
+        if entry.size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(entry.url, None)
+            if previous is not None:
+                self.size -= previous.size
+            self._entries[entry.url] = entry
+            self.size += entry.size
+
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class DiskCache:
+    """On-disk LRU cache backend, one file per response.
+
+    Entries survive restarts and can be shared by the processes of a node.
+    Recency is tracked through the modification time of the files, and the
+    size limit is enforced against the files found in the directory.
+
+    Args:
+      directory(str): Directory holding the cache files. Created if missing.
+
+      max_bytes(int): Maximum total size of the cache files.
+        Defaults to 1 GiB.
+
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 2 ** 30):
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._sizes: Dict[str, int] = {}
+        for name in os.listdir(self.directory):
+            if name.endswith('.entry'):
+                self._sizes[name] = os.path.getsize(os.path.join(self.directory, name))
+        self.size = sum(self._sizes.values())
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def _name(self, url: str) -> str:
+        return hashlib.sha1(url.encode('utf-8')).hexdigest() + '.entry'
+
+    def get(self, url: str) -> Optional[Entry]:
+        path = os.path.join(self.directory, self._name(url))
+        try:
+            with open(path, 'rb') as f:
+                length, = struct.unpack('>I', f.read(4))
+                meta = json.loads(f.read(length))
+                body = f.read()
+            os.utime(path)
+        except (OSError, ValueError, struct.error):
+            return None
+
+        if meta['url'] != url:
+            return None
+
+        return Entry(url, body, meta['headers'], meta['expires'])
+
+    def set(self, entry: Entry) -> None:
+        if entry.size > self.max_bytes:
+            return
+
+        name = self._name(entry.url)
+        path = os.path.join(self.directory, name)
+        meta = json.dumps({'url': entry.url, 'headers': entry.headers,
+                           'expires': entry.expires}).encode('utf-8')
+
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(struct.pack('>I', len(meta)))
+            f.write(meta)
+            f.write(entry.body)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self.size += 4 + len(meta) + entry.size - self._sizes.get(name, 0)
+            self._sizes[name] = 4 + len(meta) + entry.size
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        def mtime(name: str) -> float:
+            try:
+                return os.path.getmtime(os.path.join(self.directory, name))
+            except OSError:
+                return 0
+
+        for name in sorted(self._sizes, key=mtime):
+            if self.size <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            self.size -= self._sizes.pop(name)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for name in self._sizes:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+            self._sizes.clear()
+            self.size = 0
+
+
+class HTTPCache:
+    """Response cache with per-endpoint TTLs and conditional revalidation.
+
+    Args:
+      backend(MemoryCache | DiskCache): Storage of the entries.
+        Defaults to a :class:`MemoryCache`.
+
+      ttls(Sequence[Tuple[str, float]]): Regular expressions matched against
+        '{host}{path}' of the URL and the time to live of the matching
+        responses in seconds. Checked before :data:`DEFAULT_TTLS`.
+
+      default_ttl(float): Time to live of the responses matching no pattern.
+        Defaults to 60 seconds.
+
+    """
+
+    def __init__(self,
+                 backend: 'MemoryCache | DiskCache' = None,
+                 ttls: Sequence[Tuple[str, float]] = (),
+                 default_ttl: float = DEFAULT_TTL):
+        self.backend = backend if backend is not None else MemoryCache()
+        self.default_ttl = default_ttl
+        self._ttls = [(re.compile(pattern), ttl) for pattern, ttl in list(ttls) + DEFAULT_TTLS]
+        self._counters = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stores': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def ttl(self, url: str) -> float:
+        """Return the time to live of the responses of a URL.
+
+        Args:
+          url(str): Requested URL.
+
+        Returns:
+          float: Time to live in seconds.
+
+        """
+
+        parts = urlsplit(url)
+        target = parts.netloc + parts.path
+
+        for pattern, ttl in self._ttls:
+            if pattern.match(target):
+                return ttl
+
+        return self.default_ttl
+
+    def lookup(self, url: str) -> Optional[Response]:
+        """Return the cached response of a URL if it is fresh."""
+
+        entry = self.backend.get(url)
+
+        if entry is not None and entry.fresh():
+            self._count('hits')
+            return entry.response()
+
+        self._count('misses')
+
+        return None
+
+    def stale(self, url: str) -> Optional[Entry]:
+        """Return the cached entry of a URL that can be revalidated."""
+
+        entry = self.backend.get(url)
+
+        if entry is not None and entry.validators():
+            return entry
+
+        return None
+
+    def revalidated(self, url: str, entry: Entry, headers: Dict[str, str]) -> Response:
+        """Refresh an entry confirmed unchanged by a 304 response."""
+
+        entry.headers.update((name, headers[name]) for name in _HEADERS if name in headers)
+        entry.expires = time.time() + self.ttl(url)
+        self.backend.set(entry)
+        self._count('revalidated')
+
+        return entry.response()
+
+    def store(self, response: Response) -> None:
+        """Store a successful response."""
+
+        ttl = self.ttl(response.url)
+        if ttl <= 0:
+            return
+
+        headers = {name: response.headers[name] for name in _HEADERS if name in response.headers}
+        self.backend.set(Entry(response.url, response.body, headers, time.time() + ttl))
+        self._count('stores')
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hit/miss counters and the size of the cache.
+
+        Returns:
+          Dict[str, int]: 'hits', 'misses', 'revalidated' (304 responses),
+          'stores', 'evictions', 'entries' and 'bytes'.
+
+        """
+
+        with self._lock:
+            stats = dict(self._counters)
+
+        stats['evictions'] = self.backend.evictions
+        stats['entries'] = len(self.backend)
+        stats['bytes'] = self.backend.size
+
+        return stats
+
+    def clear(self) -> None:
+        """Drop every entry."""
+
+        self.backend.clear()
+
+
+def enable(backend: 'MemoryCache | DiskCache' = None, **kwargs) -> HTTPCache:
+    """Attach a cache to the shared session.
+
+    Args:
+      backend(MemoryCache | DiskCache): Storage of the entries.
+        Defaults to a :class:`MemoryCache`.
+
+      **kwargs: Other arguments of :class:`HTTPCache`.
+
+    Returns:
+      HTTPCache: Attached cache.
+
+    """
+
+    cache = HTTPCache(backend, **kwargs)
+    get_session().cache = cache
+
+    return cache
+
+
+def disable() -> None:
+    """Detach the cache of the shared session."""
+
+    get_session().cache = None
@@ -0,0 +1,332 @@
+"""Record and replay of API responses for network-free runs.
+
+A :class:`Cassette` is a zip archive of response bodies indexed by URL. A
+:class:`CassetteSession` records the responses it fetches into one, or
+serves them back from it without any request, and :func:`use_cassette`
+swaps it in for the shared session of every module:
+
+    >>> from defillama import cassette, tvl
+    >>> with cassette.use_cassette('protocols.zip', mode='record'):
+    ...     tvl.get_protocols()                          # real request
+    >>> with cassette.use_cassette('protocols.zip', latency=0.05, jitter=0.01):
+    ...     tvl.get_protocols()                          # replayed
+
+Replayed responses skip the transport, the rate limiter and the cache, so a
+replay measures the overhead of the client and of its callers alone. The
+simulated latency is waited like a transfer would be: synchronous calls
+sleep it, while batch and asyncio runs keep serving other responses in the
+meantime, so concurrent replays overlap their latencies.
+
+Modes:
+
+* 'replay': only serve recorded responses, raising :class:`CassetteMiss`
+  for the others.
+* 'record': make every request and record its response.
+* 'new': serve recorded responses and record the others.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+from .session import HTTPError, Response, Session, Transfer, set_session
+
+MODES = ('replay', 'record', 'new')
+
+_INDEX = 'index.json'
+_VERSION = 1
+
+# Headers describing the body as received, not as recorded
+_DROPPED = ('content-encoding', 'content-length', 'transfer-encoding')
+
+# Size of the chunks of replayed streams
+_CHUNK = 65536
+
+
+class CassetteMiss(LookupError):
+    """Raised when a replaying session is asked for an unrecorded URL."""
+
+
+class Cassette:
+    """Recorded responses, stored as a zip archive.
+
+    Each body is a deflated member of the archive, and an index member maps
+    the URLs to their member, status and headers. Bodies are read on first
+    use and kept in memory.
+
+    Args:
+      path(str): Path of the archive. It does not need to exist yet.
+
+      key(Callable[[str], str]): Function mapping a URL to the key it is
+        recorded under, e.g. dropping a query parameter that changes on
+        every run. Defaults to the URL itself.
+
+    """
+
+    def __init__(self, path: str, key: Callable[[str], str] = None):
+        self.path = os.path.expanduser(path)
+        self.key = key or (lambda url: url)
+        self._index: Dict[str, Dict[str, any]] = {}
+        self._bodies: Dict[str, bytes] = {}
+        self._archive: Optional[zipfile.ZipFile] = None
+        self._changed = False
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.path):
+            self._archive = zipfile.ZipFile(self.path)
+            self._index = json.loads(self._archive.read(_INDEX))['entries']
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, url: str) -> bool:
+        return self.key(url) in self._index
+
+    def get(self, url: str) -> Optional[Response]:
+        """Return the recorded response of a URL.
+
+        Args:
+          url(str): Requested URL.
+
+        Returns:
+          Optional[Response]: Recorded response, or None if the URL was not
+          recorded.
+
+        """
+
+        key = self.key(url)
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+
+        body = self._bodies.get(key)
+        if body is None:
+            with self._lock:
+                body = self._bodies.get(key)
+                if body is None:
+                    body = self._bodies[key] = self._archive.read(entry['name'])
+
+        return Response(url, entry['status'], body, dict(entry['headers']))
+
+    def add(self, response: Response) -> None:
+        """Record a response, replacing any earlier one of its URL.
+
+        Args:
+          response(Response): Response with its decompressed body.
+
+        """
+
+        key = self.key(response.url)
+        headers = {name: value for name, value in response.headers.items() if name not in _DROPPED}
+
+        with self._lock:
+            entry = self._index.get(key)
+            name = entry['name'] if entry is not None else f'{len(self._index):06d}'
+            self._index[key] = {'name': name, 'status': response.status,
+                                'headers': headers, 'recorded': int(time.time())}
+            self._bodies[key] = response.body
+            self._changed = True
+
+    def save(self) -> None:
+        """Write the archive if responses were recorded since it was read.
+
+        The archive is replaced atomically, so a replaying process never
+        reads a partial one.
+        """
+
+        with self._lock:
+            if not self._changed:
+                return
+
+            for key, entry in self._index.items():
+                if key not in self._bodies:
+                    self._bodies[key] = self._archive.read(entry['name'])
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            temporary = f'{self.path}.{os.getpid()}.tmp'
+            with zipfile.ZipFile(temporary, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for key, entry in self._index.items():
+                    archive.writestr(entry['name'], self._bodies[key])
+                archive.writestr(_INDEX, json.dumps({'version': _VERSION, 'entries': self._index}))
+
+            if self._archive is not None:
+                self._archive.close()
+            os.replace(temporary, self.path)
+            self._archive = zipfile.ZipFile(self.path)
+            self._changed = False
+
+    def close(self) -> None:
+        """Save the recorded responses and close the archive."""
+
+        self.save()
+        with self._lock:
+            if self._archive is not None:
+                self._archive.close()
+                self._archive = None
+
+    def __enter__(self) -> 'Cassette':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class CassetteSession(Session):
+    """Session recording its responses into a cassette or replaying them.
+
+    Args:
+      cassette(Cassette): Cassette to record into or replay from.
+
+      mode(str): 'replay', 'record' or 'new', see :data:`MODES`.
+        Defaults to 'replay'.
+
+      latency(float): Seconds slept before serving a replayed response.
+        Defaults to 0.
+
+      jitter(float): Maximum random deviation of the latency.
+        Defaults to 0.
+
+      seed(int): Seed of the jitter, for runs sleeping the same latencies.
+        Defaults to None.
+
+      **kwargs: Other arguments of :class:`Session`, used by the requests
+        made while recording.
+
+    """
+
+    def __init__(self,
+                 cassette: Cassette,
+                 mode: str = 'replay',
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 seed: int = None,
+                 **kwargs):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode '{mode}', expected one of {MODES}")
+
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self.mode = mode
+        # Session.latency tracks the measured latencies
+        self.replay_latency = latency
+        self.replay_jitter = jitter
+        self._random = random.Random(seed)
+        # Response of the last streamed transfer finished in each thread
+        self._local = threading.local()
+
+    def _replayed(self, url: str) -> Optional[Response]:
+        if self.mode == 'record':
+            return None
+
+        response = self.cassette.get(url)
+        if response is None and self.mode == 'replay':
+            raise CassetteMiss(f"No recorded response for {url} in {self.cassette.path}")
+
+        return response
+
+    def lookup(self, url: str) -> Optional[Response]:
+        response = self._replayed(url)
+
+        return response if response is not None else super().lookup(url)
+
+    def hold(self, url: str) -> float:
+        if (self.mode == 'record' or not (self.replay_latency or self.replay_jitter)
+                or url not in self.cassette):
+            return super().hold(url)
+
+        return max(0.0, self.replay_latency
+                   + self._random.uniform(-self.replay_jitter, self.replay_jitter))
+
+    def _recordable(self, response: Response) -> bool:
+        """Whether a response is final: retryable statuses such as 429 are
+        left out so that replays do not serve them again."""
+
+        return response.status < 500 and response.status not in self.retry.statuses
+
+    def finish(self, curl, url: str, transfer: Transfer) -> Response:
+        response = super().finish(curl, url, transfer)
+        if transfer.buffer is None:
+            # Streamed, recorded with its body by stream()
+            self._local.streamed = response
+        elif self._recordable(response):
+            self.cassette.add(response)
+
+        return response
+
+    def stream(self, url: str) -> Iterator[bytes]:
+        response = self._replayed(url)
+        if response is not None:
+            time.sleep(self.hold(url))
+            response.raise_for_status()
+            body = response.body
+            for start in range(0, len(body), _CHUNK):
+                yield body[start:start + _CHUNK]
+            return
+
+        chunks = []
+        try:
+            for chunk in super().stream(url):
+                chunks.append(chunk)
+                yield chunk
+        except HTTPError as e:
+            if self._recordable(e.response):
+                self.cassette.add(e.response)
+            raise
+
+        response = self._local.streamed
+        self.cassette.add(Response(url, response.status, b''.join(chunks), response.headers))
+
+
+@contextmanager
+def use_cassette(path: str,
+                 mode: str = 'replay',
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 seed: int = None,
+                 key: Callable[[str], str] = None,
+                 **kwargs) -> Iterator[CassetteSession]:
+    """Serve every module function from a cassette while in the block.
+
+    The cassette session replaces the shared session (see
+    :func:`~defillama.session.set_session`) and the previous one is restored
+    afterwards. Recorded responses are saved on exit.
+
+    Args:
+      path(str): Path of the cassette archive.
+
+      mode(str): 'replay', 'record' or 'new', see :data:`MODES`.
+        Defaults to 'replay'.
+
+      latency(float): Seconds slept before serving a replayed response.
+        Defaults to 0.
+
+      jitter(float): Maximum random deviation of the latency.
+        Defaults to 0.
+
+      seed(int): Seed of the jitter. Defaults to None.
+
+      key(Callable[[str], str]): Function mapping a URL to the key it is
+        recorded under. Defaults to the URL itself.
+
+      **kwargs: Other arguments of :class:`~defillama.session.Session`.
+
+    Returns:
+      Iterator[CassetteSession]: Session serving the module functions.
+
+    """
+
+    cassette = Cassette(path, key)
+    session = CassetteSession(cassette, mode, latency, jitter, seed, **kwargs)
+    previous = set_session(session)
+
+    try:
+        yield session
+    finally:
+        set_session(previous)
+        session.close()
+        cassette.close()
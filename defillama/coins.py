@@ -1,13 +1,45 @@
 import time
 import math
 from typing import List, Dict, Optional
-from ._utils import get, arg_parser
+from . import models
+from ._utils import get, get_many, get_records, arg_parser, duration_seconds, join_chunks
+from .store import ImmutableStore, get_store, settled
 
 BASE_URL = "https://coins.llama.fi"
 
+# Longest URL requested by the functions taking a list of tokens. Longer
+# token lists are split over several concurrent requests.
+MAX_URL_LENGTH = 4000
+
+
+def _get_coins(prefix: str,
+               coins: List[str],
+               suffix: str = '',
+               model: bool = False) -> Dict[str, any]:
+    """Request the 'coins' of an endpoint taking a list of tokens in its path.
+
+    The tokens are split into as few URLs of at most :data:`MAX_URL_LENGTH`
+    characters as possible, which are fetched concurrently and merged.
+    """
+
+    width = MAX_URL_LENGTH - len(prefix) - len(suffix)
+    urls = [f"{prefix}{chunk}{suffix}" for chunk in join_chunks(coins, width)]
+
+    if len(urls) == 1:
+        if model:
+            return get_records(urls[0], models.PriceQuote, ('coins',), dict)
+        return get(urls[0])['coins']
+
+    merged = {}
+    for response in get_many(urls):
+        merged.update(response['coins'])
+
+    return models.convert(merged, models.PriceQuote) if model else merged
+
 
 def get_current_prices(tokens: List[Dict[str, str]],
-                       search_width: str = '6h') -> Dict[str, Dict[str, any]]:
+                       search_width: str = '6h',
+                       model: bool = False) -> Dict[str, Dict[str, any]]:
     """**Returns current prices of tokens using their contract addresses.**
 
     Function returns a dictionary where the key is the requested token(s) with
@@ -30,20 +62,26 @@ def get_current_prices(tokens: List[Dict[str, str]],
         Follows regular chart notion where W = Week, D = day, H = hour,
         M = minute (not case sensitive). Defaults to '6h'.
 
+      model(bool): Whether to return :class:`defillama.models.PriceQuote` records
+        instead of dicts. Defaults to False.
+
+    Long token lists are split over several concurrent requests.
+
     Returns:
       Dict[str, Dict[str, any]]: Requested data
 
     """
 
-    tokens = arg_parser(tokens, format='normal')
-    url = f"{BASE_URL}/prices/current/{tokens}?searchWidth={search_width}"
+    tokens = arg_parser(tokens, format='normal').split(',')
 
-    return get(url)['coins']
+    return _get_coins(f"{BASE_URL}/prices/current/", tokens,
+                      f"?searchWidth={search_width}", model)
 
 
 def get_historical_prices(tokens: List[Dict[str, str]],
                           timestamp: int,
-                          search_width: str = '6h') -> Dict[str, Dict[str, any]]:
+                          search_width: str = '6h',
+                          model: bool = False) -> Dict[str, Dict[str, any]]:
     """**Returns historical prices of tokens using their contract addresses.**
 
     Function returns a dictionary where the key is the requested token(s) with
@@ -69,15 +107,62 @@ def get_historical_prices(tokens: List[Dict[str, str]],
        Follows regular chart notion where W = Week, D = day, H = hour,
        M = minute (not case sensitive). Defaults to '6h'.
 
+      model(bool): Whether to return :class:`defillama.models.PriceQuote` records
+        instead of dicts. Defaults to False.
+
+    Long token lists are split over several concurrent requests. Prices
+    whose search window has ended are read from and saved to the store of
+    :mod:`defillama.store` when one is configured.
+
     Returns:
       Dict[str, Dict[str, any]]: Requested data
 
     """
 
-    tokens = arg_parser(tokens, format='normal')
-    url = f"{BASE_URL}/prices/historical/{timestamp}/{tokens}?searchWidth={search_width}"
+    tokens = arg_parser(tokens, format='normal').split(',')
 
-    return get(url)['coins']
+    store = get_store()
+    try:
+        end = int(timestamp) + duration_seconds(search_width)
+    except (KeyError, ValueError, IndexError):
+        # Left for the API to interpret, without the store
+        end = None
+    if store is not None and end is not None and settled(end):
+        prices = _stored_historical_prices(store, tokens, timestamp, search_width)
+        return models.convert(prices, models.PriceQuote) if model else prices
+
+    return _get_coins(f"{BASE_URL}/prices/historical/{timestamp}/", tokens,
+                      f"?searchWidth={search_width}", model)
+
+
+def _stored_historical_prices(store: ImmutableStore,
+                              coins: List[str],
+                              timestamp: int,
+                              search_width: str) -> Dict[str, Dict[str, any]]:
+    """Return historical prices from the store, fetching the missing ones.
+
+    Coins the API has no price for are left out of the result and not
+    stored, so they are requested again next time.
+    """
+
+    keys = {coin: f"{coin}@{timestamp}@{search_width.lower()}" for coin in coins}
+    found = store.get_many('historical_price', keys.values())
+    prices = {coin: found[key] for coin, key in keys.items() if found.get(key) is not None}
+    missing = [coin for coin in coins if coin not in prices]
+
+    if missing:
+        fetched = _get_coins(f"{BASE_URL}/prices/historical/{timestamp}/", missing,
+                             f"?searchWidth={search_width}")
+        # The API may answer with another casing of case-insensitive (EVM)
+        # addresses; case-sensitive ones (e.g. Solana mints) match exactly
+        folded = {coin.lower(): price for coin, price in fetched.items()}
+        received = [(coin, fetched[coin] if coin in fetched else folded.get(coin.lower()))
+                    for coin in missing]
+        received = [(coin, price) for coin, price in received if price is not None]
+        store.put_many('historical_price', [(keys[coin], price) for coin, price in received])
+        prices.update(received)
+
+    return prices
 
 
 def get_historical_batch(tokens: Dict[str, List],
@@ -196,19 +281,22 @@ def get_percentage(tokens: List[Dict[str, str]],
         where W = Week, D = day, H = hour, M = minute (not case sensitive).
         Defaults to '24h'.
 
+    Long token lists are split over several concurrent requests.
+
     Returns:
       Dict[str, any]: Requested data
 
     """
 
-    tokens = arg_parser(tokens, format='normal')
+    tokens = arg_parser(tokens, format='normal').split(',')
     look_forward = str(look_forward).lower()
-    url = f"{BASE_URL}/percentage/{tokens}?timestamp={timestamp}&lookForward={look_forward}&period={period}"
 
-    return get(url)['coins']
+    return _get_coins(f"{BASE_URL}/percentage/", tokens,
+                      f"?timestamp={timestamp}&lookForward={look_forward}&period={period}")
 
 
-def get_first_prices(tokens: List[Dict[str, str]]) -> Dict[str, Dict[str, any]]:
+def get_first_prices(tokens: List[Dict[str, str]],
+                     model: bool = False) -> Dict[str, Dict[str, any]]:
     """**Returns the earliest timestamp price record for the token.**
 
     Function returns a dictionary where the key is the requested token(s) with
@@ -226,15 +314,19 @@ def get_first_prices(tokens: List[Dict[str, str]]) -> Dict[str, Dict[str, any]]:
         {token}:{address} as the key-value pairs. Can also use
         'coingecko': {protocol} for tokens listed on coingecko.
 
+      model(bool): Whether to return :class:`defillama.models.PriceQuote` records
+        instead of dicts. Defaults to False.
+
+    Long token lists are split over several concurrent requests.
+
     Returns:
       Dict[str, Dict[str, any]]: Requested data
 
     """
 
-    tokens = arg_parser(tokens, format='normal')
-    url = f"{BASE_URL}/prices/first/{tokens}"
+    tokens = arg_parser(tokens, format='normal').split(',')
 
-    return get(url)['coins']
+    return _get_coins(f"{BASE_URL}/prices/first/", tokens, model=model)
 
 
 def get_nearest_block(chain: str,
@@ -253,6 +345,9 @@ def get_nearest_block(chain: str,
 
       timestamp(int): Timestamp of the block
 
+    Blocks of past timestamps are read from and saved to the store of
+    :mod:`defillama.store` when one is configured.
+
     Returns:
       Dict[str, int]: Requested data
 
@@ -260,4 +355,14 @@ def get_nearest_block(chain: str,
 
     url = f"{BASE_URL}/block/{chain}/{timestamp}"
 
-    return get(url)
+    store = get_store()
+    if store is None or not settled(int(timestamp)):
+        return get(url)
+
+    key = f"{chain}@{timestamp}"
+    block = store.get('block', key)
+    if block is None:
+        block = get(url)
+        store.put('block', key, block)
+
+    return block
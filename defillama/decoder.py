@@ -0,0 +1,151 @@
+"""Pluggable JSON decoding of response bodies.
+
+Responses are decoded straight from the bytes received by PyCurl with the
+fastest available backend among orjson, msgspec and simdjson, falling back
+to the standard library ``json`` module when none of them is installed. The
+backend can be chosen globally:
+
+    >>> from defillama import decoder
+    >>> decoder.set_backend('msgspec')
+
+or for the calls made within a block:
+
+    >>> with decoder.use_backend('json'):
+    ...     tvl.get_protocols()
+"""
+
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+Data = Union[bytes, bytearray, memoryview, str]
+
+_BACKENDS: Dict[str, Callable[[Data], any]] = {}
+_ERRORS = (ValueError,)
+
+if orjson is not None:
+    _BACKENDS['orjson'] = orjson.loads
+if msgspec is not None:
+    _BACKENDS['msgspec'] = msgspec.json.decode
+    _ERRORS += (msgspec.DecodeError,)
+if simdjson is not None:
+    _BACKENDS['simdjson'] = simdjson.loads
+
+
+def _stdlib_loads(data: Data) -> any:
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+
+    return json.loads(data)
+
+
+_BACKENDS['json'] = _stdlib_loads
+
+_backend = next(iter(_BACKENDS))
+_override: ContextVar[Optional[str]] = ContextVar('backend', default=None)
+
+
+def available_backends() -> List[str]:
+    """Return the installed backends, fastest first.
+
+    Returns:
+      List[str]: Names of the installed backends.
+
+    """
+
+    return list(_BACKENDS)
+
+
+def _resolve(name: str) -> str:
+    if name == 'auto':
+        return next(iter(_BACKENDS))
+    if name not in _BACKENDS:
+        raise ValueError(f"JSON backend {name!r} is not installed, "
+                         f"use one of {available_backends()}")
+
+    return name
+
+
+def get_backend() -> str:
+    """Return the backend used by the current call.
+
+    Returns:
+      str: Name of the backend.
+
+    """
+
+    return _override.get() or _backend
+
+
+def set_backend(name: str = 'auto') -> None:
+    """Set the backend used by every call.
+
+    Args:
+      name(str): 'orjson', 'msgspec', 'simdjson', 'json' or 'auto' for the
+        fastest installed one. Defaults to 'auto'.
+
+    """
+
+    global _backend
+
+    _backend = _resolve(name)
+
+
+@contextmanager
+def use_backend(name: str) -> Iterator[None]:
+    """Use a backend for the calls made within a ``with`` block.
+
+    Args:
+      name(str): 'orjson', 'msgspec', 'simdjson', 'json' or 'auto'.
+
+    """
+
+    token = _override.set(_resolve(name))
+    try:
+        yield
+    finally:
+        _override.reset(token)
+
+
+def loads(data: Data, backend: str = None) -> any:
+    """Decode a JSON document.
+
+    Documents rejected by a third-party backend (e.g. integers beyond 64 bits
+    or NaN values, which the API occasionally returns) are decoded again
+    with the standard library.
+
+    Args:
+      data(Data): Document to decode, preferably the raw response bytes.
+
+      backend(str): Backend to use. Defaults to the current backend.
+
+    Returns:
+      any: Decoded document.
+
+    """
+
+    name = _resolve(backend) if backend else get_backend()
+
+    try:
+        return _BACKENDS[name](data)
+    except _ERRORS:
+        if name == 'json':
+            raise
+
+    return _stdlib_loads(data)
@@ -0,0 +1,448 @@
+"""Export of endpoint results to partitioned Parquet or Arrow IPC datasets.
+
+:func:`export` fetches an endpoint and writes its records straight to a
+dataset directory, without building a DataFrame first:
+
+    >>> from defillama import export
+    >>> export.export('yields.pools', 'lake/pools', partition_by=('chain',))
+    >>> export.export('tvl.charts', 'lake/tvl', format='arrow',
+    ...               partition_by=('year',), chain='Ethereum')
+
+Every endpoint of :data:`ENDPOINTS` declares the types of all its fields and
+is exported with exactly those columns, so its schema stays the same from
+one run to the next whatever the records of a run hold; fields the API adds
+later are left out until they are declared. Records written with
+:func:`write` have the fields they do not declare inferred from the first
+row group instead: numbers become float64, strings strings, booleans
+booleans, and nested lists and dicts JSON strings. Fields appearing only
+after the first row group are dropped.
+
+Records are converted and written one row group at a time, and the large
+lists (``yields.pools``, ``tvl.protocols``, ``stablecoins.stablecoins``) are
+read with the streaming parser, so memory stays bounded by the row group
+size. Besides the record fields, datasets can be partitioned by the 'year',
+'month' or 'day' of their time field.
+
+pyarrow is required for this module.
+"""
+
+import calendar
+import json
+import time
+import uuid
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+from . import batch, fees_revenue, stablecoins, tvl, volumes, yields
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = ds = None
+
+# Records per row group, and per conversion batch.
+ROW_GROUP_SIZE = 65536
+
+FORMATS = {'parquet': 'parquet', 'arrow': 'ipc'}
+
+# Partition keys derived from the time field, with their strftime format
+_PERIODS = {'year': '%Y', 'month': '%Y-%m', 'day': '%Y-%m-%d'}
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("pyarrow is required for exports, "
+                          "install it with 'pip install DeFiLlama-Curl[arrow]'")
+
+
+class Endpoint(NamedTuple):
+    """Exportable endpoint.
+
+    Attributes:
+      fetch(Callable[..., Iterable[Dict]]): Function returning the records,
+        called with the keyword arguments given to :func:`export`.
+
+      fields(Dict[str, str]): Declared type of every exported field:
+        'int64', 'float64', 'string', 'bool', 'timestamp' or 'json'.
+
+      time_key(Optional[str]): Time field, used for the 'year', 'month' and
+        'day' partitions.
+
+    """
+
+    fetch: Callable[..., Iterable[Dict[str, any]]]
+    fields: Dict[str, str]
+    time_key: Optional[str] = None
+
+
+def _chart(key: str) -> Callable[[Dict[str, any]], List[Dict[str, any]]]:
+    """Return the rows of the ``totalDataChart`` of an overview response."""
+
+    def rows(overview: Dict[str, any]) -> List[Dict[str, any]]:
+        return [{'date': date, key: value} for date, value in overview.get('totalDataChart') or ()]
+
+    return rows
+
+
+def _fees_revenue_chart(chain: str = None) -> List[Dict[str, any]]:
+    """Return the daily fees and revenue, fetched concurrently and joined on
+    their date."""
+
+    fees, revenue = batch.run([
+        (fees_revenue.get_overview, (False, True), {'type': 'fees', 'chain': chain}),
+        (fees_revenue.get_overview, (False, True), {'type': 'revenue', 'chain': chain}),
+    ])
+
+    rows = {date: {'date': date, 'fees': value, 'revenue': None}
+            for date, value in fees.get('totalDataChart') or ()}
+    for date, value in revenue.get('totalDataChart') or ():
+        rows.setdefault(date, {'date': date, 'fees': None})['revenue'] = value
+
+    return sorted(rows.values(), key=lambda row: int(row['date']))
+
+
+_PROTOCOL = {
+    'id': 'string', 'name': 'string', 'symbol': 'string', 'category': 'string',
+    'chain': 'string', 'chains': 'json', 'slug': 'string', 'tvl': 'float64',
+    'chainTvls': 'json', 'change_1h': 'float64', 'change_1d': 'float64',
+    'change_7d': 'float64', 'mcap': 'float64', 'listedAt': 'timestamp',
+    'address': 'string', 'url': 'string', 'description': 'string',
+    'logo': 'string', 'audits': 'string', 'audit_note': 'string',
+    'gecko_id': 'string', 'cmcId': 'string', 'module': 'string',
+    'twitter': 'string', 'forkedFrom': 'json', 'oracles': 'json',
+}
+
+_POOL = {
+    'pool': 'string', 'chain': 'string', 'project': 'string', 'symbol': 'string',
+    'tvlUsd': 'float64', 'apyBase': 'float64', 'apyReward': 'float64',
+    'apy': 'float64', 'rewardTokens': 'json', 'apyPct1D': 'float64',
+    'apyPct7D': 'float64', 'apyPct30D': 'float64', 'stablecoin': 'bool',
+    'ilRisk': 'string', 'exposure': 'string', 'predictions': 'json',
+    'poolMeta': 'string', 'underlyingTokens': 'json', 'il7d': 'float64',
+    'apyBase7d': 'float64', 'apyMean30d': 'float64', 'volumeUsd1d': 'float64',
+    'volumeUsd7d': 'float64', 'apyBaseInception': 'float64', 'mu': 'float64',
+    'sigma': 'float64', 'count': 'int64', 'outlier': 'bool',
+}
+
+_SUMMARY = {
+    'name': 'string', 'displayName': 'string', 'module': 'string',
+    'category': 'string', 'chains': 'json', 'protocolType': 'string',
+    'total24h': 'float64', 'total48hto24h': 'float64', 'total7d': 'float64',
+    'total30d': 'float64', 'totalAllTime': 'float64', 'change_1d': 'float64',
+    'change_7d': 'float64', 'change_1m': 'float64', 'breakdown24h': 'json',
+    'logo': 'string', 'disabled': 'bool', 'latestFetchIsOk': 'bool',
+}
+
+ENDPOINTS: Dict[str, Endpoint] = {
+    'tvl.protocols': Endpoint(
+        lambda: tvl.get_protocols(stream=True), _PROTOCOL, 'listedAt'),
+    'tvl.chains': Endpoint(
+        tvl.get_chains,
+        {'name': 'string', 'tvl': 'float64', 'tokenSymbol': 'string',
+         'gecko_id': 'string', 'cmcId': 'string', 'chainId': 'int64'}),
+    'tvl.charts': Endpoint(
+        tvl.get_charts, {'date': 'timestamp', 'totalLiquidityUSD': 'float64'}, 'date'),
+    'tvl.historical_chains_tvl': Endpoint(
+        tvl.get_historical_chains_tvl, {'date': 'timestamp', 'tvl': 'float64'}, 'date'),
+    'yields.pools': Endpoint(
+        lambda: yields.get_pools(stream=True), _POOL),
+    'yields.pool_chart': Endpoint(
+        yields.get_pool_chart,
+        {'timestamp': 'timestamp', 'tvlUsd': 'float64', 'apy': 'float64',
+         'apyBase': 'float64', 'apyReward': 'float64', 'il7d': 'float64',
+         'apyBase7d': 'float64'}, 'timestamp'),
+    'stablecoins.stablecoins': Endpoint(
+        lambda include_prices=True: stablecoins.get_stablecoins(include_prices, stream=True),
+        {'id': 'string', 'name': 'string', 'symbol': 'string', 'gecko_id': 'string',
+         'pegType': 'string', 'pegMechanism': 'string', 'price': 'float64',
+         'circulating': 'json', 'chainCirculating': 'json', 'chains': 'json',
+         'priceSource': 'string', 'circulatingPrevDay': 'json',
+         'circulatingPrevWeek': 'json', 'circulatingPrevMonth': 'json'}),
+    'stablecoins.charts': Endpoint(
+        stablecoins.get_charts,
+        {'date': 'timestamp', 'totalCirculating': 'json', 'totalCirculatingUSD': 'json',
+         'totalMintedUSD': 'json', 'totalBridgedToUSD': 'json'}, 'date'),
+    'stablecoins.chains': Endpoint(
+        stablecoins.get_chains,
+        {'name': 'string', 'gecko_id': 'string', 'tokenSymbol': 'string',
+         'totalCirculatingUSD': 'json'}),
+    'stablecoins.prices': Endpoint(
+        stablecoins.get_prices, {'date': 'timestamp', 'prices': 'json'}, 'date'),
+    'volumes.dex_overview': Endpoint(
+        lambda chain=None: volumes.get_dex_overview(True, True, chain=chain)['protocols'], _SUMMARY),
+    'volumes.dex_chart': Endpoint(
+        lambda chain=None: _chart('volume')(volumes.get_dex_overview(False, True, chain=chain)),
+        {'date': 'timestamp', 'volume': 'float64'}, 'date'),
+    'volumes.options_overview': Endpoint(
+        lambda chain=None, type='premium': volumes.get_options_overview(
+            True, True, type=type, chain=chain)['protocols'], _SUMMARY),
+    'fees_revenue.overview': Endpoint(
+        lambda chain=None, type='fees': fees_revenue.get_overview(
+            True, True, type=type, chain=chain)['protocols'], _SUMMARY),
+    'fees_revenue.chart': Endpoint(
+        _fees_revenue_chart, {'date': 'timestamp', 'fees': 'float64', 'revenue': 'float64'}, 'date'),
+}
+
+
+def _arrow_type(name: str) -> 'pa.DataType':
+    return {
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+        'string': pa.string(),
+        'bool': pa.bool_(),
+        'timestamp': pa.timestamp('s', tz='UTC'),
+        'json': pa.string(),
+    }[name]
+
+
+def _seconds(value: any) -> Optional[int]:
+    """Return a UNIX timestamp given as a number, a numeric string or an ISO
+    8601 string, e.g. '2022-02-10T23:00:46.000Z' on yields.llama.fi."""
+
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return calendar.timegm(time.strptime(value[:19], '%Y-%m-%dT%H:%M:%S'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _number(value: any) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _integer(value: any) -> Optional[int]:
+    number = _number(value)
+
+    return None if number is None or number != number else int(number)
+
+
+def _string(value: any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+
+    return json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+
+
+_COERCE = {
+    'int64': _integer,
+    'float64': _number,
+    'string': _string,
+    'bool': lambda value: value if isinstance(value, bool) else None,
+    'timestamp': _seconds,
+    'json': lambda value: None if value is None else json.dumps(value, separators=(',', ':')),
+}
+
+
+def _infer(values: Iterable[any]) -> str:
+    """Return the type name of a field from its values."""
+
+    values = [value for value in values if value is not None]
+    if not values:
+        return 'string'
+    if all(isinstance(value, bool) for value in values):
+        return 'bool'
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+        return 'float64'
+    if all(isinstance(value, (dict, list)) for value in values):
+        return 'json'
+
+    return 'string'
+
+
+def infer_fields(records: Sequence[Dict[str, any]],
+                 fields: Dict[str, str] = None) -> Dict[str, str]:
+    """Complete the declared types of a list of records with the types
+    inferred for their other fields.
+
+    Args:
+      records(Sequence[Dict[str, any]]): Sample of the records.
+
+      fields(Dict[str, str]): Declared types, kept as they are.
+        Defaults to None.
+
+    Returns:
+      Dict[str, str]: Type name of every field, declared fields first.
+
+    """
+
+    fields = dict(fields or {})
+    names = {}
+    for record in records:
+        names.update(dict.fromkeys(record))
+
+    for name in names:
+        if name not in fields:
+            fields[name] = _infer(record.get(name) for record in records)
+
+    return fields
+
+
+def schema(fields: Dict[str, str]) -> 'pa.Schema':
+    """Return the Arrow schema of typed fields.
+
+    Args:
+      fields(Dict[str, str]): Type name of each field, e.g. the declared
+        fields of an :class:`Endpoint`.
+
+    Returns:
+      pa.Schema: Schema with nullable columns.
+
+    """
+
+    _require_pyarrow()
+
+    return pa.schema([(name, _arrow_type(type)) for name, type in fields.items()])
+
+
+def _batch(records: List[Dict[str, any]],
+           fields: Dict[str, str],
+           arrow_schema: 'pa.Schema',
+           time_key: Optional[str],
+           periods: Sequence[str]) -> 'pa.RecordBatch':
+    columns = []
+    for name, type in fields.items():
+        coerce = _COERCE[type]
+        columns.append(pa.array([coerce(record.get(name)) for record in records],
+                                type=_arrow_type(type)))
+
+    if periods:
+        seconds = [_seconds(record.get(time_key)) for record in records]
+        for period in periods:
+            columns.append(pa.array([None if value is None else
+                                     time.strftime(_PERIODS[period], time.gmtime(value))
+                                     for value in seconds], type=pa.string()))
+
+    return pa.RecordBatch.from_arrays(columns, schema=arrow_schema)
+
+
+def write(records: Iterable[Dict[str, any]],
+          path: str,
+          format: str = 'parquet',
+          partition_by: Sequence[str] = (),
+          fields: Dict[str, str] = None,
+          time_key: str = None,
+          row_group_size: int = ROW_GROUP_SIZE,
+          infer: bool = True) -> int:
+    """Write records to a dataset directory one row group at a time.
+
+    Args:
+      records(Iterable[Dict[str, any]]): Records to write, consumed lazily.
+
+      path(str): Directory of the dataset. Files of earlier writes are kept,
+        each write adding its own files.
+
+      format(str): 'parquet' or 'arrow' (Arrow IPC). Defaults to 'parquet'.
+
+      partition_by(Sequence[str]): Fields partitioning the dataset in
+        ``field=value`` directories, or 'year', 'month' or 'day' of the
+        time field. Defaults to no partitioning.
+
+      fields(Dict[str, str]): Declared types of fields, see
+        :class:`Endpoint`. Defaults to inferring every field.
+
+      time_key(str): Time field for the 'year', 'month' and 'day' partitions.
+
+      row_group_size(int): Maximum number of records per row group.
+        Defaults to :data:`ROW_GROUP_SIZE`.
+
+      infer(bool): Whether to add the fields not in `fields`, inferring
+        their types from the first row group. Without it, exactly the
+        declared fields are written. Defaults to True.
+
+    Returns:
+      int: Number of records written.
+
+    """
+
+    _require_pyarrow()
+
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format '{format}', expected one of {list(FORMATS)}")
+    if not infer and not fields:
+        raise ValueError("Writing only the declared fields requires declared fields")
+
+    periods = [key for key in partition_by if key in _PERIODS]
+    if periods and time_key is None:
+        raise ValueError(f"Partitioning by {periods} requires a time field")
+
+    records = iter(records)
+    first = list(islice(records, row_group_size))
+    if not first:
+        return 0
+
+    fields = infer_fields(first, fields) if infer else dict(fields)
+    arrow_schema = schema(fields)
+    for period in periods:
+        arrow_schema = arrow_schema.append(pa.field(period, pa.string()))
+
+    written = [0]
+
+    def batches() -> Iterator['pa.RecordBatch']:
+        chunk = first
+        while chunk:
+            written[0] += len(chunk)
+            yield _batch(chunk, fields, arrow_schema, time_key, periods)
+            chunk = list(islice(records, row_group_size))
+
+    extension = 'parquet' if format == 'parquet' else 'arrow'
+    ds.write_dataset(batches(), path,
+                     schema=arrow_schema,
+                     format=FORMATS[format],
+                     partitioning=list(partition_by) or None,
+                     partitioning_flavor='hive',
+                     basename_template=f'part-{uuid.uuid4().hex}-{{i}}.{extension}',
+                     max_rows_per_group=row_group_size,
+                     existing_data_behavior='overwrite_or_ignore')
+
+    return written[0]
+
+
+def export(endpoint: str,
+           path: str,
+           format: str = 'parquet',
+           partition_by: Sequence[str] = (),
+           row_group_size: int = ROW_GROUP_SIZE,
+           **kwargs) -> int:
+    """**Fetches an endpoint and writes its records to a Parquet or Arrow
+    dataset.**
+
+    Args:
+      endpoint(str): Name of the endpoint, a key of :data:`ENDPOINTS`, e.g.
+        'yields.pools'.
+
+      path(str): Directory of the dataset.
+
+      format(str): 'parquet' or 'arrow' (Arrow IPC). Defaults to 'parquet'.
+
+      partition_by(Sequence[str]): Fields partitioning the dataset, e.g.
+        ('chain',), or 'year', 'month' or 'day' of the time field of the
+        endpoint. Defaults to no partitioning.
+
+      row_group_size(int): Maximum number of records per row group.
+        Defaults to :data:`ROW_GROUP_SIZE`.
+
+      **kwargs: Arguments of the endpoint function, e.g. ``chain='Ethereum'``
+        for 'tvl.charts'.
+
+    Returns:
+      int: Number of records written.
+
+    """
+
+    if endpoint not in ENDPOINTS:
+        raise ValueError(f"Unknown endpoint '{endpoint}', expected one of {list(ENDPOINTS)}")
+
+    spec = ENDPOINTS[endpoint]
+
+    return write(spec.fetch(**kwargs), path, format, partition_by, spec.fields,
+                 spec.time_key, row_group_size, infer=False)
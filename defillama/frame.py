@@ -0,0 +1,157 @@
+"""Columnar output for the time-series endpoints.
+
+Functions returning historical series accept ``as_arrays=True`` to return a
+:class:`Frame` instead of a list of dicts, e.g.
+``tvl.get_charts('Ethereum', as_arrays=True)``. A frame holds one NumPy array
+per field: an int64 array of UNIX timestamps and a float64 array for every
+numeric field (missing values are NaN). Frames convert to pandas, Polars or
+Arrow when those libraries are installed.
+
+NumPy is required for this module.
+"""
+
+from typing import Dict, Iterator, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("NumPy is required for columnar output, "
+                          "install it with 'pip install DeFiLlama-Curl[numpy]'")
+
+
+def _timestamps(values: List[any]) -> 'np.ndarray':
+    try:
+        return np.array(values, dtype=np.int64)
+    except (TypeError, ValueError):
+        pass
+
+    # ISO 8601 strings, e.g. '2022-02-10T23:00:46.000Z' on yields.llama.fi
+    values = [value[:-1] if value.endswith('Z') else value for value in values]
+
+    return np.array(values, dtype='datetime64[s]').astype(np.int64)
+
+
+def _is_numeric(value: any) -> bool:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return True
+    if isinstance(value, str):
+        try:
+            float(value)
+        except ValueError:
+            return False
+        return True
+
+    return False
+
+
+class Frame:
+    """Columns of a time series as NumPy arrays.
+
+    Args:
+      columns(Dict[str, np.ndarray]): Arrays of equal length keyed by field
+        name. The first column is the time column.
+
+    """
+
+    __slots__ = ('columns',)
+
+    def __init__(self, columns: Dict[str, 'np.ndarray']):
+        self.columns = columns
+
+    @classmethod
+    def from_records(cls,
+                     records: Sequence[Dict[str, any]],
+                     time_key: str,
+                     value_keys: Optional[Sequence[str]] = None) -> 'Frame':
+        """Build a frame from the records of a series.
+
+        Args:
+          records(Sequence[Dict[str, any]]): Records of the series.
+
+          time_key(str): Field holding the timestamp of each record.
+
+          value_keys(Sequence[str]): Fields to keep as float64 columns.
+            Defaults to every numeric field of the first record.
+
+        Returns:
+          Frame: Columns of the series.
+
+        """
+
+        _require_numpy()
+
+        if value_keys is None:
+            first = records[0] if records else {}
+            value_keys = [key for key, value in first.items()
+                          if key != time_key and _is_numeric(value)]
+
+        count = len(records)
+        columns = {time_key: _timestamps([record[time_key] for record in records])}
+        for key in value_keys:
+            columns[key] = np.fromiter((record.get(key) for record in records),
+                                       dtype=np.float64, count=count)
+
+        return cls(columns)
+
+    @property
+    def time(self) -> 'np.ndarray':
+        """Time column as int64 UNIX timestamps."""
+
+        return next(iter(self.columns.values()))
+
+    def __getitem__(self, key: str) -> 'np.ndarray':
+        return self.columns[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.columns)
+
+    def __len__(self) -> int:
+        return len(self.time) if self.columns else 0
+
+    def __repr__(self) -> str:
+        return f"Frame(rows={len(self)}, columns={list(self.columns)})"
+
+    def to_pandas(self) -> 'pandas.DataFrame':
+        """Convert to a pandas DataFrame indexed by datetime.
+
+        Returns:
+          pandas.DataFrame: Converted frame.
+
+        """
+
+        import pandas
+
+        time_key, *value_keys = self.columns
+        index = pandas.to_datetime(self.columns[time_key], unit='s')
+        index.name = time_key
+
+        return pandas.DataFrame({key: self.columns[key] for key in value_keys}, index=index)
+
+    def to_polars(self) -> 'polars.DataFrame':
+        """Convert to a Polars DataFrame without copying the columns.
+
+        Returns:
+          polars.DataFrame: Converted frame.
+
+        """
+
+        import polars
+
+        return polars.DataFrame(self.columns)
+
+    def to_arrow(self) -> 'pyarrow.Table':
+        """Convert to an Arrow table without copying the columns.
+
+        Returns:
+          pyarrow.Table: Converted frame.
+
+        """
+
+        import pyarrow
+
+        return pyarrow.table(self.columns)
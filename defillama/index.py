@@ -0,0 +1,291 @@
+"""Indexed queries over the protocol listing.
+
+A :class:`ProtocolIndex` is built once from ``tvl.get_protocols()`` and
+answers the usual filters without scanning the listing: inverted indexes map
+each chain, category, oracle, forked protocol and CoinGecko id to the set of
+protocols having it, so a filter is an intersection of sets, and the
+protocols are kept sorted by ``tvl``, ``mcap`` and ``change_1d`` for top-N
+and range queries:
+
+    >>> from defillama.index import ProtocolIndex
+    >>> protocols = ProtocolIndex.fetch()
+    >>> protocols.filter(chain='Arbitrum', category='Lending')
+    >>> protocols.top(10, by='tvl', forked_from='Uniswap V2')
+    >>> protocols.range('mcap', 1e8, 1e9, oracle='Chainlink')
+
+Values are matched case-insensitively, and a list of values matches any of
+them.
+"""
+
+import heapq
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+from . import tvl
+
+# Filter names and the protocol field each one indexes
+INVERTED: Dict[str, str] = {
+    'chain': 'chains',
+    'category': 'category',
+    'oracle': 'oracles',
+    'forked_from': 'forkedFrom',
+    'gecko_id': 'gecko_id',
+}
+
+SORTED: Tuple[str, ...] = ('tvl', 'mcap', 'change_1d')
+
+Values = Union[str, Iterable[str]]
+
+
+def _keys(value: any) -> List[str]:
+    """Return the index keys of a field value, a string or a list of them."""
+
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(item).lower() for item in value if item is not None]
+
+    return [str(value).lower()]
+
+
+def _number(value: any) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+
+    return None if value != value else value
+
+
+class ProtocolIndex:
+    """Protocols of the listing with inverted and sorted indexes.
+
+    Args:
+      protocols(Iterable[Dict[str, any]]): Protocols as listed by
+        ``tvl.get_protocols()``.
+
+    """
+
+    def __init__(self, protocols: Iterable[Dict[str, any]]):
+        self.protocols: List[Dict[str, any]] = list(protocols)
+        self._slugs: Dict[str, int] = {}
+        self._inverted: Dict[str, Dict[str, Set[int]]] = {name: {} for name in INVERTED}
+        # Values in ascending order and the row of each value
+        self._sorted: Dict[str, Tuple[List[float], List[int]]] = {}
+
+        for row, protocol in enumerate(self.protocols):
+            if protocol.get('slug'):
+                self._slugs[protocol['slug']] = row
+            for name, field in INVERTED.items():
+                index = self._inverted[name]
+                for key in _keys(protocol.get(field)):
+                    index.setdefault(key, set()).add(row)
+
+        for field in SORTED:
+            pairs = sorted((value, row) for row, value
+                           in ((row, _number(protocol.get(field)))
+                               for row, protocol in enumerate(self.protocols))
+                           if value is not None)
+            self._sorted[field] = ([value for value, _ in pairs], [row for _, row in pairs])
+
+    @classmethod
+    def fetch(cls) -> 'ProtocolIndex':
+        """**Builds an index of the current protocol listing.**
+
+        *Endpoint: GET /protocols*
+
+        Returns:
+          ProtocolIndex: Index of the listed protocols.
+
+        """
+
+        return cls(tvl.get_protocols(stream=True))
+
+    def __len__(self) -> int:
+        return len(self.protocols)
+
+    def get(self, slug: str) -> Optional[Dict[str, any]]:
+        """Return a protocol by slug.
+
+        Args:
+          slug(str): Protocol slug.
+
+        Returns:
+          Optional[Dict[str, any]]: Protocol, or None if it is not listed.
+
+        """
+
+        row = self._slugs.get(slug)
+
+        return None if row is None else self.protocols[row]
+
+    def keys(self, name: str) -> List[str]:
+        """Return the indexed values of a filter.
+
+        Args:
+          name(str): Filter name, a key of :data:`INVERTED`.
+
+        Returns:
+          List[str]: Lower-cased values in sorted order.
+
+        """
+
+        return sorted(self._inverted[name])
+
+    def counts(self, name: str) -> Dict[str, int]:
+        """Return the number of protocols for each value of a filter.
+
+        Args:
+          name(str): Filter name, a key of :data:`INVERTED`.
+
+        Returns:
+          Dict[str, int]: Number of protocols by lower-cased value, largest
+          first.
+
+        """
+
+        index = self._inverted[name]
+
+        return dict(sorted(((key, len(rows)) for key, rows in index.items()),
+                           key=lambda item: -item[1]))
+
+    def _rows(self, filters: Dict[str, Optional[Values]]) -> Optional[Set[int]]:
+        """Return the rows matching every filter, or None without filters."""
+
+        sets = []
+        for name, values in filters.items():
+            if values is None:
+                continue
+            if name not in self._inverted:
+                raise TypeError(f"Unknown filter '{name}', expected one of {list(INVERTED)}")
+            index = self._inverted[name]
+            keys = _keys(values) if isinstance(values, str) else _keys(list(values))
+            if len(keys) == 1:
+                sets.append(index.get(keys[0], set()))
+            else:
+                sets.append(set().union(*(index.get(key, ()) for key in keys)))
+
+        if not sets:
+            return None
+
+        sets.sort(key=len)
+        rows = set(sets[0])
+        for other in sets[1:]:
+            rows &= other
+            if not rows:
+                break
+
+        return rows
+
+    def filter(self, **filters: Optional[Values]) -> List[Dict[str, any]]:
+        """Return the protocols matching every filter.
+
+        Args:
+          **filters(Optional[Values]): Values of the filters of
+            :data:`INVERTED`, e.g. ``chain='Arbitrum'`` or
+            ``oracle=['Chainlink', 'Pyth']``. None is ignored.
+
+        Returns:
+          List[Dict[str, any]]: Matching protocols in listing order.
+
+        """
+
+        rows = self._rows(filters)
+        if rows is None:
+            return list(self.protocols)
+
+        return [self.protocols[row] for row in sorted(rows)]
+
+    def count(self, **filters: Optional[Values]) -> int:
+        """Return the number of protocols matching every filter.
+
+        Args:
+          **filters(Optional[Values]): Values of the filters of
+            :data:`INVERTED`.
+
+        Returns:
+          int: Number of matching protocols.
+
+        """
+
+        rows = self._rows(filters)
+
+        return len(self.protocols) if rows is None else len(rows)
+
+    def top(self,
+            n: int,
+            by: str = 'tvl',
+            ascending: bool = False,
+            **filters: Optional[Values]) -> List[Dict[str, any]]:
+        """Return the protocols with the highest (or lowest) values of a
+        field among those matching every filter.
+
+        Args:
+          n(int): Number of protocols. None are returned when it is not
+            positive.
+
+          by(str): Sorted field, one of :data:`SORTED`. Defaults to 'tvl'.
+
+          ascending(bool): Whether to return the lowest values instead.
+            Defaults to False.
+
+          **filters(Optional[Values]): Values of the filters of
+            :data:`INVERTED`.
+
+        Returns:
+          List[Dict[str, any]]: Protocols in value order. Protocols without
+          a value are left out.
+
+        """
+
+        values, order = self._sorted[by]
+        if n <= 0:
+            return []
+        rows = self._rows(filters)
+
+        if rows is not None and len(rows) < 4 * n:
+            # Few matches: rank the matches rather than walk the whole order
+            keyed = [(_number(self.protocols[row].get(by)), row) for row in rows]
+            keyed = [item for item in keyed if item[0] is not None]
+            best = (heapq.nsmallest if ascending else heapq.nlargest)(n, keyed)
+            return [self.protocols[row] for _, row in best]
+
+        result = []
+        for row in (order if ascending else reversed(order)):
+            if rows is None or row in rows:
+                result.append(self.protocols[row])
+                if len(result) == n:
+                    break
+
+        return result
+
+    def range(self,
+              by: str,
+              low: float = None,
+              high: float = None,
+              **filters: Optional[Values]) -> List[Dict[str, any]]:
+        """Return the protocols whose value of a field is within bounds and
+        matching every filter.
+
+        Args:
+          by(str): Sorted field, one of :data:`SORTED`.
+
+          low(float): Lowest value, included. Defaults to None (no bound).
+
+          high(float): Highest value, included. Defaults to None (no bound).
+
+          **filters(Optional[Values]): Values of the filters of
+            :data:`INVERTED`.
+
+        Returns:
+          List[Dict[str, any]]: Protocols in ascending value order.
+
+        """
+
+        values, order = self._sorted[by]
+        first = 0 if low is None else bisect_left(values, low)
+        last = len(values) if high is None else bisect_right(values, high)
+        rows = self._rows(filters)
+
+        return [self.protocols[row] for row in order[first:last] if rows is None or row in rows]
@@ -0,0 +1,408 @@
+"""Per-request timings of the session and exporters for them.
+
+For every transfer, the session reads the phase timings libcurl measured
+(DNS lookup, TCP connect, TLS handshake, time to first byte, download), the
+status, the wire and decoded sizes and the endpoint template of the URL,
+e.g. '/protocol/{protocol}', into a :class:`RequestTiming`, and passes it to
+the observers of the session. Once the body is decoded, the observers get
+the same timing again with the decode time filled in:
+
+    >>> from defillama import metrics, tvl
+    >>> from defillama.session import get_session
+    >>> recorder = metrics.Recorder()
+    >>> get_session().observers.append(recorder)
+    >>> tvl.get_protocols()
+    >>> recorder.breakdown()
+    {'api.llama.fi/protocols': {'requests': 1, 'dns': 0.001, 'connect': 0.01,
+     'tls': 0.03, 'wait': 0.4, 'transfer': 0.2, 'decode': 0.05, ...}}
+
+:class:`PrometheusExporter` and :class:`OpenTelemetryExporter` record the
+same timings as histograms labelled by host and endpoint template. They
+require ``prometheus_client`` and ``opentelemetry-api`` respectively.
+
+Responses served from the cache without a request are not observed, and
+bodies decoded in the worker processes of :mod:`defillama.batch` have no
+decode time.
+"""
+
+import re
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+try:
+    from opentelemetry import metrics as otel_metrics
+except ImportError:
+    otel_metrics = None
+
+# Path templates of the endpoints, by host
+TEMPLATES: Dict[str, List[str]] = {
+    'api.llama.fi': [
+        '/protocols', '/protocol/{protocol}', '/tvl/{protocol}', '/chains',
+        '/charts', '/charts/{chain}', '/v2/historicalChainTvl',
+        '/v2/historicalChainTvl/{chain}', '/overview/dexs', '/overview/dexs/{chain}',
+        '/overview/options', '/overview/options/{chain}', '/overview/fees',
+        '/overview/fees/{chain}', '/summary/dexs/{protocol}',
+        '/summary/options/{protocol}', '/summary/fees/{protocol}',
+    ],
+    'coins.llama.fi': [
+        '/prices/current/{coins}', '/prices/historical/{timestamp}/{coins}',
+        '/prices/first/{coins}', '/batchHistorical', '/chart/{coins}',
+        '/percentage/{coins}', '/block/{chain}/{timestamp}',
+    ],
+    'stablecoins.llama.fi': [
+        '/stablecoins', '/stablecoincharts/{chain}', '/stablecoin/{stablecoin}',
+        '/stablecoinchains', '/stablecoinprices',
+    ],
+    'yields.llama.fi': ['/pools', '/chart/{pool}'],
+    'bridges.llama.fi': [
+        '/bridges', '/bridge/{id}', '/bridgevolume/{chain}',
+        '/bridgestats/{timestamp}/{chain}', '/bridgedaystats/{timestamp}/{chain}',
+        '/transactions/{id}',
+    ],
+    'abi-decoder.llama.fi': ['/fetch/signature', '/fetch/contract/{chain}/{address}'],
+}
+
+# Histogram buckets in seconds
+BUCKETS: Tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                              1.0, 2.5, 5.0, 10.0, 30.0)
+
+PHASES: Tuple[str, ...] = ('dns', 'connect', 'tls', 'wait', 'transfer')
+
+
+def _compile(template: str) -> 're.Pattern':
+    return re.compile(re.sub(r'\\{\w+\\}', '[^/]+', re.escape(template)) + '$')
+
+
+_COMPILED: Dict[str, List[Tuple['re.Pattern', str]]] = {
+    host: [(_compile(template), template) for template in templates]
+    for host, templates in TEMPLATES.items()
+}
+
+
+def _require_prometheus() -> None:
+    if prometheus_client is None:
+        raise ImportError("prometheus_client is required for the Prometheus exporter, "
+                          "install it with 'pip install DeFiLlama-Curl[prometheus]'")
+
+
+def _require_opentelemetry() -> None:
+    if otel_metrics is None:
+        raise ImportError("opentelemetry-api is required for the OpenTelemetry exporter, "
+                          "install it with 'pip install DeFiLlama-Curl[otel]'")
+
+
+def template(url: str) -> str:
+    """Return the endpoint template of a URL.
+
+    Args:
+      url(str): Requested URL.
+
+    Returns:
+      str: Path template, e.g. '/protocol/{protocol}'. Paths of unknown
+      endpoints keep their first segment, the others being replaced by
+      '{}'.
+
+    """
+
+    parts = urlsplit(url)
+    path = parts.path.rstrip('/') or '/'
+    segments = path.lstrip('/').split('/')
+
+    routes = _COMPILED.get(parts.netloc)
+    if routes is not None:
+        for pattern, name in routes:
+            if pattern.match(path):
+                return name
+    else:
+        # Servers standing in for the API, possibly under a path prefix,
+        # which may name the host of the endpoint
+        for start in range(len(segments)):
+            suffix = '/' + '/'.join(segments[start:])
+            hosts = [segments[start - 1]] if start and segments[start - 1] in _COMPILED else _COMPILED
+            for host in hosts:
+                for pattern, name in _COMPILED[host]:
+                    if pattern.match(suffix):
+                        return name
+
+    return '/' + '/'.join(segments[:1] + ['{}'] * (len(segments) - 1))
+
+
+class RequestTiming:
+    """Timings and sizes of one transfer.
+
+    The phase timings are those of libcurl, measured from the start of the
+    transfer; :attr:`phases` turns them into durations.
+
+    Attributes:
+      url(str): Requested URL.
+      host(str): Host of the URL.
+      endpoint(str): Endpoint template of the URL, see :func:`template`.
+      status(int): HTTP status code.
+      namelookup(float): Seconds until the host name was resolved.
+      connect(float): Seconds until the TCP connection was established.
+      appconnect(float): Seconds until the TLS handshake completed, 0
+        without TLS.
+      pretransfer(float): Seconds until the request was about to be sent.
+      starttransfer(float): Seconds until the first byte was received.
+      total(float): Seconds of the whole transfer.
+      wire_bytes(int): Size of the body as received.
+      decoded_bytes(int): Size of the body after decompression.
+      encoding(str): Content-Encoding of the response, if any.
+      reused(bool): Whether an open connection was reused.
+      decode(float): Seconds decoding the JSON body, None until decoded.
+
+    """
+
+    __slots__ = ('url', 'host', 'endpoint', 'status', 'namelookup', 'connect', 'appconnect',
+                 'pretransfer', 'starttransfer', 'total', 'wire_bytes', 'decoded_bytes',
+                 'encoding', 'reused', 'decode', '_observers')
+
+    def __init__(self, url: str, status: int, namelookup: float, connect: float,
+                 appconnect: float, pretransfer: float, starttransfer: float, total: float,
+                 wire_bytes: int, decoded_bytes: int, encoding: str = None,
+                 reused: bool = False, observers: Iterable['Observer'] = ()):
+        self.url = url
+        self.host = urlsplit(url).netloc
+        self.endpoint = template(url)
+        self.status = status
+        self.namelookup = namelookup
+        self.connect = connect
+        self.appconnect = appconnect
+        self.pretransfer = pretransfer
+        self.starttransfer = starttransfer
+        self.total = total
+        self.wire_bytes = wire_bytes
+        self.decoded_bytes = decoded_bytes
+        self.encoding = encoding
+        self.reused = reused
+        self.decode: Optional[float] = None
+        self._observers = tuple(observers)
+
+    @property
+    def phases(self) -> Dict[str, float]:
+        """Duration of each phase of :data:`PHASES` in seconds: 'dns',
+        'connect', 'tls', 'wait' (from sending the request to the first
+        byte) and 'transfer' (downloading the body)."""
+
+        # libcurl leaves the timings of skipped phases at 0, e.g. those of
+        # the handshakes on a reused connection
+        connected = max(self.namelookup, self.connect)
+        secured = max(connected, self.appconnect)
+        sent = max(secured, self.pretransfer)
+        first = max(sent, self.starttransfer)
+
+        return {
+            'dns': self.namelookup,
+            'connect': connected - self.namelookup,
+            'tls': secured - connected,
+            'wait': first - sent,
+            'transfer': max(0.0, self.total - first),
+        }
+
+    def decoded(self, seconds: float) -> None:
+        """Record the decode time of the body and notify the observers."""
+
+        self.decode = seconds
+        for observer in self._observers:
+            observer.decoded(self)
+
+    def as_dict(self) -> Dict[str, any]:
+        """Return the timing as a JSON-serializable dict, e.g. for logs."""
+
+        data = {name: getattr(self, name) for name in self.__slots__ if name != '_observers'}
+        data['phases'] = self.phases
+
+        return data
+
+    def __repr__(self) -> str:
+        return f'<RequestTiming {self.host}{self.endpoint} {self.status} {self.total:.3f}s>'
+
+
+class Observer:
+    """Receiver of the timings of a session.
+
+    Observers are added to :attr:`Session.observers`. Both methods are
+    called in the thread that completed the transfer or decoded the body,
+    possibly several at a time, and should return quickly.
+    """
+
+    def transfer(self, timing: RequestTiming) -> None:
+        """Called once a transfer completed, before its body is decoded."""
+
+    def decoded(self, timing: RequestTiming) -> None:
+        """Called once the body of a transfer was decoded."""
+
+
+class Recorder(Observer):
+    """Observer keeping the most recent timings in memory.
+
+    Args:
+      size(int): Number of timings kept. Defaults to 10000.
+
+    """
+
+    def __init__(self, size: int = 10000):
+        self.timings: Deque[RequestTiming] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def transfer(self, timing: RequestTiming) -> None:
+        with self._lock:
+            self.timings.append(timing)
+
+    def breakdown(self) -> Dict[str, Dict[str, float]]:
+        """Return the mean of each phase and of the decode time by endpoint.
+
+        Returns:
+          Dict[str, Dict[str, float]]: 'requests', the phases of
+          :data:`PHASES`, 'decode', 'total', 'wire_bytes' and
+          'decoded_bytes' by host and endpoint template, slowest first.
+
+        """
+
+        with self._lock:
+            timings = list(self.timings)
+
+        totals: Dict[str, Dict[str, float]] = {}
+        decodes: Dict[str, List[float]] = {}
+        for timing in timings:
+            key = timing.host + timing.endpoint
+            entry = totals.setdefault(key, dict.fromkeys(
+                ('requests',) + PHASES + ('total', 'wire_bytes', 'decoded_bytes'), 0))
+            entry['requests'] += 1
+            for phase, seconds in timing.phases.items():
+                entry[phase] += seconds
+            entry['total'] += timing.total
+            entry['wire_bytes'] += timing.wire_bytes
+            entry['decoded_bytes'] += timing.decoded_bytes
+            if timing.decode is not None:
+                decodes.setdefault(key, []).append(timing.decode)
+
+        for key, entry in totals.items():
+            count = entry['requests']
+            for name in PHASES + ('total', 'wire_bytes', 'decoded_bytes'):
+                entry[name] /= count
+            decoded = decodes.get(key)
+            entry['decode'] = sum(decoded) / len(decoded) if decoded else None
+
+        return dict(sorted(totals.items(), key=lambda item: -item[1]['total']))
+
+    def clear(self) -> None:
+        with self._lock:
+            self.timings.clear()
+
+
+class PrometheusExporter(Observer):
+    """Observer recording the timings as Prometheus metrics.
+
+    Metrics, labelled by 'host' and 'endpoint':
+
+    * ``{prefix}_request_duration_seconds``: histogram of the transfers.
+    * ``{prefix}_request_phase_seconds``: histogram of each phase, with a
+      'phase' label.
+    * ``{prefix}_decode_seconds``: histogram of the JSON decoding.
+    * ``{prefix}_requests_total``: counter of the transfers, with a
+      'status' label.
+    * ``{prefix}_response_bytes_total``: counter of the body sizes, with a
+      'kind' label, 'wire' or 'decoded'.
+
+    Args:
+      registry(prometheus_client.CollectorRegistry): Registry of the
+        metrics. Defaults to the default registry.
+
+      prefix(str): Prefix of the metric names. Defaults to 'defillama'.
+
+      buckets(Tuple[float, ...]): Histogram buckets in seconds.
+
+    """
+
+    def __init__(self, registry: 'prometheus_client.CollectorRegistry' = None,
+                 prefix: str = 'defillama', buckets: Tuple[float, ...] = BUCKETS):
+        _require_prometheus()
+
+        options = {} if registry is None else {'registry': registry}
+        labels = ['host', 'endpoint']
+        self.duration = prometheus_client.Histogram(
+            f'{prefix}_request_duration_seconds', 'Duration of the requests to the DeFiLlama API',
+            labels, buckets=buckets, **options)
+        self.phases = prometheus_client.Histogram(
+            f'{prefix}_request_phase_seconds', 'Duration of each phase of the requests',
+            labels + ['phase'], buckets=buckets, **options)
+        self.decode = prometheus_client.Histogram(
+            f'{prefix}_decode_seconds', 'Duration of the JSON decoding of the responses',
+            labels, buckets=buckets, **options)
+        self.requests = prometheus_client.Counter(
+            f'{prefix}_requests', 'Requests to the DeFiLlama API', labels + ['status'], **options)
+        self.bytes = prometheus_client.Counter(
+            f'{prefix}_response_bytes', 'Size of the response bodies', labels + ['kind'],
+            **options)
+
+    def transfer(self, timing: RequestTiming) -> None:
+        host, endpoint = timing.host, timing.endpoint
+        self.duration.labels(host, endpoint).observe(timing.total)
+        for phase, seconds in timing.phases.items():
+            self.phases.labels(host, endpoint, phase).observe(seconds)
+        self.requests.labels(host, endpoint, str(timing.status)).inc()
+        self.bytes.labels(host, endpoint, 'wire').inc(timing.wire_bytes)
+        self.bytes.labels(host, endpoint, 'decoded').inc(timing.decoded_bytes)
+
+    def decoded(self, timing: RequestTiming) -> None:
+        self.decode.labels(timing.host, timing.endpoint).observe(timing.decode)
+
+
+class OpenTelemetryExporter(Observer):
+    """Observer recording the timings as OpenTelemetry metrics.
+
+    Instruments, with the 'server.address', 'url.template' and
+    'http.response.status_code' attributes of the HTTP semantic
+    conventions:
+
+    * ``http.client.request.duration``: histogram of the transfers.
+    * ``defillama.request.phase.duration``: histogram of each phase, with a
+      'defillama.phase' attribute.
+    * ``defillama.decode.duration``: histogram of the JSON decoding.
+    * ``http.client.response.body.size``: histogram of the wire sizes.
+
+    Args:
+      meter(opentelemetry.metrics.Meter): Meter creating the instruments.
+        Defaults to the 'defillama' meter of the global meter provider.
+
+    """
+
+    def __init__(self, meter: 'otel_metrics.Meter' = None):
+        _require_opentelemetry()
+
+        meter = meter or otel_metrics.get_meter('defillama')
+        self.duration = meter.create_histogram(
+            'http.client.request.duration', unit='s',
+            description='Duration of the requests to the DeFiLlama API')
+        self.phases = meter.create_histogram(
+            'defillama.request.phase.duration', unit='s',
+            description='Duration of each phase of the requests')
+        self.decode = meter.create_histogram(
+            'defillama.decode.duration', unit='s',
+            description='Duration of the JSON decoding of the responses')
+        self.size = meter.create_histogram(
+            'http.client.response.body.size', unit='By',
+            description='Size of the response bodies as received')
+
+    @staticmethod
+    def _attributes(timing: RequestTiming) -> Dict[str, any]:
+        return {'server.address': timing.host, 'url.template': timing.endpoint,
+                'http.request.method': 'GET', 'http.response.status_code': timing.status}
+
+    def transfer(self, timing: RequestTiming) -> None:
+        attributes = self._attributes(timing)
+        self.duration.record(timing.total, attributes)
+        self.size.record(timing.wire_bytes, attributes)
+        for phase, seconds in timing.phases.items():
+            self.phases.record(seconds, dict(attributes, **{'defillama.phase': phase}))
+
+    def decoded(self, timing: RequestTiming) -> None:
+        self.decode.record(timing.decode, self._attributes(timing))
@@ -0,0 +1,200 @@
+"""Typed records for the most common entities returned by the API.
+
+Functions returning large lists of these entities accept ``model=True`` to
+return records instead of dicts, e.g. ``yields.get_pools(model=True)``.
+Fields are read as attributes (``pool.tvlUsd``); fields missing from a
+response are None and fields unknown to the record are dropped.
+
+When msgspec is installed, records are ``msgspec.Struct`` types decoded
+directly from the response bytes, which is both faster and lighter than
+building dicts. Otherwise they are plain classes with ``__slots__``, which
+take a fraction of the memory of the equivalent dicts.
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple, Type, Union
+from . import decoder
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+class Record:
+    """Base of the ``__slots__`` records used when msgspec is not installed."""
+
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+    def __eq__(self, other: object) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+
+def _model(name: str, fields: Tuple[str, ...], doc: str) -> type:
+    if msgspec is not None:
+        model = msgspec.defstruct(name, [(field, Any, None) for field in fields],
+                                  kw_only=True, gc=False, module=__name__)
+    else:
+        model = type(name, (Record,), {'__slots__': fields, '__module__': __name__})
+    model.__doc__ = doc
+
+    return model
+
+
+Pool = _model('Pool', (
+    'pool', 'chain', 'project', 'symbol', 'tvlUsd', 'apyBase', 'apyReward',
+    'apy', 'rewardTokens', 'apyPct1D', 'apyPct7D', 'apyPct30D', 'stablecoin',
+    'ilRisk', 'exposure', 'predictions', 'poolMeta', 'mu', 'sigma', 'count',
+    'outlier', 'underlyingTokens', 'il7d', 'apyBase7d', 'apyMean30d',
+    'volumeUsd1d', 'volumeUsd7d', 'apyBaseInception'),
+    'Yield pool as returned by ``yields.get_pools``.')
+
+Protocol = _model('Protocol', (
+    'id', 'name', 'address', 'symbol', 'url', 'description', 'chain', 'logo',
+    'audits', 'audit_note', 'gecko_id', 'cmcId', 'category', 'chains',
+    'module', 'twitter', 'forkedFrom', 'oracles', 'listedAt', 'slug', 'tvl',
+    'chainTvls', 'change_1h', 'change_1d', 'change_7d', 'mcap'),
+    'Protocol as listed by ``tvl.get_protocols``.')
+
+Chain = _model('Chain', (
+    'gecko_id', 'tvl', 'tokenSymbol', 'cmcId', 'name', 'chainId'),
+    'Chain as returned by ``tvl.get_chains``.')
+
+Bridge = _model('Bridge', (
+    'id', 'name', 'displayName', 'icon', 'volumePrevDay', 'volumePrev2Day',
+    'lastHourlyVolume', 'currentDayVolume', 'lastDailyVolume',
+    'dayBeforeLastVolume', 'weeklyVolume', 'monthlyVolume', 'chains',
+    'destinationChain'),
+    'Bridge as returned by ``bridges.get_bridges``.')
+
+Stablecoin = _model('Stablecoin', (
+    'id', 'name', 'symbol', 'gecko_id', 'pegType', 'pegMechanism',
+    'priceSource', 'circulating', 'circulatingPrevDay', 'circulatingPrevWeek',
+    'circulatingPrevMonth', 'chainCirculating', 'chains', 'price'),
+    'Stablecoin as returned by ``stablecoins.get_stablecoins``.')
+
+PriceQuote = _model('PriceQuote', (
+    'price', 'symbol', 'timestamp', 'confidence', 'decimals'),
+    'Token price as returned by the ``coins`` price functions.')
+
+Model = Union[Pool, Protocol, Chain, Bridge, Stablecoin, PriceQuote]
+Records = Union[List[Model], Dict[str, Model]]
+
+
+def _fields(model: Type[Model]) -> Tuple[str, ...]:
+    return model.__struct_fields__ if msgspec is not None else model.__slots__
+
+
+def from_dict(data: Dict[str, any], model: Type[Model]) -> Model:
+    """Convert a decoded record to a typed record.
+
+    Args:
+      data(Dict[str, any]): Decoded record.
+
+      model(Type[Model]): Record type, e.g. :class:`Pool`.
+
+    Returns:
+      Model: Typed record.
+
+    """
+
+    return model(**{name: data.get(name) for name in _fields(model)})
+
+
+def convert(data: Union[List[Dict], Dict[str, Dict]], model: Type[Model]) -> Records:
+    """Convert decoded records to typed records.
+
+    Args:
+      data(Union[List[Dict], Dict[str, Dict]]): List of records or dict of
+        records keyed by name.
+
+      model(Type[Model]): Record type, e.g. :class:`Pool`.
+
+    Returns:
+      Records: Typed records in the same container.
+
+    """
+
+    if isinstance(data, dict):
+        return {key: from_dict(value, model) for key, value in data.items()}
+
+    return [from_dict(value, model) for value in data]
+
+
+def decode(body: bytes,
+           model: Type[Model],
+           path: Tuple[str, ...] = (),
+           container: type = list) -> Records:
+    """Decode a response body straight into typed records.
+
+    Args:
+      body(bytes): Raw response body.
+
+      model(Type[Model]): Record type, e.g. :class:`Pool`.
+
+      path(Tuple[str, ...]): Keys leading to the records in the response.
+        Defaults to the response itself.
+
+      container(type): ``list`` for a list of records or ``dict`` for records
+        keyed by name. Defaults to ``list``.
+
+    Returns:
+      Records: Typed records.
+
+    Raises:
+      ValueError: The response does not hold records at `path`.
+
+    """
+
+    if msgspec is not None:
+        try:
+            data = msgspec.json.decode(body, type=_envelope(model, path, container))
+        except msgspec.DecodeError:
+            # Unexpected shape, e.g. a field holding another type than usual:
+            # decoded untyped below, like decoder.loads falls back
+            pass
+        else:
+            for key in path:
+                data = getattr(data, key)
+            return data
+
+    data = decoder.loads(body)
+    try:
+        for key in path:
+            data = data[key]
+        return convert(data, model)
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Response does not hold {model.__name__} records") from e
+
+
+@lru_cache(maxsize=None)
+def _envelope(model: Type[Model], path: Tuple[str, ...], container: type) -> type:
+    target = List[model] if container is list else Dict[str, model]
+    for key in reversed(path):
+        target = msgspec.defstruct('Envelope', [(key, target)], gc=False)
+
+    return target
+
+
+def asdict(record: Model) -> Dict[str, any]:
+    """Convert a typed record back to a dict.
+
+    Args:
+      record(Model): Typed record.
+
+    Returns:
+      Dict[str, any]: Fields of the record.
+
+    """
+
+    return {name: getattr(record, name) for name in _fields(type(record))}
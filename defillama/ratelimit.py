@@ -0,0 +1,405 @@
+"""Client-side rate limiting and adaptive concurrency per DeFiLlama host.
+
+A :class:`RateLimiter` attached to a session admits every request through
+two limits of its host:
+
+* a token bucket capping the request rate, which halves its rate when the
+  host answers 429 or 503 (honouring ``Retry-After``) and grows it back by
+  small steps while requests succeed;
+* an AIMD concurrency limit capping the requests in flight, which halves on
+  429/5xx responses, transport errors or latency above a target and grows by
+  about one request per round trip otherwise.
+
+    >>> from defillama import ratelimit
+    >>> ratelimit.enable()                                  # this process
+    >>> ratelimit.enable(directory='/tmp/defillama-limits') # whole node
+
+With a directory, the token buckets live in small files locked with
+``fcntl`` so every process of the node shares the rate of each host (the
+concurrency limit stays per process). Throttled requests are delayed, never
+dropped: synchronous calls sleep, and batch and async runs hold them back
+without blocking other transfers.
+"""
+
+import os
+import struct
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from .session import get_session
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Sustained requests per second allowed per host at first. The rate grows
+# up to MAX_RATE_FACTOR times this while the host keeps answering.
+DEFAULT_RATES: Dict[str, float] = {
+    'coins.llama.fi': 10,
+    'yields.llama.fi': 5,
+}
+
+DEFAULT_RATE = 10
+
+MAX_RATE_FACTOR = 4
+
+_STATE = struct.Struct('>dddd')
+
+
+class TokenBucket:
+    """Token bucket with an adaptive rate.
+
+    Args:
+      rate(float): Initial rate in requests per second.
+
+      burst(float): Capacity of the bucket. Defaults to twice the rate.
+
+      max_rate(float): Highest rate reached by growing it back.
+        Defaults to the initial rate.
+
+      path(str): File holding the state of the bucket, shared by every
+        process using the same path. Defaults to None (process-local).
+
+    """
+
+    def __init__(self,
+                 rate: float,
+                 burst: float = None,
+                 max_rate: float = None,
+                 path: str = None):
+        self.min_rate = rate / 16
+        self.max_rate = max(rate, max_rate or rate)
+        self.step = rate / 10
+        self.burst = burst or max(1.0, 2 * rate)
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = [self.burst, time.time(), rate, time.time()]
+
+        if path is not None and fcntl is not None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        else:
+            self._fd = None
+
+    @property
+    def rate(self) -> float:
+        """Current rate in requests per second."""
+
+        return self._update(lambda state: None)[2]
+
+    def _update(self, change: callable) -> list:
+        """Refill the bucket and apply `change` to its state under the locks."""
+
+        with self._lock:
+            if self._fd is None:
+                return self._apply(self._state, change)
+
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                data = os.pread(self._fd, _STATE.size, 0)
+                state = list(_STATE.unpack(data)) if len(data) == _STATE.size else self._state
+                state = self._apply(state, change)
+                os.pwrite(self._fd, _STATE.pack(*state), 0)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+            return state
+
+    def _apply(self, state: list, change: callable) -> list:
+        tokens, updated, rate, grown = state
+        now = time.time()
+        state[:] = [min(self.burst, tokens + max(0.0, now - updated) * rate), now, rate, grown]
+        change(state)
+
+        return state
+
+    def take(self) -> float:
+        """Take a token if one is available.
+
+        Returns:
+          float: 0 if a token was taken, otherwise the time in seconds until
+          one is available.
+
+        """
+
+        delay = []
+
+        def change(state: list) -> None:
+            if state[0] >= 1:
+                state[0] -= 1
+            else:
+                delay.append((1 - state[0]) / state[2])
+
+        self._update(change)
+
+        return delay[0] if delay else 0.0
+
+    def throttled(self, retry_after: float = None) -> None:
+        """Halve the rate after the host throttled a request.
+
+        The rate does not grow back for a second.
+
+        Args:
+          retry_after(float): Seconds the host asked to wait, if any. The
+            bucket is emptied so that no request is admitted before then.
+
+        """
+
+        def change(state: list) -> None:
+            state[2] = max(self.min_rate, state[2] / 2)
+            state[3] = state[1]
+            if retry_after:
+                state[0] = min(state[0], -retry_after * state[2])
+
+        self._update(change)
+
+    def succeeded(self) -> None:
+        """Grow the rate by a tenth of the initial rate after a successful
+        request, at most once per second."""
+
+        def change(state: list) -> None:
+            if state[1] - state[3] >= 1:
+                state[2] = min(self.max_rate, state[2] + self.step)
+                state[3] = state[1]
+
+        self._update(change)
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class ConcurrencyLimit:
+    """Additive-increase/multiplicative-decrease limit of requests in flight.
+
+    Args:
+      initial(int): Initial limit. Defaults to 8.
+
+      minimum(int): Lowest limit. Defaults to 1.
+
+      maximum(int): Highest limit. Defaults to 64.
+
+    """
+
+    def __init__(self, initial: int = 8, minimum: int = 1, maximum: int = 64):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.in_flight = 0
+        self._decreased = 0.0
+        self._lock = threading.Lock()
+
+    def enter(self) -> bool:
+        """Count a request in flight if the limit allows it.
+
+        Returns:
+          bool: Whether the request may start.
+
+        """
+
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+
+        return True
+
+    def cancel(self) -> None:
+        """Uncount a request that entered but did not start."""
+
+        with self._lock:
+            self.in_flight -= 1
+
+    def leave(self, congested: bool, latency: float = None) -> None:
+        """Count a request as finished and adapt the limit.
+
+        Args:
+          congested(bool): Whether the request was throttled, failed or was
+            too slow.
+
+          latency(float): Duration of the request in seconds.
+
+        """
+
+        now = time.monotonic()
+
+        with self._lock:
+            self.in_flight -= 1
+            if congested:
+                # Decrease at most once per round trip, a burst of failures
+                # is a single congestion event
+                if now - self._decreased > (latency or 1.0):
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._decreased = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+
+class RateLimiter:
+    """Per-host token buckets and concurrency limits admitting the requests of
+    a session.
+
+    Args:
+      rates(Dict[str, float]): Initial rates in requests per second by host.
+        Checked before :data:`DEFAULT_RATES`.
+
+      default_rate(float): Initial rate of the other hosts.
+        Defaults to :data:`DEFAULT_RATE`.
+
+      directory(str): Directory of the bucket files shared by the processes
+        of the node. Defaults to None (process-local buckets).
+
+      concurrency(int): Initial concurrency limit of each host.
+        Defaults to 8.
+
+      max_concurrency(int): Highest concurrency limit of each host.
+        Defaults to 64.
+
+      latency_target(float): Latency in seconds above which the concurrency
+        limit of a host decreases. Defaults to None.
+
+    """
+
+    def __init__(self,
+                 rates: Dict[str, float] = None,
+                 default_rate: float = DEFAULT_RATE,
+                 directory: str = None,
+                 concurrency: int = 8,
+                 max_concurrency: int = 64,
+                 latency_target: float = None):
+        self.rates = dict(DEFAULT_RATES, **(rates or {}))
+        self.default_rate = default_rate
+        self.directory = os.path.expanduser(directory) if directory else None
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._limits: Dict[str, ConcurrencyLimit] = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host: str) -> Tuple[TokenBucket, ConcurrencyLimit]:
+        with self._lock:
+            if host not in self._buckets:
+                rate = self.rates.get(host, self.default_rate)
+                path = os.path.join(self.directory, f'{host}.bucket') if self.directory else None
+                self._buckets[host] = TokenBucket(rate, max_rate=rate * MAX_RATE_FACTOR, path=path)
+                self._limits[host] = ConcurrencyLimit(self.concurrency, 1, self.max_concurrency)
+
+            return self._buckets[host], self._limits[host]
+
+    def admit(self, url: str) -> float:
+        """Admit a request if the limits of its host allow it.
+
+        Args:
+          url(str): URL to request.
+
+        Returns:
+          float: 0 if the request may start now, otherwise the time in
+          seconds to wait before asking again.
+
+        """
+
+        bucket, limit = self._host(urlsplit(url).netloc)
+
+        if not limit.enter():
+            return 0.01
+
+        delay = bucket.take()
+        if delay:
+            limit.cancel()
+
+        return delay
+
+    def done(self, url: str, status: Optional[int], latency: float = None,
+             retry_after: float = None) -> None:
+        """Record the outcome of an admitted request.
+
+        Args:
+          url(str): Requested URL.
+
+          status(Optional[int]): HTTP status, or None if the transfer failed.
+
+          latency(float): Duration of the request in seconds.
+
+          retry_after(float): Value of the Retry-After header, if any.
+
+        """
+
+        bucket, limit = self._host(urlsplit(url).netloc)
+
+        if status in (429, 503):
+            bucket.throttled(retry_after)
+        elif status is not None and status < 500:
+            bucket.succeeded()
+
+        congested = (status is None or status == 429 or status >= 500
+                     or (self.latency_target is not None and latency is not None
+                         and latency > self.latency_target))
+        limit.leave(congested, latency)
+
+    def cancel(self, url: str) -> None:
+        """Release an admitted request that was aborted, e.g. a hedge that
+        lost or a cancelled transfer, without adapting the limits.
+
+        Args:
+          url(str): Requested URL.
+
+        """
+
+        _, limit = self._host(urlsplit(url).netloc)
+        limit.cancel()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Return the current limits of each host.
+
+        Returns:
+          Dict[str, Dict[str, float]]: 'rate', 'concurrency' and 'in_flight'
+          by host.
+
+        """
+
+        with self._lock:
+            hosts = list(self._buckets)
+
+        stats = {}
+        for host in hosts:
+            bucket, limit = self._host(host)
+            stats[host] = {'rate': bucket.rate, 'concurrency': limit.limit,
+                           'in_flight': limit.in_flight}
+
+        return stats
+
+    def close(self) -> None:
+        """Close the bucket files."""
+
+        with self._lock:
+            for bucket in self._buckets.values():
+                bucket.close()
+
+
+def enable(**kwargs) -> RateLimiter:
+    """Attach a rate limiter to the shared session.
+
+    Args:
+      **kwargs: Arguments of :class:`RateLimiter`.
+
+    Returns:
+      RateLimiter: Attached limiter.
+
+    """
+
+    limiter = RateLimiter(**kwargs)
+    get_session().limiter = limiter
+
+    return limiter
+
+
+def disable() -> None:
+    """Detach the rate limiter of the shared session."""
+
+    get_session().limiter = None
@@ -0,0 +1,269 @@
+"""Retries, deadlines and hedged requests.
+
+Every session retries the requests failing with a transient transport error
+(connection refused or reset, timeout, truncated body, ...) or a retryable
+status (429, 500, 502, 503, 504), waiting an exponentially growing, fully
+jittered delay between attempts. The policy is set per session:
+
+    >>> from defillama.session import Session, set_session
+    >>> from defillama.retry import RetryPolicy
+    >>> set_session(Session(retry=RetryPolicy(attempts=5), hedge=True))
+
+A deadline bounds the total time of the calls made within a block, retries
+included, whatever the function:
+
+    >>> from defillama import retry
+    >>> with retry.deadline(10):
+    ...     tvl.get_protocols()
+
+With ``hedge=True``, a request that has not answered within the 95th
+percentile latency of its endpoint is duplicated and the first response
+wins, which trims the tail latency of slow endpoints at the cost of a few
+extra requests.
+"""
+
+import random
+import threading
+import time
+from bisect import insort
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Deque, Dict, FrozenSet, Iterator, Optional, Sequence
+from urllib.parse import urlsplit
+
+# libcurl error codes worth retrying: resolution and connection failures,
+# HTTP/2 framing errors, partial bodies, timeouts, TLS handshake failures,
+# empty replies and send/receive errors.
+RETRYABLE_ERRORS: FrozenSet[int] = frozenset({6, 7, 16, 18, 28, 35, 52, 55, 56, 92})
+
+RETRYABLE_STATUSES: FrozenSet[int] = frozenset({429, 500, 502, 503, 504})
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call runs past the deadline set by :func:`deadline`."""
+
+
+_deadline: ContextVar[Optional[float]] = ContextVar('deadline', default=None)
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """Bound the total time of the calls made within a ``with`` block.
+
+    Nested deadlines cannot extend an enclosing one.
+
+    Args:
+      seconds(float): Time budget of the block in seconds.
+
+    """
+
+    end = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(end if current is None else min(current, end))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Return the time left before the current deadline.
+
+    Returns:
+      Optional[float]: Seconds left (possibly negative), or None if no
+      deadline is set.
+
+    """
+
+    end = _deadline.get()
+
+    return None if end is None else end - time.monotonic()
+
+
+def check_deadline(url: str) -> None:
+    """Raise :class:`DeadlineExceeded` if the current deadline has passed.
+
+    Args:
+      url(str): URL about to be requested.
+
+    """
+
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded before requesting {url}")
+
+
+def retry_after(headers: Dict[str, str]) -> Optional[float]:
+    """Return the delay requested by the Retry-After header of a response.
+
+    Args:
+      headers(Dict[str, str]): Response headers with lower-cased names.
+
+    Returns:
+      Optional[float]: Delay in seconds, or None if there is none.
+
+    """
+
+    value = headers.get('retry-after')
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """When and after how long failed requests are attempted again.
+
+    Args:
+      attempts(int): Maximum number of attempts per request, 1 disabling
+        retries. Defaults to 3.
+
+      backoff(float): Base delay in seconds. The delay before attempt `n`
+        is drawn uniformly between 0 and ``backoff * 2 ** n``.
+        Defaults to 0.5.
+
+      max_backoff(float): Upper bound of the delays, including those asked
+        for by the server with Retry-After. Defaults to 30.
+
+      statuses(Sequence[int]): HTTP statuses worth retrying.
+        Defaults to :data:`RETRYABLE_STATUSES`.
+
+      errors(Sequence[int]): libcurl error codes worth retrying.
+        Defaults to :data:`RETRYABLE_ERRORS`.
+
+    """
+
+    def __init__(self,
+                 attempts: int = 3,
+                 backoff: float = 0.5,
+                 max_backoff: float = 30.0,
+                 statuses: Sequence[int] = RETRYABLE_STATUSES,
+                 errors: Sequence[int] = RETRYABLE_ERRORS):
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+        self.errors = frozenset(errors)
+
+    def delay(self,
+              attempt: int,
+              error: BaseException = None,
+              response: 'Response' = None) -> Optional[float]:
+        """Return the delay before the next attempt of a request.
+
+        Args:
+          attempt(int): Number of the attempt that just ended, from 0.
+
+          error(BaseException): Exception raised by the attempt, if any.
+
+          response(Response): Response of the attempt, if any.
+
+        Returns:
+          Optional[float]: Delay in seconds, at most `max_backoff`, or None
+          if the request must not be attempted again: it succeeded, failed
+          for good, used its attempts or would wait past the deadline.
+
+        """
+
+        if attempt + 1 >= self.attempts:
+            return None
+
+        if error is not None:
+            if not error.args or error.args[0] not in self.errors:
+                return None
+            wait = None
+        elif response is not None and response.status in self.statuses:
+            wait = retry_after(response.headers)
+        else:
+            return None
+
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if wait is not None:
+            delay = max(delay, min(wait, self.max_backoff))
+
+        left = remaining()
+        if left is not None and delay >= left:
+            return None
+
+        return delay
+
+
+class LatencyTracker:
+    """Recent latencies of each endpoint, deciding when to hedge a request.
+
+    Endpoints are identified by host and first path segment, e.g.
+    'api.llama.fi/protocol'.
+
+    Args:
+      size(int): Number of latencies kept per endpoint. Defaults to 256.
+
+      min_samples(int): Number of latencies needed before hedging.
+        Defaults to 20.
+
+      quantile(float): Quantile of the latencies after which a request is
+        hedged. Defaults to 0.95.
+
+    """
+
+    def __init__(self, size: int = 256, min_samples: int = 20, quantile: float = 0.95):
+        self.size = size
+        self.min_samples = min_samples
+        self.quantile = quantile
+        self._recent: Dict[str, Deque[float]] = {}
+        self._sorted: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def endpoint(url: str) -> str:
+        parts = urlsplit(url)
+
+        return parts.netloc + '/' + parts.path.lstrip('/').split('/', 1)[0]
+
+    def record(self, url: str, seconds: float) -> None:
+        """Record the latency of a successful request.
+
+        Args:
+          url(str): Requested URL.
+
+          seconds(float): Latency of the request.
+
+        """
+
+        key = self.endpoint(url)
+
+        with self._lock:
+            recent = self._recent.setdefault(key, deque())
+            ordered = self._sorted.setdefault(key, [])
+            recent.append(seconds)
+            insort(ordered, seconds)
+            if len(recent) > self.size:
+                ordered.remove(recent.popleft())
+
+    def threshold(self, url: str) -> Optional[float]:
+        """Return the latency after which a request to the URL is hedged.
+
+        Args:
+          url(str): URL to request.
+
+        Returns:
+          Optional[float]: Latency in seconds, or None while too few
+          latencies of the endpoint are known.
+
+        """
+
+        with self._lock:
+            ordered = self._sorted.get(self.endpoint(url))
+            if not ordered or len(ordered) < self.min_samples:
+                return None
+
+            return ordered[min(len(ordered) - 1, int(len(ordered) * self.quantile))]
@@ -0,0 +1,914 @@
+import math
+import threading
+import time
+import pycurl
+import certifi
+from io import BytesIO
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+from . import decoder
+from .metrics import Observer, RequestTiming
+from .retry import (DeadlineExceeded, LatencyTracker, RetryPolicy, check_deadline,
+                    remaining, retry_after)
+
+USERAGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/111.0.0.0 Safari/537.36'
+
+_HTTP2 = bool(pycurl.version_info()[4] & getattr(pycurl, 'VERSION_HTTP2', 0))
+
+# Integer byte count, the double variant is deprecated by libcurl
+_SIZE_DOWNLOAD = getattr(pycurl, 'SIZE_DOWNLOAD_T', pycurl.SIZE_DOWNLOAD)
+
+
+class HTTPError(Exception):
+    """Raised when the API answers a request with an error status.
+
+    Args:
+      response(Response): Response of the failed request.
+
+    """
+
+    def __init__(self, response: 'Response'):
+        super().__init__(f"HTTP {response.status} for {response.url}")
+        self.response = response
+        self.url = response.url
+        self.status = response.status
+
+    @property
+    def retry_after(self) -> Optional[float]:
+        """Seconds to wait before retrying, as requested by the server."""
+
+        return retry_after(self.response.headers)
+
+
+class Response:
+    """Raw response of a single request made through a :class:`Session`.
+
+    Args:
+      url(str): URL the request was made to.
+      status(int): HTTP status code of the response.
+      body(bytes): Undecoded response body.
+      headers(Dict[str, str]): Response headers with lower-cased names.
+      timing(RequestTiming): Timings of the transfer, when the session has
+        observers, see :mod:`defillama.metrics`.
+
+    """
+
+    __slots__ = ('url', 'status', 'body', 'headers', 'timing')
+
+    def __init__(self, url: str, status: int, body: bytes, headers: Dict[str, str] = None,
+                 timing: RequestTiming = None):
+        self.url = url
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+        self.timing = timing
+
+    def json(self, json_backend: str = None) -> any:
+        """Decode the response body as JSON.
+
+        The body is handed to the JSON backend as bytes, without decoding it
+        to a string first.
+
+        Args:
+          json_backend(str): JSON backend to use, see :mod:`defillama.decoder`.
+            Defaults to the current backend.
+
+        Returns:
+          any: Decoded response body.
+
+        """
+
+        if self.timing is None:
+            return decoder.loads(self.body, json_backend)
+
+        start = time.perf_counter()
+        data = decoder.loads(self.body, json_backend)
+        self.timing.decoded(time.perf_counter() - start)
+
+        return data
+
+    def raise_for_status(self) -> None:
+        """Raise :class:`HTTPError` if the response has an error status."""
+
+        if self.status >= 400:
+            raise HTTPError(self)
+
+
+class Transfer:
+    """State of a request between :meth:`Session.prepare` and
+    :meth:`Session.finish`.
+
+    Args:
+      url(str): URL to request.
+      buffer(BytesIO): Buffer receiving the body, if it is not streamed.
+
+    """
+
+    __slots__ = ('url', 'buffer', 'headers', 'cached', 'streamed')
+
+    def __init__(self, url: str, buffer: Optional[BytesIO]):
+        self.url = url
+        self.buffer = buffer
+        self.headers: Dict[str, str] = {}
+        self.cached = None
+        # Decoded bytes passed to the write callback of a streamed request
+        self.streamed = 0
+
+    def header(self, line: bytes) -> None:
+        """Header callback of the Curl handle."""
+
+        line = line.decode('iso-8859-1').strip()
+
+        if line.startswith('HTTP/'):
+            # Status line of a new response, e.g. after a redirect
+            self.headers.clear()
+        elif ':' in line:
+            name, value = line.split(':', 1)
+            self.headers[name.strip().lower()] = value.strip()
+
+
+class _Flight:
+    """Request in flight, awaited by the callers asking for the same URL."""
+
+    __slots__ = ('done', 'response', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response: Optional[Response] = None
+        self.error: Optional[BaseException] = None
+
+    def taken_over(self) -> bool:
+        """Whether a follower should take the request over once done: the
+        leader abandoned it, ran out of its own deadline or was
+        interrupted."""
+
+        error = self.error
+        if error is None:
+            return self.response is None
+
+        return isinstance(error, DeadlineExceeded) or not isinstance(error, Exception)
+
+
+class BandwidthStats:
+    """Bytes received on the wire and after decompression, by endpoint.
+
+    Endpoints are identified by host and first path segment, e.g.
+    'api.llama.fi/protocols', like in :class:`defillama.retry.LatencyTracker`.
+    """
+
+    def __init__(self):
+        self._endpoints: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, url: str, wire: int, decoded: int, encoding: str = None) -> None:
+        """Record the body sizes of a response.
+
+        Args:
+          url(str): Requested URL.
+
+          wire(int): Bytes of the body as received.
+
+          decoded(int): Bytes of the body after decompression.
+
+          encoding(str): Content-Encoding of the response, if any.
+
+        """
+
+        key = LatencyTracker.endpoint(url)
+
+        with self._lock:
+            stats = self._endpoints.setdefault(
+                key, {'requests': 0, 'compressed': 0, 'wire_bytes': 0, 'decoded_bytes': 0})
+            stats['requests'] += 1
+            stats['compressed'] += 1 if encoding and encoding != 'identity' else 0
+            stats['wire_bytes'] += wire
+            stats['decoded_bytes'] += decoded
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Return the totals of each endpoint.
+
+        Returns:
+          Dict[str, Dict[str, float]]: 'requests', 'compressed' (responses),
+          'wire_bytes', 'decoded_bytes' and 'ratio' (wire over decoded bytes)
+          by endpoint.
+
+        """
+
+        with self._lock:
+            stats = {key: dict(value) for key, value in self._endpoints.items()}
+
+        for value in stats.values():
+            decoded = value['decoded_bytes']
+            value['ratio'] = value['wire_bytes'] / decoded if decoded else 1.0
+
+        return stats
+
+    def reset(self) -> None:
+        """Forget the recorded sizes."""
+
+        with self._lock:
+            self._endpoints.clear()
+
+
+class Session:
+    """Reusable PyCurl session with a per-host pool of Curl handles.
+
+    Every Curl handle created by the session is attached to a single
+    ``pycurl.CurlShare`` so DNS lookups, TLS sessions and (where libcurl
+    supports it) open connections are shared between handles. Handles are
+    returned to the pool of their host after each request and keep their
+    connections alive, so consecutive calls to the same DeFiLlama host skip
+    the TCP and TLS handshakes. HTTP/2 is negotiated when libcurl is built
+    with it.
+
+    The session is safe to share between threads. Threads requesting a URL
+    that another thread is already fetching wait for that request and share
+    its response instead of making their own.
+
+    Args:
+      pool_size(int): Maximum number of idle handles kept per host.
+        Defaults to 8.
+
+      http2(bool): Whether to negotiate HTTP/2 when available.
+        Defaults to True.
+
+      useragent(str): User-agent sent with every request.
+
+      cache(HTTPCache): Response cache, see :mod:`defillama.cache`.
+        Defaults to None (no caching).
+
+      limiter(RateLimiter): Per-host rate and concurrency limits, see
+        :mod:`defillama.ratelimit`. Defaults to None (no limits).
+
+      connect_timeout(float): Maximum time in seconds to connect to a host.
+        Defaults to 10.
+
+      timeout(float): Maximum time in seconds of a whole request. Streamed
+        requests are not bounded, but are aborted when no data arrives for
+        this long. Defaults to 120.
+
+      retry(RetryPolicy): Retries of failed requests, see
+        :mod:`defillama.retry`. Defaults to 3 attempts with jittered
+        exponential backoff.
+
+      hedge(bool): Whether to duplicate requests slower than the 95th
+        percentile latency of their endpoint. Defaults to False.
+
+      compression(bool): Whether to ask for compressed responses (every
+        encoding libcurl was built with among gzip, deflate, brotli and
+        zstd). Bodies are decompressed as they arrive, before reaching the
+        buffer, the streaming parser or the cache. Defaults to True.
+
+      observers(List[Observer]): Receivers of the phase timings, sizes and
+        decode time of every request, see :mod:`defillama.metrics`. More
+        can be added to :attr:`observers` at any time. Defaults to None.
+
+    """
+
+    def __init__(self,
+                 pool_size: int = 8,
+                 http2: bool = True,
+                 useragent: str = USERAGENT,
+                 cache: 'HTTPCache' = None,
+                 limiter: 'RateLimiter' = None,
+                 connect_timeout: float = 10.0,
+                 timeout: float = 120.0,
+                 retry: RetryPolicy = None,
+                 hedge: bool = False,
+                 compression: bool = True,
+                 observers: List[Observer] = None):
+        self.pool_size = pool_size
+        self.http2 = http2 and _HTTP2
+        self.useragent = useragent
+        self.cache = cache
+        self.limiter = limiter
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.hedge = hedge
+        self.compression = compression
+        self.latency = LatencyTracker()
+        self.bandwidth = BandwidthStats()
+        self.observers: List[Observer] = list(observers or ())
+
+        self._share = pycurl.CurlShare()
+        self._share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+        self._share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+        if hasattr(pycurl, 'LOCK_DATA_CONNECT'):
+            self._share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_CONNECT)
+
+        self._pools: Dict[str, List[pycurl.Curl]] = {}
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _new_handle(self) -> pycurl.Curl:
+        """Create a Curl handle with the options shared by every request."""
+
+        curl = pycurl.Curl()
+        curl.setopt(pycurl.USERAGENT, self.useragent)
+        curl.setopt(pycurl.CAINFO, certifi.where())
+        curl.setopt(pycurl.SHARE, self._share)
+        curl.setopt(pycurl.NOSIGNAL, 1)
+        curl.setopt(pycurl.TCP_KEEPALIVE, 1)
+        curl.setopt(pycurl.CONNECTTIMEOUT_MS, int(self.connect_timeout * 1000))
+        if self.compression:
+            # An empty value offers every encoding libcurl supports
+            curl.setopt(pycurl.ACCEPT_ENCODING, '')
+        if self.http2:
+            curl.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_2TLS)
+
+        return curl
+
+    def acquire(self, url: str) -> pycurl.Curl:
+        """Take an idle handle for the host of the URL out of the pool.
+
+        A new handle is created when the pool of the host is empty.
+
+        Args:
+          url(str): URL the handle will be used for.
+
+        Returns:
+          pycurl.Curl: Curl handle ready to be prepared for a request.
+
+        """
+
+        host = urlsplit(url).netloc
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Session is closed')
+            pool = self._pools.get(host)
+            if pool:
+                return pool.pop()
+
+        return self._new_handle()
+
+    def release(self, url: str, curl: pycurl.Curl) -> None:
+        """Return a handle to the pool of the host of the URL.
+
+        The handle is closed if the pool is already full or the session has
+        been closed.
+
+        Args:
+          url(str): URL the handle was used for.
+
+          curl(pycurl.Curl): Handle to release.
+
+        """
+
+        host = urlsplit(url).netloc
+
+        with self._lock:
+            if not self._closed:
+                pool = self._pools.setdefault(host, [])
+                if len(pool) < self.pool_size:
+                    pool.append(curl)
+                    return
+
+        curl.close()
+
+    def discard(self, url: str, curl: pycurl.Curl, failed: bool = True) -> None:
+        """Close a handle whose transfer failed or was aborted.
+
+        Args:
+          url(str): URL the handle was used for.
+
+          curl(pycurl.Curl): Handle to close.
+
+          failed(bool): Whether the transfer failed, which the rate limiter
+            counts as congestion, rather than being aborted by the caller.
+            Defaults to True.
+
+        """
+
+        curl.close()
+
+        if self.limiter is not None:
+            if failed:
+                self.limiter.done(url, None)
+            else:
+                self.limiter.cancel(url)
+
+    def admit(self, url: str) -> float:
+        """Ask the rate limiter whether a request may start.
+
+        Callers check this right before acquiring a handle and wait for the
+        returned delay before asking again.
+
+        Args:
+          url(str): URL to request.
+
+        Returns:
+          float: 0 if the request may start now, otherwise the time in
+          seconds to wait.
+
+        """
+
+        if self.limiter is None:
+            return 0.0
+
+        return self.limiter.admit(url)
+
+    def _wait_admission(self, url: str) -> None:
+        delay = self.admit(url)
+        while delay:
+            time.sleep(delay)
+            check_deadline(url)
+            delay = self.admit(url)
+
+    def _acquire_admitted(self, url: str) -> pycurl.Curl:
+        """Acquire a handle for an admitted request, giving the admission
+        back to the rate limiter if none can be had."""
+
+        try:
+            return self.acquire(url)
+        except BaseException:
+            if self.limiter is not None:
+                self.limiter.cancel(url)
+            raise
+
+    def lookup(self, url: str) -> Optional[Response]:
+        """Return the cached response of a URL if it is still fresh.
+
+        Callers check this before acquiring a handle so cache hits make no
+        request at all.
+
+        Args:
+          url(str): URL to request.
+
+        Returns:
+          Optional[Response]: Cached response, or None if a request is needed.
+
+        """
+
+        if self.cache is None:
+            return None
+
+        return self.cache.lookup(url)
+
+    def hold(self, url: str) -> float:
+        """Return how long a response found by :meth:`lookup` is held back
+        before being served.
+
+        Only sessions simulating the latency of the responses they serve
+        without a request hold them back. Synchronous callers sleep the
+        delay, batch and asyncio runs wait for it without blocking other
+        transfers.
+
+        Args:
+          url(str): URL whose response was looked up.
+
+        Returns:
+          float: Delay in seconds.
+
+        """
+
+        return 0.0
+
+    def prepare(self,
+                curl: pycurl.Curl,
+                url: str,
+                write: Callable[[bytes], None] = None) -> Transfer:
+        """Set the per-request options of a handle.
+
+        When a stale cached response of the URL has an ETag or Last-Modified
+        validator, the request is made conditional. The request is bounded
+        by the timeout of the session and the current deadline of
+        :mod:`defillama.retry`.
+
+        Args:
+          curl(pycurl.Curl): Handle acquired from the session.
+
+          url(str): URL to request.
+
+          write(Callable[[bytes], None]): Callback receiving the response
+            body chunk by chunk. Defaults to None, buffering the body.
+            Streamed responses bypass the cache.
+
+        Returns:
+          Transfer: State to pass to :meth:`finish`.
+
+        """
+
+        transfer = Transfer(url, None if write else BytesIO())
+        curl.setopt(pycurl.URL, url)
+        if write is not None:
+            def counted(chunk: bytes) -> None:
+                transfer.streamed += len(chunk)
+                write(chunk)
+
+            curl.setopt(pycurl.WRITEFUNCTION, counted)
+        else:
+            curl.setopt(pycurl.WRITEFUNCTION, transfer.buffer.write)
+        curl.setopt(pycurl.HEADERFUNCTION, transfer.header)
+
+        headers = []
+        if self.cache is not None and write is None:
+            transfer.cached = self.cache.stale(url)
+            if transfer.cached is not None:
+                headers = transfer.cached.validators()
+        curl.setopt(pycurl.HTTPHEADER, headers)
+
+        # Handles are reused, so every timeout is set again
+        budget = 0 if write else self.timeout
+        left = remaining()
+        if left is not None:
+            budget = min(budget, left) if budget else left
+        # Rounded up, so that a transfer timing out has passed the deadline
+        curl.setopt(pycurl.TIMEOUT_MS, max(1, math.ceil(budget * 1000)) if budget else 0)
+        curl.setopt(pycurl.LOW_SPEED_LIMIT, 1)
+        curl.setopt(pycurl.LOW_SPEED_TIME, max(1, int(self.timeout)))
+
+        return transfer
+
+    def finish(self, curl: pycurl.Curl, url: str, transfer: Transfer) -> Response:
+        """Build the response of a handle that finished its transfer.
+
+        Args:
+          curl(pycurl.Curl): Handle that performed the request.
+
+          url(str): URL that was requested.
+
+          transfer(Transfer): State returned by :meth:`prepare`.
+
+        Returns:
+          Response: Response of the request. The body is empty when it was
+          streamed to a write callback.
+
+        """
+
+        status = curl.getinfo(pycurl.RESPONSE_CODE)
+        latency = curl.getinfo(pycurl.TOTAL_TIME)
+        wire = int(curl.getinfo(_SIZE_DOWNLOAD))
+        decoded = transfer.buffer.tell() if transfer.buffer is not None else transfer.streamed
+        encoding = transfer.headers.get('content-encoding')
+
+        if self.limiter is not None:
+            self.limiter.done(url, status, latency, retry_after(transfer.headers))
+        if status < 400 and transfer.buffer is not None:
+            self.latency.record(url, latency)
+        self.bandwidth.record(url, wire, decoded, encoding)
+
+        timing = None
+        if self.observers:
+            timing = RequestTiming(
+                url, status, curl.getinfo(pycurl.NAMELOOKUP_TIME), curl.getinfo(pycurl.CONNECT_TIME),
+                curl.getinfo(pycurl.APPCONNECT_TIME), curl.getinfo(pycurl.PRETRANSFER_TIME),
+                curl.getinfo(pycurl.STARTTRANSFER_TIME), latency, wire, decoded, encoding,
+                curl.getinfo(pycurl.NUM_CONNECTS) == 0, self.observers)
+            for observer in self.observers:
+                observer.transfer(timing)
+
+        if status == 304 and transfer.cached is not None:
+            response = self.cache.revalidated(url, transfer.cached, transfer.headers)
+            response.timing = timing
+            return response
+
+        body = transfer.buffer.getvalue() if transfer.buffer is not None else b''
+        response = Response(url, status, body, transfer.headers, timing)
+
+        if self.cache is not None and transfer.buffer is not None and status == 200:
+            self.cache.store(response)
+
+        return response
+
+    def request(self, url: str) -> Response:
+        """Make a GET request and return the raw response.
+
+        Failed attempts are retried according to the retry policy of the
+        session. Concurrent requests of a URL share one transfer; callers
+        waiting for another's transfer are bounded by their own deadline,
+        and take it over if it ends on the other's deadline.
+
+        Args:
+          url(str): URL to make the request to.
+
+        Returns:
+          Response: Response of the request.
+
+        """
+
+        response = self.lookup(url)
+        if response is not None:
+            delay = self.hold(url)
+            if delay:
+                time.sleep(delay)
+            return response
+
+        while True:
+            flight, leader = self.lead(url)
+            if leader:
+                break
+
+            left = remaining()
+            if not flight.done.wait(None if left is None else max(0.0, left)):
+                raise DeadlineExceeded(f"Deadline exceeded while waiting for {url}")
+            if flight.taken_over():
+                continue
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+
+        try:
+            response = self._attempts(url)
+        except BaseException as e:
+            self.land(url, flight, error=e)
+            raise
+        self.land(url, flight, response=response)
+
+        return response
+
+    def lead(self, url: str) -> Tuple['_Flight', bool]:
+        """Join the transfer in flight for a URL, or lead a new one.
+
+        The leader of a transfer must :meth:`land` it once it has its final
+        response or error; the others wait for its ``done`` event.
+
+        Args:
+          url(str): URL of the transfer.
+
+        Returns:
+          Tuple[_Flight, bool]: The transfer and whether the caller leads it.
+
+        """
+
+        with self._lock:
+            flight = self._flights.get(url)
+            if flight is None:
+                flight = self._flights[url] = _Flight()
+                return flight, True
+            return flight, False
+
+    def land(self, url: str, flight: '_Flight', response: Response = None, error: BaseException = None) -> None:
+        """End a transfer led with :meth:`lead` and wake up its followers.
+
+        Landing without a response or error abandons the transfer; its
+        followers then take it over.
+
+        Args:
+          url(str): URL of the transfer.
+
+          flight(_Flight): Transfer returned by :meth:`lead`.
+
+          response(Response): Final response of the transfer.
+
+          error(BaseException): Error the transfer ended with.
+
+        """
+
+        flight.response, flight.error = response, error
+        with self._lock:
+            if self._flights.get(url) is flight:
+                del self._flights[url]
+        flight.done.set()
+
+    def _attempts(self, url: str) -> Response:
+        attempt = 0
+
+        while True:
+            check_deadline(url)
+            try:
+                response = self._perform_hedged(url) if self.hedge else self._perform(url)
+            except pycurl.error as e:
+                left = remaining()
+                if left is not None and left <= 0:
+                    raise DeadlineExceeded(f"Deadline exceeded while requesting {url}") from e
+                delay = self.retry.delay(attempt, error=e)
+                if delay is None:
+                    raise
+            else:
+                delay = self.retry.delay(attempt, response=response)
+                if delay is None:
+                    return response
+
+            time.sleep(delay)
+            attempt += 1
+
+    def _perform_hedged(self, url: str) -> Response:
+        threshold = self.latency.threshold(url)
+        if threshold is None:
+            return self._perform(url)
+
+        self._wait_admission(url)
+        multi = pycurl.CurlMulti()
+        transfers: Dict[pycurl.Curl, Transfer] = {}
+
+        def launch() -> None:
+            curl = self._acquire_admitted(url)
+            try:
+                transfers[curl] = self.prepare(curl, url)
+            except BaseException:
+                self.discard(url, curl, failed=False)
+                raise
+            multi.add_handle(curl)
+
+        try:
+            launch()
+            hedge_at = time.monotonic() + threshold
+            winner = None
+
+            while winner is None:
+                ret = pycurl.E_CALL_MULTI_PERFORM
+                while ret == pycurl.E_CALL_MULTI_PERFORM:
+                    ret, _ = multi.perform()
+
+                _, ok, failed = multi.info_read()
+                for curl, errno, errmsg in failed:
+                    multi.remove_handle(curl)
+                    del transfers[curl]
+                    self.discard(url, curl)
+                    if not transfers and not ok:
+                        raise pycurl.error(errno, errmsg)
+                if ok:
+                    winner = ok[0]
+                    break
+
+                if hedge_at is not None and time.monotonic() >= hedge_at:
+                    # Duplicate the slow request unless it would exceed the
+                    # rate limit
+                    hedge_at = None
+                    if self.admit(url) == 0:
+                        launch()
+                    continue
+
+                timeout = multi.timeout()
+                timeout = 1.0 if timeout < 0 else timeout / 1000
+                if hedge_at is not None:
+                    timeout = min(timeout, max(0.0, hedge_at - time.monotonic()))
+                multi.select(timeout)
+
+            multi.remove_handle(winner)
+            transfer = transfers.pop(winner)
+        finally:
+            for curl in transfers:
+                multi.remove_handle(curl)
+                self.discard(url, curl, failed=False)
+            multi.close()
+
+        response = self.finish(winner, url, transfer)
+        self.release(url, winner)
+
+        return response
+
+    def _perform(self, url: str) -> Response:
+        self._wait_admission(url)
+        curl = self._acquire_admitted(url)
+        try:
+            transfer = self.prepare(curl, url)
+            curl.perform()
+        except BaseException as e:
+            self.discard(url, curl, failed=isinstance(e, pycurl.error))
+            raise
+
+        response = self.finish(curl, url, transfer)
+
+        self.release(url, curl)
+
+        return response
+
+    def get(self, url: str, json_backend: str = None) -> any:
+        """Make a GET request and decode the JSON response.
+
+        Args:
+          url(str): URL to make the request to.
+
+          json_backend(str): JSON backend to use, see
+            :mod:`defillama.decoder`. Defaults to the current backend.
+
+        Returns:
+          any: Response from the API.
+
+        Raises:
+          HTTPError: The API answered with an error status.
+
+        """
+
+        response = self.request(url)
+        response.raise_for_status()
+
+        return response.json(json_backend)
+
+    def stream(self, url: str) -> Iterator[bytes]:
+        """Make a GET request and yield the response body as it arrives.
+
+        The transfer only progresses while the iterator is being consumed, so
+        a slow consumer holds back the download instead of buffering it.
+
+        Args:
+          url(str): URL to make the request to.
+
+        Returns:
+          Iterator[bytes]: Chunks of the response body.
+
+        Raises:
+          HTTPError: The API answered with an error status. The error body
+          is not yielded.
+
+        """
+
+        chunks = deque()
+        self._wait_admission(url)
+        curl = self._acquire_admitted(url)
+        multi = pycurl.CurlMulti()
+        failed_status = False
+
+        try:
+            transfer = self.prepare(curl, url, write=chunks.append)
+            multi.add_handle(curl)
+            running = True
+            while running:
+                ret = pycurl.E_CALL_MULTI_PERFORM
+                while ret == pycurl.E_CALL_MULTI_PERFORM:
+                    ret, running = multi.perform()
+
+                if chunks and not failed_status:
+                    failed_status = curl.getinfo(pycurl.RESPONSE_CODE) >= 400
+
+                while chunks and not failed_status:
+                    yield chunks.popleft()
+
+                if running:
+                    timeout = multi.timeout()
+                    multi.select(1.0 if timeout < 0 else timeout / 1000)
+
+            _, _, failed = multi.info_read()
+            multi.remove_handle(curl)
+            if failed:
+                _, errno, errmsg = failed[0]
+                raise pycurl.error(errno, errmsg)
+        except BaseException as e:
+            # Includes the GeneratorExit of a stream closed before its end
+            self.discard(url, curl, failed=isinstance(e, pycurl.error))
+            raise
+        finally:
+            multi.close()
+
+        response = self.finish(curl, url, transfer)
+        self.release(url, curl)
+
+        if response.status >= 400:
+            raise HTTPError(Response(url, response.status, b''.join(chunks), response.headers))
+
+    def close(self) -> None:
+        """Close every pooled handle and the shared state of the session."""
+
+        with self._lock:
+            self._closed = True
+            pools, self._pools = self._pools, {}
+
+        for pool in pools.values():
+            for curl in pool:
+                curl.close()
+
+        self._share.close()
+
+    def __enter__(self) -> 'Session':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+_default_session: Optional[Session] = None
+_default_lock = threading.Lock()
+
+
+def get_session() -> Session:
+    """Return the session used by every module function.
+
+    The session is created on first use.
+
+    Returns:
+      Session: Default session.
+
+    """
+
+    global _default_session
+
+    if _default_session is None:
+        with _default_lock:
+            if _default_session is None:
+                _default_session = Session()
+
+    return _default_session
+
+
+def set_session(session: Session) -> Optional[Session]:
+    """Replace the session used by every module function.
+
+    Args:
+      session(Session): Session to use from now on.
+
+    Returns:
+      Optional[Session]: Previously used session, if any. It is not closed.
+
+    """
+
+    global _default_session
+
+    with _default_lock:
+        previous, _default_session = _default_session, session
+
+    return previous
@@ -0,0 +1,509 @@
+"""Memory-mapped snapshots of the yields pool universe.
+
+``yields.get_pools()`` returns tens of thousands of pools, and a server
+looking pools up by id, chain or project would otherwise hold a decoded copy
+of them in every worker process. :func:`write` stores the pools once in a
+compact columnar file, and :class:`Snapshot` maps it read-only so that every
+process shares the same pages of the page cache and decodes only the rows it
+returns:
+
+    >>> from defillama import snapshot
+    >>> snapshot.build('/var/cache/defillama/pools.snap')      # periodically
+    >>> pools = snapshot.Snapshot('/var/cache/defillama/pools.snap')
+    >>> pools.get('747c1d2a-c668-4682-b9f9-296708a3dd90')
+    >>> pools.find('chain', 'Arbitrum')
+
+Numeric fields are stored as float64 columns and text fields as sorted
+dictionaries of their distinct values plus one code per row; nested fields
+are dictionary-encoded JSON. The indexed fields also get a hash table over
+their dictionary and the rows of each value grouped together, so an exact
+lookup is a CRC32, a probe and a slice. The file is replaced atomically, and
+:meth:`Snapshot.reload` picks up a new one.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from . import yields
+
+MAGIC = b'DLSNAP01'
+
+# Pool fields stored by default, with their kind: 'float', 'bool', 'text' or
+# 'json'.
+POOL_FIELDS: Dict[str, str] = {
+    'pool': 'text', 'chain': 'text', 'project': 'text', 'symbol': 'text',
+    'tvlUsd': 'float', 'apyBase': 'float', 'apyReward': 'float',
+    'apy': 'float', 'rewardTokens': 'json', 'apyPct1D': 'float',
+    'apyPct7D': 'float', 'apyPct30D': 'float', 'stablecoin': 'bool',
+    'ilRisk': 'text', 'exposure': 'text', 'predictions': 'json',
+    'poolMeta': 'text', 'underlyingTokens': 'json', 'il7d': 'float',
+    'apyBase7d': 'float', 'apyMean30d': 'float', 'volumeUsd1d': 'float',
+    'volumeUsd7d': 'float',
+}
+
+INDEXED: Tuple[str, ...] = ('pool', 'chain', 'project', 'symbol')
+
+# Header: magic, offset and length of the JSON directory
+_HEADER = struct.Struct('<8sQQ')
+
+# Code of a missing text value
+_NULL = 0xFFFFFFFF
+
+_U32 = next(code for code in 'IL' if array(code).itemsize == 4)
+
+
+def _hash(value: bytes) -> int:
+    return zlib.crc32(value)
+
+
+def _float(value: any) -> float:
+    if value is None or isinstance(value, bool):
+        return float('nan')
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+class _Writer:
+    """Appends 8-byte aligned sections to a file."""
+
+    def __init__(self, file):
+        self.file = file
+        self.offset = _HEADER.size
+        file.write(b'\0' * _HEADER.size)
+
+    def section(self, data: bytes) -> List[int]:
+        padding = -self.offset % 8
+        self.file.write(b'\0' * padding)
+        self.offset += padding
+        self.file.write(data)
+        offset, self.offset = self.offset, self.offset + len(data)
+
+        return [offset, len(data)]
+
+
+def _text_column(values: List[Optional[str]],
+                 indexed: bool,
+                 writer: _Writer) -> Dict[str, List[int]]:
+    distinct = sorted({value for value in values if value is not None})
+    codes = {value: code for code, value in enumerate(distinct)}
+    encoded = [value.encode() for value in distinct]
+
+    offsets = array(_U32, [0])
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+
+    sections = {
+        'codes': writer.section(array(_U32, [_NULL if value is None else codes[value]
+                                             for value in values]).tobytes()),
+        'offsets': writer.section(offsets.tobytes()),
+        'blob': writer.section(b''.join(encoded)),
+    }
+
+    if indexed:
+        # Rows grouped by value, in value order
+        rows = sorted((row for row, value in enumerate(values) if value is not None),
+                      key=lambda row: codes[values[row]])
+        starts = array(_U32, [0] * (len(distinct) + 1))
+        for value in values:
+            if value is not None:
+                starts[codes[value] + 1] += 1
+        for code in range(len(distinct)):
+            starts[code + 1] += starts[code]
+
+        # Open addressing table of dictionary codes + 1, at most half full
+        size = 1
+        while size < 2 * len(distinct):
+            size *= 2
+        table = array(_U32, [0] * size)
+        for code, value in enumerate(encoded):
+            slot = _hash(value) & (size - 1)
+            while table[slot]:
+                slot = (slot + 1) & (size - 1)
+            table[slot] = code + 1
+
+        sections['rows'] = writer.section(array(_U32, rows).tobytes())
+        sections['starts'] = writer.section(starts.tobytes())
+        sections['table'] = writer.section(table.tobytes())
+
+    return sections
+
+
+def write(pools: Iterable[Dict[str, any]],
+          path: str,
+          fields: Dict[str, str] = None,
+          indexed: Sequence[str] = INDEXED) -> int:
+    """Write pools to a snapshot file.
+
+    The file is written next to `path` and moved in place, so readers never
+    see a partial snapshot.
+
+    Args:
+      pools(Iterable[Dict[str, any]]): Pools as returned by
+        ``yields.get_pools``.
+
+      path(str): Path of the snapshot file.
+
+      fields(Dict[str, str]): Fields to store with their kind, 'float',
+        'bool', 'text' or 'json'. Defaults to :data:`POOL_FIELDS`.
+
+      indexed(Sequence[str]): Text fields to index. Defaults to
+        :data:`INDEXED`.
+
+    Returns:
+      int: Number of pools written.
+
+    """
+
+    fields = fields or POOL_FIELDS
+    for name in indexed:
+        if fields.get(name) != 'text':
+            raise ValueError(f"Only text fields can be indexed, not '{name}'")
+
+    columns: Dict[str, list] = {name: [] for name in fields}
+    count = 0
+    for pool in pools:
+        for name, values in columns.items():
+            values.append(pool.get(name))
+        count += 1
+
+    path = os.path.expanduser(path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+
+    try:
+        with open(temporary, 'wb') as file:
+            writer = _Writer(file)
+            entries = []
+            for name, kind in fields.items():
+                values = columns.pop(name)
+                if kind == 'float':
+                    sections = {'values': writer.section(array('d', map(_float, values)).tobytes())}
+                elif kind == 'bool':
+                    sections = {'values': writer.section(array('b', [
+                        -1 if value is None else int(bool(value)) for value in values]).tobytes())}
+                elif kind == 'json':
+                    sections = _text_column([None if value is None else json.dumps(value)
+                                             for value in values], False, writer)
+                else:
+                    sections = _text_column([None if value is None else str(value)
+                                             for value in values], name in indexed, writer)
+                entries.append({'name': name, 'kind': kind, 'sections': sections})
+
+            meta = json.dumps({'rows': count, 'byteorder': sys.byteorder,
+                               'columns': entries}).encode()
+            offset, length = writer.section(meta)
+            file.seek(0)
+            file.write(_HEADER.pack(MAGIC, offset, length))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+    return count
+
+
+def build(path: str, **kwargs) -> int:
+    """**Fetches the yield pools and writes them to a snapshot file.**
+
+    *Endpoint: GET /pools*
+
+    Args:
+      path(str): Path of the snapshot file.
+
+      **kwargs: Arguments of :func:`write`.
+
+    Returns:
+      int: Number of pools written.
+
+    """
+
+    return write(yields.get_pools(stream=True), path, **kwargs)
+
+
+class _Column:
+    """Read-only view of a column of a snapshot."""
+
+    def __init__(self, buffer: memoryview, kind: str, sections: Dict[str, List[int]]):
+        self.kind = kind
+
+        def view(name: str, format: str) -> Optional[memoryview]:
+            if name not in sections:
+                return None
+            offset, length = sections[name]
+            return buffer[offset:offset + length].cast(format)
+
+        if kind in ('float', 'bool'):
+            self.values = view('values', 'd' if kind == 'float' else 'b')
+        else:
+            self.codes = view('codes', _U32)
+            self.offsets = view('offsets', _U32)
+            offset, length = sections['blob']
+            self.blob = buffer[offset:offset + length]
+            self.rows = view('rows', _U32)
+            self.starts = view('starts', _U32)
+            self.table = view('table', _U32)
+
+    def text(self, code: int) -> str:
+        return str(self.blob[self.offsets[code]:self.offsets[code + 1]], 'utf-8')
+
+    def value(self, row: int) -> any:
+        if self.kind == 'float':
+            value = self.values[row]
+            return None if value != value else value
+        if self.kind == 'bool':
+            value = self.values[row]
+            return None if value < 0 else bool(value)
+
+        code = self.codes[row]
+        if code == _NULL:
+            return None
+
+        return json.loads(self.text(code)) if self.kind == 'json' else self.text(code)
+
+    def code(self, value: str) -> Optional[int]:
+        """Return the dictionary code of a value through the hash table."""
+
+        key = value.encode()
+        mask = len(self.table) - 1
+        slot = _hash(key) & mask
+        while True:
+            entry = self.table[slot]
+            if not entry:
+                return None
+            if self.blob[self.offsets[entry - 1]:self.offsets[entry]] == key:
+                return entry - 1
+            slot = (slot + 1) & mask
+
+
+class Snapshot:
+    """Read-only memory-mapped snapshot written by :func:`write`.
+
+    Args:
+      path(str): Path of the snapshot file.
+
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        self._file = None
+        self._map = None
+        self._open()
+
+    def _open(self) -> None:
+        file = open(self.path, 'rb')
+        try:
+            stat = os.fstat(file.fileno())
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            file.close()
+            raise
+
+        buffer = memoryview(mapped)
+        magic, offset, length = _HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            buffer.release()
+            mapped.close()
+            file.close()
+            raise ValueError(f"{self.path} is not a snapshot file")
+
+        meta = json.loads(bytes(buffer[offset:offset + length]))
+        if meta['byteorder'] != sys.byteorder:
+            buffer.release()
+            mapped.close()
+            file.close()
+            raise ValueError(f"{self.path} was written on a {meta['byteorder']}-endian machine")
+
+        self._close()
+        self._file, self._map, self._buffer = file, mapped, buffer
+        self._stat = (stat.st_ino, stat.st_mtime_ns)
+        self.rows = meta['rows']
+        self.columns: Dict[str, _Column] = {
+            entry['name']: _Column(buffer, entry['kind'], entry['sections'])
+            for entry in meta['columns']}
+
+    def reload(self) -> bool:
+        """Map the snapshot file again if it was replaced.
+
+        Returns:
+          bool: Whether a new snapshot was mapped.
+
+        """
+
+        stat = os.stat(self.path)
+        if (stat.st_ino, stat.st_mtime_ns) == self._stat:
+            return False
+
+        self._open()
+
+        return True
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def row(self, index: int) -> Dict[str, any]:
+        """Return a pool by row number.
+
+        Args:
+          index(int): Row number, from 0.
+
+        Returns:
+          Dict[str, any]: Stored fields of the pool.
+
+        """
+
+        if not 0 <= index < self.rows:
+            raise IndexError(f"Row {index} out of range")
+
+        return {name: column.value(index) for name, column in self.columns.items()}
+
+    def __iter__(self) -> Iterator[Dict[str, any]]:
+        return (self.row(index) for index in range(self.rows))
+
+    def _indexed(self, field: str) -> _Column:
+        column = self.columns.get(field)
+        if column is None or getattr(column, 'table', None) is None:
+            raise KeyError(f"'{field}' is not an indexed field")
+
+        return column
+
+    def lookup(self, field: str, value: str) -> memoryview:
+        """Return the row numbers of the pools with a value.
+
+        Args:
+          field(str): Indexed field, e.g. 'chain'.
+
+          value(str): Exact value, e.g. 'Arbitrum'.
+
+        Returns:
+          memoryview: Row numbers in ascending order, without copying them.
+
+        """
+
+        column = self._indexed(field)
+        code = column.code(value)
+        if code is None:
+            return column.rows[0:0]
+
+        return column.rows[column.starts[code]:column.starts[code + 1]]
+
+    def find(self, field: str, value: str) -> List[Dict[str, any]]:
+        """Return the pools with a value.
+
+        Args:
+          field(str): Indexed field, e.g. 'project'.
+
+          value(str): Exact value, e.g. 'aave-v3'.
+
+        Returns:
+          List[Dict[str, any]]: Matching pools.
+
+        """
+
+        return [self.row(index) for index in self.lookup(field, value)]
+
+    def get(self, pool: str) -> Optional[Dict[str, any]]:
+        """Return a pool by id.
+
+        Args:
+          pool(str): Pool id.
+
+        Returns:
+          Optional[Dict[str, any]]: Pool, or None if it is not in the snapshot.
+
+        """
+
+        rows = self.lookup('pool', pool)
+
+        return self.row(rows[0]) if len(rows) else None
+
+    def values(self, field: str, prefix: str = '') -> List[str]:
+        """Return the distinct values of an indexed field in sorted order.
+
+        Args:
+          field(str): Indexed field, e.g. 'symbol'.
+
+          prefix(str): Only return values starting with it. Defaults to ''.
+
+        Returns:
+          List[str]: Distinct values.
+
+        """
+
+        column = self._indexed(field)
+        size = len(column.starts) - 1
+
+        # First value not below the prefix
+        first, last = 0, size
+        while first < last:
+            middle = (first + last) // 2
+            if column.text(middle) < prefix:
+                first = middle + 1
+            else:
+                last = middle
+
+        values = []
+        for code in range(first, size):
+            value = column.text(code)
+            if not value.startswith(prefix):
+                break
+            values.append(value)
+
+        return values
+
+    def column(self, field: str) -> memoryview:
+        """Return a numeric column without copying it.
+
+        The view converts to NumPy with ``numpy.frombuffer``.
+
+        Args:
+          field(str): 'float' or 'bool' field, e.g. 'tvlUsd'.
+
+        Returns:
+          memoryview: float64 values (NaN if missing) or int8 values
+          (-1 if missing).
+
+        """
+
+        column = self.columns[field]
+        if column.kind not in ('float', 'bool'):
+            raise KeyError(f"'{field}' is not a numeric field")
+
+        return column.values
+
+    def _close(self) -> None:
+        if self._map is None:
+            return
+
+        self.columns = {}
+        try:
+            self._buffer.release()
+            self._map.close()
+        except BufferError:
+            # Views returned by lookup() or column() are still alive; the
+            # mapping goes away with them
+            pass
+        self._file.close()
+        self._map = self._file = None
+
+    def close(self) -> None:
+        """Unmap the snapshot file."""
+
+        self._close()
+
+    def __enter__(self) -> 'Snapshot':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -1,10 +1,13 @@
-from typing import List, Dict, Union
-from ._utils import get
+from typing import List, Dict, Iterator, Union
+from . import models
+from ._utils import get, get_records, stream as stream_items
 
 BASE_URL = "https://stablecoins.llama.fi"
 
 
-def get_stablecoins(include_prices: bool = True) -> List[Dict[str, any]]:
+def get_stablecoins(include_prices: bool = True,
+                    stream: bool = False,
+                    model: bool = False) -> Union[List[Dict[str, any]], Iterator[Dict[str, any]]]:
     """**Returns a list of all stablecoins alongwith their circulating amounts.**
 
     Function returns the following data:
@@ -32,13 +35,27 @@ def get_stablecoins(include_prices: bool = True) -> List[Dict[str, any]]:
       include_prices(bool): whether to include current stablecoin prices.
         Defaults to True.
 
+      stream(bool): Whether to return an iterator yielding the stablecoins
+        one at a time while the response is downloaded, keeping memory flat.
+        Defaults to False.
+
+      model(bool): Whether to return :class:`defillama.models.Stablecoin` records
+        instead of dicts. Defaults to False.
+
     Returns:
-      List[Dict[str, any]]: Requested data
+      List[Dict[str, any]] | Iterator[Dict[str, any]]: Requested data
 
     """
 
     url = f"{BASE_URL}/stablecoins?includePrices={str(include_prices).lower()}"
 
+    if stream:
+        items = stream_items(url, ('peggedAssets',))
+        return (models.from_dict(item, models.Stablecoin) for item in items) if model else items
+
+    if model:
+        return get_records(url, models.Stablecoin, ('peggedAssets',))
+
     return get(url)['peggedAssets']
 
 
@@ -0,0 +1,186 @@
+"""Permanent local store for historical data that can no longer change.
+
+A price at a past timestamp, the block nearest to a past timestamp or the
+bridge statistics of a past day are final once the searched window is over.
+When a store is configured, the functions returning such data look it up
+first and only request what is missing, then store what they fetched:
+
+    >>> from defillama import store
+    >>> store.set_store(store.ImmutableStore('~/.cache/defillama/history.db'))
+
+The store is a single SQLite database that can be shared by the threads
+and processes of a node.
+
+Functions consulting the store:
+
+* ``coins.get_historical_prices``, per token, keyed by (coin, timestamp,
+  search width)
+* ``coins.get_nearest_block``, keyed by (chain, timestamp)
+* ``bridges.get_stats``, keyed by (chain, day, bridge ID)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+# Seconds after which past data is considered settled on DeFiLlama's side.
+SETTLED_AFTER = 3600
+
+
+def settled(timestamp: float) -> bool:
+    """Return whether data up to a timestamp can no longer change.
+
+    Args:
+      timestamp(float): UNIX timestamp of the end of the queried window.
+
+    Returns:
+      bool: True if the window ended more than :data:`SETTLED_AFTER`
+      seconds ago.
+
+    """
+
+    return timestamp + SETTLED_AFTER < time.time()
+
+
+class ImmutableStore:
+    """SQLite-backed key-value store of immutable responses.
+
+    Args:
+      path(str): Path of the database file. Created if missing.
+
+    """
+
+    def __init__(self, path: str):
+        path = os.path.expanduser(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS records ('
+                         'kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, '
+                         'PRIMARY KEY (kind, key)) WITHOUT ROWID')
+
+    def get(self, kind: str, key: str) -> Optional[any]:
+        """Return a stored value.
+
+        Args:
+          kind(str): Kind of record, e.g. 'block'.
+
+          key(str): Key of the record.
+
+        Returns:
+          Optional[any]: Stored value, or None if it is not stored.
+
+        """
+
+        return self.get_many(kind, [key]).get(key)
+
+    def get_many(self, kind: str, keys: Iterable[str]) -> Dict[str, any]:
+        """Return the stored values of several keys.
+
+        Args:
+          kind(str): Kind of record.
+
+          keys(Iterable[str]): Keys of the records.
+
+        Returns:
+          Dict[str, any]: Stored values by key. Keys that are not stored are
+          left out.
+
+        """
+
+        keys = list(keys)
+        found = {}
+
+        with self._lock:
+            # Stay below SQLite's limit on the number of bound parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, value FROM records WHERE kind = ? AND key IN ({','.join('?' * len(chunk))})",
+                    [kind, *chunk])
+                found.update((key, json.loads(value)) for key, value in rows)
+
+        return found
+
+    def put(self, kind: str, key: str, value: any) -> None:
+        """Store a value.
+
+        Args:
+          kind(str): Kind of record.
+
+          key(str): Key of the record.
+
+          value(any): JSON-serialisable value.
+
+        """
+
+        self.put_many(kind, [(key, value)])
+
+    def put_many(self, kind: str, items: Iterable[Tuple[str, any]]) -> None:
+        """Store several values in one transaction.
+
+        Args:
+          kind(str): Kind of record.
+
+          items(Iterable[Tuple[str, any]]): Keys and JSON-serialisable values.
+
+        """
+
+        rows = [(kind, key, json.dumps(value)) for key, value in items]
+
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                self._db.executemany('INSERT OR REPLACE INTO records VALUES (?, ?, ?)', rows)
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+
+    def close(self) -> None:
+        """Close the database."""
+
+        with self._lock:
+            self._db.close()
+
+
+_store: Optional[ImmutableStore] = None
+
+
+def get_store() -> Optional[ImmutableStore]:
+    """Return the store consulted by the module functions.
+
+    Returns:
+      Optional[ImmutableStore]: Configured store, or None.
+
+    """
+
+    return _store
+
+
+def set_store(store: Optional[ImmutableStore]) -> Optional[ImmutableStore]:
+    """Set the store consulted by the module functions.
+
+    Args:
+      store(Optional[ImmutableStore]): Store to use, or None to disable it.
+
+    Returns:
+      Optional[ImmutableStore]: Previously configured store. It is not closed.
+
+    """
+
+    global _store
+
+    previous, _store = _store, store
+
+    return previous
@@ -0,0 +1,306 @@
+"""Incremental local copy of the protocol histories.
+
+``tvl.get_protocols(protocol)`` returns the whole history of a protocol,
+years of ``tvl``, ``tokens`` and ``tokensInUsd`` points per chain, so
+refreshing many protocols by fetching all of them again is wasteful. A
+:class:`ProtocolSync` keeps these series in a SQLite database and, on each
+run, reads the lightweight ``/protocols`` listing to find the protocols whose
+``tvl`` or ``change_1d`` moved since their last sync. Only those are fetched,
+concurrently, and only their new points are written:
+
+    >>> from defillama.sync import ProtocolSync
+    >>> with ProtocolSync('~/.cache/defillama/protocols.db') as sync:
+    ...     sync.sync()                      # every changed protocol
+    ...     sync.series('aave', 'chainTvls.Ethereum.tvl')
+
+Series are named after their location in the protocol payload: 'tvl',
+'tokens' and 'tokensInUsd' for the protocol totals and
+'chainTvls.{chain}.{series}' for each chain. The other fields of the
+payload are kept as the protocol metadata.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from . import batch, tvl
+
+_SERIES = ('tvl', 'tokens', 'tokensInUsd')
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS protocols ('
+    'slug TEXT PRIMARY KEY, fingerprint TEXT, synced_at REAL, meta TEXT)',
+    'CREATE TABLE IF NOT EXISTS points ('
+    'slug TEXT NOT NULL, series TEXT NOT NULL, date INTEGER NOT NULL, value TEXT NOT NULL, '
+    'PRIMARY KEY (slug, series, date)) WITHOUT ROWID',
+)
+
+
+def _fingerprint(protocol: Dict[str, any]) -> str:
+    return json.dumps([protocol.get('tvl'), protocol.get('change_1d')])
+
+
+def _split(payload: Dict[str, any]) -> Tuple[Dict[str, any], Dict[str, List[Dict]]]:
+    """Separate the series of a protocol payload from its metadata."""
+
+    meta = dict(payload)
+    series = {}
+
+    for name in _SERIES:
+        if isinstance(meta.get(name), list):
+            series[name] = meta.pop(name)
+
+    chains = meta.pop('chainTvls', None) or {}
+    for chain, data in chains.items():
+        for name in _SERIES:
+            if isinstance(data.get(name), list):
+                series[f'chainTvls.{chain}.{name}'] = data[name]
+
+    return meta, series
+
+
+class ProtocolSync:
+    """SQLite store of protocol histories updated incrementally.
+
+    Args:
+      path(str): Path of the database file. Created if missing.
+
+      max_age(float): Seconds after which a protocol is synced even if the
+        listing shows no change. Defaults to one day.
+
+    """
+
+    def __init__(self, path: str, max_age: float = 86400):
+        path = os.path.expanduser(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_age = max_age
+        # Listing fingerprints of the changed protocols, stored once the
+        # protocol itself is
+        self._fingerprints: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+
+    def changed(self, listing: Iterable[Dict[str, any]] = None) -> List[str]:
+        """Return the protocols whose history has to be fetched.
+
+        A protocol has changed if it was never synced, its ``tvl`` or
+        ``change_1d`` differ from the last sync, or its last sync is older
+        than `max_age`.
+
+        Args:
+          listing(Iterable[Dict[str, any]]): Protocols as listed by
+            ``tvl.get_protocols()``. Defaults to fetching the listing.
+
+        Returns:
+          List[str]: Slugs of the changed protocols.
+
+        """
+
+        if listing is None:
+            listing = tvl.get_protocols(stream=True)
+
+        with self._lock:
+            known = {slug: (fingerprint, synced_at) for slug, fingerprint, synced_at
+                     in self._db.execute('SELECT slug, fingerprint, synced_at FROM protocols')}
+
+        stale = time.time() - self.max_age
+        changed = []
+
+        for protocol in listing:
+            slug = protocol.get('slug')
+            if not slug:
+                continue
+            fingerprint, synced_at = known.get(slug, (None, 0))
+            if fingerprint != _fingerprint(protocol) or synced_at < stale:
+                changed.append(slug)
+                self._fingerprints[slug] = _fingerprint(protocol)
+
+        return changed
+
+    def sync(self,
+             protocols: Iterable[str] = None,
+             concurrency: int = 8) -> Dict[str, Union[int, Exception]]:
+        """Fetch the changed protocols and append their new points.
+
+        Args:
+          protocols(Iterable[str]): Slugs of the protocols to sync.
+            Defaults to :meth:`changed`.
+
+          concurrency(int): Maximum number of protocols fetched at once.
+            Defaults to 8.
+
+        Returns:
+          Dict[str, Union[int, Exception]]: Number of new points of each
+          synced protocol, or the exception raised while fetching or storing
+          it. Failed protocols are synced again on the next run.
+
+        """
+
+        slugs = list(self.changed() if protocols is None else protocols)
+        specs = [(tvl.get_protocols, (slug,)) for slug in slugs]
+        results = {}
+
+        for index, payload in batch.as_completed(specs, concurrency, return_exceptions=True):
+            slug = slugs[index]
+            if isinstance(payload, Exception):
+                results[slug] = payload
+                continue
+            try:
+                results[slug] = self.update(slug, payload)
+            except Exception as e:
+                results[slug] = e
+
+        return results
+
+    def update(self, slug: str, payload: Dict[str, any]) -> int:
+        """Merge a protocol payload into the store.
+
+        Points newer than the last stored point of each series are appended.
+        The points of the day of the last stored point are replaced, since
+        DeFiLlama keeps moving the latest point of a series until its day
+        ends. A series listing a date more than once keeps its last point
+        of that date.
+
+        Args:
+          slug(str): Slug of the protocol.
+
+          payload(Dict[str, any]): Protocol as returned by
+            ``tvl.get_protocols(slug)``.
+
+        Returns:
+          int: Number of new points.
+
+        """
+
+        meta, series = _split(payload)
+        # Protocols updated without going through the listing keep their
+        # previous fingerprint
+        fingerprint = self._fingerprints.pop(slug, None)
+        added = 0
+
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                last = dict(self._db.execute(
+                    'SELECT series, MAX(date) FROM points WHERE slug = ? GROUP BY series', (slug,)))
+
+                for name, points in series.items():
+                    since = last.get(name)
+                    cutoff = 0 if since is None else since - since % 86400
+                    rows = {}
+                    for point in points:
+                        date = point.get('date')
+                        if date is None or int(date) < cutoff:
+                            continue
+                        value = {key: item for key, item in point.items() if key != 'date'}
+                        rows[int(date)] = (slug, name, int(date), json.dumps(value))
+                    added += sum(1 for date in rows if since is None or date > since)
+                    self._db.execute('DELETE FROM points WHERE slug = ? AND series = ? AND date >= ?',
+                                     (slug, name, cutoff))
+                    self._db.executemany('INSERT INTO points VALUES (?, ?, ?, ?)', rows.values())
+
+                self._db.execute('INSERT INTO protocols VALUES (?, ?, ?, ?) ON CONFLICT (slug) DO UPDATE '
+                                 'SET fingerprint = COALESCE(excluded.fingerprint, fingerprint), '
+                                 'synced_at = excluded.synced_at, meta = excluded.meta',
+                                 (slug, fingerprint, time.time(), json.dumps(meta)))
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+
+        return added
+
+    def protocols(self) -> List[str]:
+        """Return the slugs of the stored protocols.
+
+        Returns:
+          List[str]: Stored protocols.
+
+        """
+
+        with self._lock:
+            return [slug for slug, in self._db.execute('SELECT slug FROM protocols ORDER BY slug')]
+
+    def metadata(self, slug: str) -> Optional[Dict[str, any]]:
+        """Return the fields of a protocol other than its series.
+
+        Args:
+          slug(str): Slug of the protocol.
+
+        Returns:
+          Optional[Dict[str, any]]: Metadata from the last sync, or None if
+          the protocol is not stored.
+
+        """
+
+        with self._lock:
+            row = self._db.execute('SELECT meta FROM protocols WHERE slug = ?', (slug,)).fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    def series_names(self, slug: str) -> List[str]:
+        """Return the names of the stored series of a protocol.
+
+        Args:
+          slug(str): Slug of the protocol.
+
+        Returns:
+          List[str]: Series names, e.g. 'chainTvls.Ethereum.tvl'.
+
+        """
+
+        with self._lock:
+            return [name for name, in self._db.execute(
+                'SELECT DISTINCT series FROM points WHERE slug = ? ORDER BY series', (slug,))]
+
+    def series(self, slug: str, name: str = 'tvl', since: int = None) -> List[Dict[str, any]]:
+        """Return a stored series of a protocol.
+
+        Args:
+          slug(str): Slug of the protocol.
+
+          name(str): Name of the series. Defaults to 'tvl'.
+
+          since(int): UNIX timestamp of the earliest point returned.
+            Defaults to None (the whole series).
+
+        Returns:
+          List[Dict[str, any]]: Points in the format of the API, in date order.
+
+        """
+
+        return list(self._points(slug, name, since or 0))
+
+    def _points(self, slug: str, name: str, since: int) -> Iterator[Dict[str, any]]:
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT date, value FROM points WHERE slug = ? AND series = ? AND date >= ? '
+                'ORDER BY date', (slug, name, since)).fetchall()
+
+        for date, value in rows:
+            point = {'date': date}
+            point.update(json.loads(value))
+            yield point
+
+    def close(self) -> None:
+        """Close the database."""
+
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self) -> 'ProtocolSync':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -1,10 +1,12 @@
-from typing import List, Dict, Union
-from ._utils import get
+from typing import List, Dict, Iterator, Union
+from . import models
+from .frame import Frame
+from ._utils import get, get_records, stream as stream_items
 
 BASE_URL = "https://api.llama.fi"
 
 
-def get_chains() -> List[Dict]:
+def get_chains(model: bool = False) -> List[Dict]:
     """**Returns basic information about all chains.**
 
     Function returns the following data for each chain:
@@ -18,6 +20,10 @@ def get_chains() -> List[Dict]:
 
     *Endpoint: GET /chains*
 
+    Args:
+      model(bool): Whether to return :class:`defillama.models.Chain` records
+        instead of dicts. Defaults to False.
+
     Returns:
       List[Dict]: Requested data
 
@@ -25,10 +31,15 @@ def get_chains() -> List[Dict]:
 
     url = f"{BASE_URL}/chains"
 
+    if model:
+        return get_records(url, models.Chain)
+
     return get(url)
 
 
-def get_protocols(protocol: str = None) -> Union[List[Dict], Dict]:
+def get_protocols(protocol: str = None,
+                  stream: bool = False,
+                  model: bool = False) -> Union[List[Dict], Iterator[Dict], Dict]:
     """**Returns basic protocol data with their total TVL and TVL in
     each chain.**
 
@@ -89,20 +100,34 @@ def get_protocols(protocol: str = None) -> Union[List[Dict], Dict]:
     Args:
       protocol(str): Protocol slug. Defaults to None.
 
+      stream(bool): Whether to return an iterator yielding the protocols one
+        at a time while the response is downloaded, keeping memory flat.
+        Ignored when a protocol is specified. Defaults to False.
+
+      model(bool): Whether to return :class:`defillama.models.Protocol` records
+        instead of dicts. Ignored when a protocol is specified.
+        Defaults to False.
+
     Returns:
-      List[Dict] | Dict: Requested data
+      List[Dict] | Iterator[Dict] | Dict: Requested data
 
     """
 
     if protocol is None:
         url = f"{BASE_URL}/protocols"
+        if stream:
+            items = stream_items(url)
+            return (models.from_dict(item, models.Protocol) for item in items) if model else items
+        if model:
+            return get_records(url, models.Protocol)
     else:
         url = f"{BASE_URL}/protocol/{protocol}"
 
     return get(url)
 
 
-def get_historical_chains_tvl(chain: str = None) -> List[Dict]:
+def get_historical_chains_tvl(chain: str = None,
+                              as_arrays: bool = False) -> Union[List[Dict], Frame]:
     """**Returns historical TVL (excludes liquid staking and double counted TVL)
     for all or a specified chain.**
 
@@ -119,8 +144,11 @@ def get_historical_chains_tvl(chain: str = None) -> List[Dict]:
     Args:
       chain(str): Chain slug. Defaults to None.
 
+      as_arrays(bool): Whether to return a :class:`defillama.frame.Frame`
+        of NumPy arrays instead of a list of dicts. Defaults to False.
+
     Returns:
-      List[Dict]: Requested data
+      List[Dict] | Frame: Requested data
 
     """
 
@@ -129,10 +157,14 @@ def get_historical_chains_tvl(chain: str = None) -> List[Dict]:
     else:
         url = f"{BASE_URL}/v2/historicalChainTvl/{chain}"
 
+    if as_arrays:
+        return Frame.from_records(get(url), 'date')
+
     return get(url)
 
 
-def get_charts(chain: str = None) -> List[Dict]:
+def get_charts(chain: str = None,
+               as_arrays: bool = False) -> Union[List[Dict], Frame]:
     """**Returns historical TVL of all or a specified chain.**
 
     Passing a chain is optional as historical TVL for all chains is returned
@@ -148,8 +180,11 @@ def get_charts(chain: str = None) -> List[Dict]:
     Args:
       chain(str): Chain slug. Defaults to None.
 
+      as_arrays(bool): Whether to return a :class:`defillama.frame.Frame`
+        of NumPy arrays instead of a list of dicts. Defaults to False.
+
     Returns:
-      List[Dict]: Requested data
+      List[Dict] | Frame: Requested data
 
     """
 
@@ -158,6 +193,9 @@ def get_charts(chain: str = None) -> List[Dict]:
     else:
         url = f"{BASE_URL}/charts/{chain}"
 
+    if as_arrays:
+        return Frame.from_records(get(url), 'date')
+
     return get(url)
 
 
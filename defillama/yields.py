@@ -1,10 +1,13 @@
-from typing import List, Dict
-from ._utils import get
+from typing import List, Dict, Iterator, Union
+from . import models
+from .frame import Frame
+from ._utils import get, get_records, stream as stream_items
 
 BASE_URL = "https://yields.llama.fi"
 
 
-def get_pools() -> List[Dict[str, any]]:
+def get_pools(stream: bool = False,
+              model: bool = False) -> Union[List[Dict[str, any]], Iterator[Dict[str, any]]]:
     """**Returns the latest data for all pools.**
 
     Function returns the following data:
@@ -42,17 +45,33 @@ def get_pools() -> List[Dict[str, any]]:
 
     *Endpoint: GET /pools*
 
+    Args:
+      stream(bool): Whether to return an iterator yielding the pools one at
+        a time while the response is downloaded, keeping memory flat.
+        Defaults to False.
+
+      model(bool): Whether to return :class:`defillama.models.Pool` records
+        instead of dicts. Defaults to False.
+
     Returns:
-      List[Dict[str, any]]: Requested data
+      List[Dict[str, any]] | Iterator[Dict[str, any]]: Requested data
 
     """
 
     url = f"{BASE_URL}/pools"
 
+    if stream:
+        items = stream_items(url, ('data',))
+        return (models.from_dict(item, models.Pool) for item in items) if model else items
+
+    if model:
+        return get_records(url, models.Pool, ('data',))
+
     return get(url)['data']
 
 
-def get_pool_chart(pool: str) -> List[Dict[str, any]]:
+def get_pool_chart(pool: str,
+                   as_arrays: bool = False) -> Union[List[Dict[str, any]], Frame]:
     """**Returns the historical APY and TVL data for a pool.**
 
     Function returns the following data:
@@ -71,11 +90,18 @@ def get_pool_chart(pool: str) -> List[Dict[str, any]]:
     Args:
       pool(str): Pool ID.
 
+      as_arrays(bool): Whether to return a :class:`defillama.frame.Frame`
+        of NumPy arrays instead of a list of dicts. Defaults to False.
+
     Returns:
-      List[Dict[str, any]]: Requested data
+      List[Dict[str, any]] | Frame: Requested data
 
     """
 
     url = f"{BASE_URL}/chart/{pool}"
 
+    if as_arrays:
+        return Frame.from_records(get(url)['data'], 'timestamp',
+                                  ('tvlUsd', 'apy', 'apyBase', 'apyReward', 'il7d', 'apyBase7d'))
+
     return get(url)['data']
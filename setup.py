@@ -9,6 +9,16 @@ requires = [
     'pycurl>=7.44.1',
 ]
 
+extras = {
+    'orjson': ['orjson'],
+    'msgspec': ['msgspec'],
+    'simdjson': ['pysimdjson'],
+    'numpy': ['numpy'],
+    'arrow': ['pyarrow'],
+    'prometheus': ['prometheus_client'],
+    'otel': ['opentelemetry-api'],
+}
+
 about = {}
 
 with open(os.path.join(here, 'defillama', '__version__.py'),
@@ -33,6 +43,7 @@ setuptools.setup(
     python_requires='>3.6',
     packages=packages,
     install_requires=requires,
+    extras_require=extras,
     license=about['__license__'],
     classifiers=[
         "Programming Language :: Python :: 3.6",
@@ -0,0 +1,32 @@
+import pytest
+
+from benchmarks.server import MockServer, patched
+from defillama.session import Session, set_session
+
+
+@pytest.fixture(scope='session')
+def server():
+    """Local stand-in of the API, see :mod:`benchmarks.server`."""
+
+    with MockServer() as server:
+        yield server
+
+
+@pytest.fixture
+def api(server):
+    """Point the endpoint modules at the stand-in for the test."""
+
+    server.latency = server.jitter = 0.0
+    with patched(server.url):
+        yield server
+
+
+@pytest.fixture
+def session():
+    """Fresh shared session for the test, restored afterwards."""
+
+    session = Session()
+    previous = set_session(session)
+    yield session
+    set_session(previous)
+    session.close()
@@ -0,0 +1,43 @@
+import asyncio
+
+from defillama import aio, coins, tvl
+from defillama.metrics import Recorder
+
+
+def test_mirrors_return_the_module_results(api, session):
+    async def main():
+        return await asyncio.gather(aio.tvl.get_chains(),
+                                    aio.coins.get_nearest_block('ethereum', 1680000000))
+
+    chains, block = asyncio.run(main())
+
+    assert chains == tvl.get_chains()
+    assert block == coins.get_nearest_block('ethereum', 1680000000)
+
+
+def test_identical_requests_share_a_transfer(api, session):
+    recorder = Recorder()
+    session.observers.append(recorder)
+    api.latency = 0.1
+
+    async def main():
+        return await asyncio.gather(*(aio.tvl.get_chains() for _ in range(5)))
+
+    results = asyncio.run(main())
+
+    assert all(result == results[0] for result in results)
+    assert len(recorder.timings) == 1
+
+
+def test_clients_of_closed_loops_are_closed(api, session):
+    async def main():
+        await aio.tvl.get_chains()
+        return aio.get_client()
+
+    first = asyncio.run(main())
+    second = asyncio.run(main())
+
+    assert first is not second
+    assert first._closed and not second._closed
+    assert first not in aio._clients.values()
+    second.close()
@@ -0,0 +1,81 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+from defillama import analytics  # noqa: E402
+
+nan = np.nan
+DAY = 86400
+# Monday 2024-01-01
+MONDAY = 1704067200
+
+
+def _equal(actual, expected):
+    np.testing.assert_allclose(actual, expected, equal_nan=True)
+
+
+def test_chart_and_stack():
+    first = analytics.chart([[0, 1], [DAY, None]], 'volume')
+    second = (np.array([DAY, 2 * DAY]), np.array([5.0, 6.0]))
+
+    assert list(first) == ['date', 'volume']
+    times, values = analytics.stack([first, second])
+
+    assert times.tolist() == [0, DAY, 2 * DAY]
+    _equal(values, [[1, nan, nan], [nan, 5, 6]])
+
+    times, values = analytics.stack([])
+    assert times.shape == (0,) and values.shape == (0, 0)
+
+
+def test_rolling_windows():
+    values = np.array([1, 2, nan, 4, 5], dtype=float)
+
+    _equal(analytics.rolling_sum(values, 2), [nan, 3, nan, nan, 9])
+    _equal(analytics.rolling_sum(values, 2, min_periods=1), [1, 3, 2, 4, 9])
+    _equal(analytics.rolling_mean(values, 3, min_periods=2), [nan, 1.5, 1.5, 3, 4.5])
+    # Each row of a 2-D array is a series
+    _equal(analytics.rolling_sum(np.array([[1, 1, 1], [2, 2, 2]]), 2), [[nan, 2, 2], [nan, 4, 4]])
+
+
+def test_changes():
+    values = np.array([[1, 2, 0, 4], [10, 5, nan, 5]], dtype=float)
+
+    _equal(analytics.pct_change(values), [[nan, 1, -1, nan], [nan, -0.5, nan, nan]])
+    _equal(analytics.pct_change(values, 2), [[nan, nan, -1, 1], [nan, nan, nan, 0]])
+    _equal(analytics.cumulative(values), [[1, 3, 3, 7], [10, 15, 15, 20]])
+    _equal(analytics.drawdown(values), [[0, 0, -1, 0], [0, -0.5, nan, -0.5]])
+
+
+def test_share():
+    _equal(analytics.share(np.array([[1, 0, nan], [3, 0, 2]])), [[0.25, nan, nan], [0.75, nan, 1]])
+
+
+def test_resample():
+    times = MONDAY + DAY * np.arange(10)
+    values = np.arange(10, dtype=float)
+    values[8] = nan
+
+    starts, sums = analytics.resample(times, values, 'week')
+    assert starts.tolist() == [MONDAY, MONDAY + 7 * DAY]
+    _equal(sums, [21, 16])
+
+    _, last = analytics.resample(times, values, 'week', how='last')
+    _equal(last, [6, 9])
+    _, means = analytics.resample(times, np.vstack([values, values * 2]), 'week', how='mean')
+    _equal(means, [[3, 8], [6, 16]])
+
+    starts, _ = analytics.resample(times, values, 'month')
+    assert starts.tolist() == [MONDAY]
+    with pytest.raises(ValueError):
+        analytics.resample(times, values, 'fortnight')
+    with pytest.raises(ValueError):
+        analytics.resample(times, values, how='median')
+
+
+def test_frames_split_rows():
+    times = np.array([0, DAY])
+    frames = analytics.frames(times, np.array([[1.0, 2.0], [3.0, 4.0]]), 'tvl')
+
+    assert len(frames) == 2
+    assert frames[1].time.tolist() == [0, DAY]
+    assert frames[1]['tvl'].tolist() == [3.0, 4.0]
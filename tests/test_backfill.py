@@ -0,0 +1,54 @@
+from defillama import backfill, coins
+from defillama._utils import get
+from defillama.backfill import Point
+from defillama.metrics import Recorder
+
+TOKENS = [{'coingecko': 'ethereum'}, {'coingecko': 'bitcoin'}]
+
+
+def _window(start, hops):
+    # Needs `hops` round trips before its points are known
+    for hop in range(hops):
+        get(f"{coins.BASE_URL}/prices/current/coingecko:w{start}h{hop}")
+    return {'coingecko:x': {'prices': [{'timestamp': start, 'price': 1.0},
+                                       {'timestamp': start + 5, 'price': 1.0}]}}
+
+
+def test_plan_splits_time_and_tokens():
+    tokens = [f"coingecko:token{index}" for index in range(5)]
+    windows = backfill.plan_charts(tokens, 0, 3600 * 24, '1h', max_span=10, max_tokens=2)
+
+    assert [window.span for window in windows[::3]] == [10, 10, 5]
+    assert {window.coins for window in windows[:3]} == {tuple(tokens[:2]), tuple(tokens[2:4]), tuple(tokens[4:])}
+    assert windows[3].start == 36000
+
+
+def test_charts_stream_in_order(api, session):
+    points = list(backfill.charts(TOKENS, 0, 3600 * 47, '1h', max_span=10))
+
+    assert points == sorted(points)
+    for token in ('coingecko:ethereum', 'coingecko:bitcoin'):
+        timestamps = [point.timestamp for point in points if point.coin == token]
+        assert timestamps and len(timestamps) == len(set(timestamps))
+
+
+def test_historical_stream_in_order(api, session):
+    points = list(backfill.historical({'coingecko:ethereum': [0, 7200, 3600]}))
+
+    assert points == sorted(points)
+
+
+def test_slots_in_flight_are_capped(api, session):
+    recorder = Recorder()
+    session.observers.append(recorder)
+    # The first slot takes three round trips, the others one
+    slots = [(start + 10, [(_window, (start, 3 if start == 0 else 1))]) for start in range(0, 100, 10)]
+
+    points = backfill._stitch(slots, backfill._points, concurrency=2)
+
+    assert next(points) == Point(0, 'coingecko:x', 1.0)
+    # Only the next slot was requested while the first one was pending
+    assert len(recorder.timings) <= 4
+    assert [point.timestamp for point in points] == [5] + [start + offset for start in range(10, 100, 10)
+                                                           for offset in (0, 5)]
+    assert len(recorder.timings) == 12
@@ -0,0 +1,68 @@
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+
+from defillama import batch, coins, tvl
+from defillama.session import HTTPError
+
+
+def test_run_keeps_spec_order(api, session):
+    results = batch.run([(tvl.get_protocols,),
+                         f"{tvl.BASE_URL}/chains",
+                         (coins.get_nearest_block, ('ethereum', 1680000000)),
+                         (tvl.get_charts, (), {'chain': 'Ethereum'})])
+
+    assert results[0] == tvl.get_protocols()
+    assert results[1] == tvl.get_chains()
+    assert results[2] == coins.get_nearest_block('ethereum', 1680000000)
+    assert results[3] == tvl.get_charts(chain='Ethereum')
+
+
+def test_as_completed_yields_every_index(api, session):
+    specs = [(tvl.get_protocol_tvl, (f'protocol-{number}',)) for number in range(20)]
+
+    results = dict(batch.as_completed(specs, concurrency=4))
+
+    assert sorted(results) == list(range(20))
+    assert results[3] == tvl.get_protocol_tvl('protocol-3')
+
+
+def test_failures(api, session):
+    specs = [f"{tvl.BASE_URL}/chains", f"{tvl.BASE_URL}/unknown"]
+
+    results = batch.run(specs, return_exceptions=True)
+    assert isinstance(results[0], list)
+    assert isinstance(results[1], HTTPError)
+
+    with pytest.raises(HTTPError):
+        batch.run(specs)
+
+
+def _names(protocols):
+    return [protocol['name'] for protocol in protocols]
+
+
+def test_process_pool_decodes_like_the_caller(api, session):
+    specs = [f"{tvl.BASE_URL}/chains", (tvl.get_protocols,), f"{tvl.BASE_URL}/unknown"]
+
+    results = batch.run(specs, processes=2, return_exceptions=True)
+
+    assert results[:2] == batch.run(specs[:2])
+    assert isinstance(results[2], HTTPError)
+
+
+def test_transform_applies_to_url_specs(api, session):
+    url = f"{tvl.BASE_URL}/protocols"
+    executor = ProcessPoolExecutor(2)
+    try:
+        for processes in (0, executor):
+            # The function spec needs the whole body of the transformed URL
+            names, protocols = batch.run([url, (tvl.get_protocols,)], processes=processes,
+                                         transform=_names)
+
+            assert names == _names(protocols)
+            assert protocols == tvl.get_protocols()
+
+        # A given executor is left running for the caller
+        assert executor.submit(len, 'abc').result() == 3
+    finally:
+        executor.shutdown()
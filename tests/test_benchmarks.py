@@ -0,0 +1,52 @@
+import gzip
+import json
+import pytest
+
+from benchmarks import fixtures, run
+
+
+def _results(**metrics):
+    return {'cases': [dict({'workload': 'small', 'mode': 'batch'}, **metrics)]}
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = _results(requests_per_second=1000, latency_p99=0.050, peak_rss_mb=100)
+
+    assert run.compare(_results(requests_per_second=900, latency_p99=0.055, peak_rss_mb=110), baseline) == []
+    regressions = run.compare(_results(requests_per_second=700, latency_p99=0.080, peak_rss_mb=102), baseline)
+    assert [line.split(':')[1].split()[1] for line in regressions] == ['requests_per_second', 'latency_p99']
+    # Cases missing from the baseline are not compared
+    assert run.compare({'cases': [{'workload': 'large', 'mode': 'async', 'latency_p99': 9}]}, baseline) == []
+
+
+def test_compare_ignores_noise():
+    baseline = _results(latency_p99=0.0004, decode_seconds=0.002)
+
+    assert run.compare(_results(latency_p99=0.0012, decode_seconds=0.008), baseline) == []
+
+
+def test_payloads_are_deterministic_and_scaled():
+    first = fixtures.payload('api.llama.fi', '/protocols', {}, scale=0.01)
+    larger = fixtures.payload('api.llama.fi', '/protocols', {}, scale=0.02)
+
+    assert first == fixtures.payload('api.llama.fi', '/protocols', {}, scale=0.01)
+    assert len(json.loads(larger)) > len(json.loads(first))
+    assert fixtures.payload('api.llama.fi', '/unknown', {}) is None
+
+
+def test_recorded_payloads_take_precedence(tmp_path):
+    with gzip.open(tmp_path / 'api_llama_fi_protocols.json.gz', 'wb') as file:
+        file.write(b'[]')
+
+    assert fixtures.payload('api.llama.fi', '/protocols', {}, directory=str(tmp_path)) == b'[]'
+
+
+@pytest.mark.parametrize('mode', run.MODES)
+def test_endpoints_workload_runs_without_errors(server, session, mode):
+    # run_case points the modules at the server itself
+    server.latency = server.jitter = 0.0
+    case = run.run_case('endpoints', mode, server.url, 10, 8)
+
+    assert case['errors'] == 0
+    assert case['calls'] > 0 and case['transfers'] > 0
+    assert case['decoded_bytes'] >= case['wire_bytes'] > 0
@@ -0,0 +1,142 @@
+import inspect
+import pytest
+from urllib.parse import parse_qs, urlsplit
+
+from defillama import aio, bridges
+
+START = 1700000000
+DAY = 86400
+
+
+def _window(url):
+    query = parse_qs(urlsplit(url).query)
+
+    return (int(query['starttimestamp'][0]), int(query['endtimestamp'][0]),
+            int(query['limit'][0]))
+
+
+def test_iter_transactions_in_order(api, session):
+    transactions = list(bridges.iter_transactions(1, 'ethereum', 'ethereum:0xabc',
+                                                  START, START + 3 * DAY, limit=20,
+                                                  window=DAY, concurrency=4))
+    timestamps = [int(transaction['ts']) for transaction in transactions]
+
+    assert len(timestamps) > 3 * DAY // 600 * 0.9
+    assert timestamps == sorted(set(timestamps))
+    assert START <= timestamps[0] and timestamps[-1] <= START + 3 * DAY
+
+
+class _LaggingDriver:
+    """Serves the most recent request first, so the oldest window arrives
+    only when no other request is left."""
+
+    def __init__(self, session, concurrency):
+        self.pending = []
+        self.requested = []
+
+    def add(self, url, again=False):
+        self.pending.append(url)
+        self.requested.append(url)
+
+    def results(self):
+        while self.pending:
+            url = self.pending.pop()
+            if url == self.requested[0]:
+                self.before_oldest = len(self.requested)
+            first, last, limit = _window(url)
+            yield url, [{'ts': timestamp} for timestamp in range(first, last + 1, 600)][::-1][:limit]
+
+    def close(self):
+        pass
+
+
+def test_iter_transactions_bounds_buffered_windows(monkeypatch):
+    drivers = []
+
+    def driver(session, concurrency):
+        drivers.append(_LaggingDriver(session, concurrency))
+        return drivers[-1]
+
+    monkeypatch.setattr(bridges, '_MultiDriver', driver)
+    transactions = bridges.iter_transactions(1, 'ethereum', 'ethereum:0xabc',
+                                             START, START + 30 * DAY, limit=1000,
+                                             window=DAY, concurrency=4)
+
+    first = next(transactions)
+    assert first['ts'] == START
+    # The oldest window arrived last, and no window past the four oldest
+    # was requested meanwhile
+    assert drivers[0].before_oldest == 4
+
+    timestamps = [first['ts']] + [transaction['ts'] for transaction in transactions]
+    assert timestamps == list(range(START, START + 30 * DAY + 1, 600))
+
+
+class _Driver:
+    """Serves every window with the result of `serve`, in request order."""
+
+    def __init__(self, serve):
+        self.serve = serve
+        self.pending = []
+        self.requested = []
+
+    def __call__(self, session, concurrency):
+        return self
+
+    def add(self, url, again=False):
+        self.pending.append(url)
+        self.requested.append(url)
+
+    def results(self):
+        while self.pending:
+            url = self.pending.pop(0)
+            yield url, self.serve(*_window(url))
+
+    def close(self):
+        pass
+
+
+def test_iter_transactions_widens_sparse_windows(monkeypatch):
+    driver = _Driver(lambda first, last, limit: [{'ts': first, 'tx_hash': hex(first)}])
+    monkeypatch.setattr(bridges, '_MultiDriver', driver)
+
+    transactions = list(bridges.iter_transactions(1, 'ethereum', 'ethereum:0xabc',
+                                                  START, START + DAY - 1, limit=100,
+                                                  window=600, concurrency=1))
+
+    # Windows double after each sparse one: 600 s, 1200 s, ... up to a day
+    assert len(driver.requested) == len(transactions) == 8
+
+
+def test_iter_transactions_drops_duplicates(monkeypatch):
+    def serve(first, last, limit):
+        transfer = {'ts': str(first + 60), 'tx_hash': '0x1', 'token': 'USDC', 'amount': '5'}
+        return [transfer, dict(transfer), dict(transfer, token='USDT'), {'ts': None, 'tx_hash': '0x0'}]
+
+    monkeypatch.setattr(bridges, '_MultiDriver', _Driver(serve))
+
+    transactions = list(bridges.iter_transactions(1, 'ethereum', 'ethereum:0xabc',
+                                                  START, START + DAY - 1, window=DAY))
+
+    # The transaction without a timestamp is kept at the start of its window
+    assert [(transaction['tx_hash'], transaction.get('token')) for transaction in transactions] == [
+        ('0x0', None), ('0x1', 'USDC'), ('0x1', 'USDT')]
+
+
+def test_iter_transactions_raises_failed_windows(monkeypatch):
+    def serve(first, last, limit):
+        if first > START:
+            return ConnectionError('window lost')
+        return [{'ts': first, 'tx_hash': '0x1'}]
+
+    monkeypatch.setattr(bridges, '_MultiDriver', _Driver(serve))
+    transactions = bridges.iter_transactions(1, 'ethereum', 'ethereum:0xabc',
+                                             START, START + 3 * DAY, window=DAY)
+
+    with pytest.raises(ConnectionError):
+        list(transactions)
+
+
+def test_aio_leaves_out_generator_functions():
+    assert inspect.iscoroutinefunction(aio.bridges.get_transactions)
+    assert not hasattr(aio.bridges, 'iter_transactions')
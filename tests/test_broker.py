@@ -0,0 +1,82 @@
+import asyncio
+import pytest
+
+from defillama import coins
+from defillama.broker import PriceBroker
+
+
+@pytest.fixture
+def requested(monkeypatch):
+    requested = []
+
+    def get_current_prices(tokens, search_width='6h', model=False):
+        requested.append(tokens)
+        if any('fail' in address for token in tokens for address in token.values()):
+            raise ConnectionError('unreachable')
+        return {f"{chain}:{address}".lower(): {'price': 1.0}
+                for token in tokens for chain, address in token.items() if 'dead' not in address}
+
+    monkeypatch.setattr(coins, 'get_current_prices', get_current_prices)
+
+    return requested
+
+
+def test_lookups_share_a_request(requested):
+    with PriceBroker(window=0.05) as broker:
+        futures = [broker.submit(token) for token in
+                   ['ethereum:0xA', {'ethereum': '0xb'}, 'ethereum:0xA', 'ethereum:0xdead']]
+        results = [future.result(3) for future in futures]
+
+        assert broker.stats() == {'lookups': 4, 'requests': 1}
+
+    assert len(requested) == 1 and len(requested[0]) == 3
+    # Prices come back lowercased, the unknown token has none
+    assert results == [{'price': 1.0}, {'price': 1.0}, {'price': 1.0}, None]
+
+
+def test_full_batch_is_requested_immediately(requested):
+    with PriceBroker(window=60, max_tokens=2) as broker:
+        futures = [broker.submit(f"ethereum:0x{index}") for index in range(2)]
+
+        assert all(future.result(3) == {'price': 1.0} for future in futures)
+
+
+def test_invalid_tokens_are_rejected(requested):
+    with PriceBroker() as broker:
+        for token in ['ethereum', 'ethereum:', ':0xa', {'ethereum': '0xa', 'bsc': '0xb'}]:
+            with pytest.raises(ValueError):
+                broker.submit(token)
+
+    assert requested == []
+
+
+def test_failed_request_fails_its_batch(requested):
+    with PriceBroker(window=0.05) as broker:
+        futures = [broker.submit('ethereum:0xa'), broker.submit('ethereum:0xfail')]
+
+        for future in futures:
+            with pytest.raises(ConnectionError):
+                future.result(3)
+
+        # The broker keeps serving later batches
+        assert broker.get_price('ethereum:0xa', timeout=3) == {'price': 1.0}
+
+
+def test_close_requests_pending_lookups(requested):
+    broker = PriceBroker(window=60)
+    future = broker.submit('ethereum:0xa')
+    broker.close()
+
+    assert future.result(0) == {'price': 1.0}
+    with pytest.raises(RuntimeError):
+        broker.submit('ethereum:0xa')
+
+
+def test_async_lookups(requested):
+    async def main(broker):
+        return await asyncio.gather(*(broker.get_price_async(f"ethereum:0x{index}") for index in range(3)))
+
+    with PriceBroker(window=0.05) as broker:
+        assert asyncio.run(main(broker)) == [{'price': 1.0}] * 3
+
+    assert len(requested) == 1
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from defillama import tvl
+from defillama.cache import DiskCache, Entry, HTTPCache, MemoryCache
+from defillama.metrics import Recorder
+from defillama.session import Response, Session
+
+
+def _entry(url, size=10, expires=None, headers=None):
+    return Entry(url, b'x' * size, headers or {}, time.time() + 60 if expires is None else expires)
+
+
+def test_ttls():
+    cache = HTTPCache(ttls=[(r'api\.llama\.fi/chains', 5)], default_ttl=7)
+
+    assert cache.ttl('https://api.llama.fi/chains') == 5
+    assert cache.ttl('https://api.llama.fi/protocols') == 300
+    assert cache.ttl('https://coins.llama.fi/block/ethereum/1') == 7 * 86400
+    assert cache.ttl('https://example.com/') == 7
+
+
+@pytest.fixture(params=['memory', 'disk'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryCache(max_bytes=1000)
+    # Entry files also hold their headers
+    return DiskCache(str(tmp_path / 'cache'), max_bytes=1300)
+
+
+def test_backend_lru_eviction(backend):
+    for name in 'abc':
+        backend.set(_entry(f'https://api.llama.fi/{name}', 300))
+        time.sleep(0.01)
+    backend.get('https://api.llama.fi/a')
+    backend.set(_entry('https://api.llama.fi/d', 300))
+
+    assert backend.get('https://api.llama.fi/b') is None
+    assert backend.get('https://api.llama.fi/a').body == b'x' * 300
+    assert backend.evictions == 1 and len(backend) == 3
+    assert backend.size <= backend.max_bytes
+
+    backend.set(_entry('https://api.llama.fi/huge', 2000))
+    assert backend.get('https://api.llama.fi/huge') is None
+
+    backend.clear()
+    assert len(backend) == 0 and backend.get('https://api.llama.fi/a') is None
+
+
+def test_disk_cache_survives_restarts(tmp_path):
+    DiskCache(str(tmp_path)).set(_entry('https://api.llama.fi/a', headers={'etag': '"1"'}))
+
+    entry = DiskCache(str(tmp_path)).get('https://api.llama.fi/a')
+
+    assert entry.headers == {'etag': '"1"'} and entry.body == b'x' * 10
+
+
+def test_revalidation():
+    cache = HTTPCache()
+    url = 'https://api.llama.fi/protocols'
+    cache.store(Response(url, 200, b'[]', {'etag': '"1"', 'server': 'x'}))
+    entry = cache.backend.get(url)
+    entry.expires = 0
+
+    assert cache.lookup(url) is None
+    assert cache.stale(url).validators() == ['If-None-Match: "1"']
+
+    response = cache.revalidated(url, entry, {'etag': '"2"'})
+    assert response.body == b'[]'
+    assert cache.lookup(url).headers == {'etag': '"2"'}
+    assert cache.stats()['revalidated'] == 1
+
+
+def test_session_serves_fresh_responses(api):
+    recorder = Recorder()
+    session = Session(cache=HTTPCache(), observers=[recorder])
+    url = f"{tvl.BASE_URL}/chains"
+    try:
+        first = session.get(url)
+        assert session.get(url) == first
+    finally:
+        session.close()
+
+    assert len(recorder.timings) == 1
+    stats = session.cache.stats()
+    assert (stats['hits'], stats['stores'], stats['entries']) == (1, 1, 1)
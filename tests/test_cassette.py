@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+import pytest
+
+from defillama import aio, batch, tvl
+from defillama.cassette import Cassette, CassetteMiss, use_cassette
+from defillama.retry import RetryPolicy
+from defillama.session import HTTPError
+
+SLUGS = [f'protocol-{number}' for number in range(8)]
+
+
+def _record(path):
+    with use_cassette(str(path), mode='record') as session:
+        for slug in SLUGS:
+            tvl.get_protocols(slug)
+
+    return session
+
+
+def test_aio_follows_cassette_swap(api, session, tmp_path):
+    path = tmp_path / 'protocols.zip'
+    _record(path)
+
+    async def main():
+        await aio.tvl.get_protocols(SLUGS[0])
+        with use_cassette(str(path)):
+            replayed = await aio.tvl.get_protocols(SLUGS[0])
+            with pytest.raises(CassetteMiss):
+                await aio.tvl.get_protocols('unrecorded')
+        return replayed
+
+    assert asyncio.run(main())
+
+
+@pytest.mark.parametrize('mode', ['batch', 'async'])
+def test_replay_latency_overlaps(api, session, tmp_path, mode):
+    path = tmp_path / 'protocols.zip'
+    _record(path)
+
+    async def gather():
+        return await asyncio.gather(*(aio.tvl.get_protocols(slug) for slug in SLUGS))
+
+    with use_cassette(str(path), latency=0.2):
+        start = time.monotonic()
+        if mode == 'batch':
+            results = batch.run([(tvl.get_protocols, (slug,)) for slug in SLUGS])
+        else:
+            results = asyncio.run(gather())
+        elapsed = time.monotonic() - start
+
+    assert len(results) == len(SLUGS) and all(results)
+    assert 0.2 <= elapsed < 0.2 * len(SLUGS) / 2
+
+
+def test_batch_replay_fails_unrecorded_urls_alone(api, session, tmp_path):
+    path = tmp_path / 'protocols.zip'
+    _record(path)
+
+    with use_cassette(str(path)):
+        results = batch.run([(tvl.get_protocols, (SLUGS[0],)), (tvl.get_protocols, ('unrecorded',))],
+                            return_exceptions=True)
+
+    assert results[0]['name']
+    assert isinstance(results[1], CassetteMiss)
+
+
+def test_retryable_statuses_are_not_recorded(api, session, tmp_path):
+    path = tmp_path / 'errors.zip'
+    url = f"{tvl.BASE_URL}/unknown"
+
+    # 404 is final by default, and replayed as such
+    with use_cassette(str(path), mode='record') as recording:
+        with pytest.raises(HTTPError):
+            recording.get(url)
+    with use_cassette(str(path)) as replaying:
+        with pytest.raises(HTTPError):
+            replaying.get(url)
+
+    with use_cassette(str(tmp_path / 'retried.zip'), mode='record',
+                      retry=RetryPolicy(attempts=1, statuses=[404])) as recording:
+        with pytest.raises(HTTPError):
+            recording.get(url)
+        assert url not in recording.cassette
+
+
+def test_streams_record_status_and_headers(api, session, tmp_path):
+    path = tmp_path / 'streams.zip'
+    url = f"{tvl.BASE_URL}/protocols"
+    missing = f"{tvl.BASE_URL}/unknown"
+
+    with use_cassette(str(path), mode='record') as recording:
+        body = b''.join(recording.stream(url))
+        with pytest.raises(HTTPError):
+            b''.join(recording.stream(missing))
+
+    with Cassette(str(path)) as cassette:
+        recorded = cassette.get(url)
+        assert recorded.status == 200 and recorded.body == body
+        assert recorded.headers['content-type'] == 'application/json'
+        assert 'content-encoding' not in recorded.headers
+        assert cassette.get(missing).status == 404
+
+    with use_cassette(str(path)) as replaying:
+        assert b''.join(replaying.stream(url)) == body
+        with pytest.raises(HTTPError):
+            b''.join(replaying.stream(missing))
@@ -0,0 +1,106 @@
+import threading
+import pytest
+
+from defillama import coins, store
+from defillama._utils import join_chunks
+from defillama.metrics import Recorder
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = store.ImmutableStore(str(tmp_path / 'history.db'))
+    previous = store.set_store(history)
+    yield history
+    store.set_store(previous)
+    history.close()
+
+
+@pytest.fixture
+def requested(monkeypatch):
+    requested = []
+
+    def get_coins(prefix, tokens, suffix='', model=False):
+        requested.append(list(tokens))
+        # EVM addresses lowercased, Solana mints as given, no price for
+        # the unknown token
+        return {(token if token.startswith('solana:') else token.lower()): {'price': token}
+                for token in tokens if 'dead' not in token}
+
+    monkeypatch.setattr(coins, '_get_coins', get_coins)
+
+    return requested
+
+
+def test_historical_prices_settle_in_store(history, requested):
+    tokens = [{'ethereum': '0xABC'}, {'ethereum': '0xdead'}]
+    first = coins.get_historical_prices(tokens, 1600000000)
+    second = coins.get_historical_prices(tokens, 1600000000)
+
+    # The missing price is requested again, it may have been a transient
+    # omission
+    assert requested == [['ethereum:0xABC', 'ethereum:0xdead'], ['ethereum:0xdead']]
+    assert first == second == {'ethereum:0xABC': {'price': 'ethereum:0xABC'}}
+
+
+def test_case_sensitive_addresses(history, requested):
+    tokens = [{'solana': 'MintA'}, {'solana': 'minta'}]
+    first = coins.get_historical_prices(tokens, 1600000000)
+    second = coins.get_historical_prices(tokens, 1600000000)
+
+    assert len(requested) == 1
+    assert first == second == {'solana:MintA': {'price': 'solana:MintA'},
+                               'solana:minta': {'price': 'solana:minta'}}
+
+
+def test_unknown_search_width_skips_store(history, requested):
+    tokens = [{'ethereum': '0xabc'}]
+    for _ in range(2):
+        assert coins.get_historical_prices(tokens, 1600000000, search_width='6x')
+
+    assert len(requested) == 2
+
+
+def test_nearest_block_settles_in_store(api, session, history):
+    block = coins.get_nearest_block('ethereum', 1600000000)
+
+    assert history.get('block', 'ethereum@1600000000') == block
+
+
+def test_chunks_fill_the_width():
+    assert list(join_chunks(['aaa', 'bb', 'c'], 6)) == ['aaa,bb', 'c']
+    assert list(join_chunks(['aaa', 'bb', 'c'], 5)) == ['aaa', 'bb,c']
+    # An item longer than the width gets a chunk of its own
+    assert list(join_chunks(['aaaaaaa', 'b'], 5)) == ['aaaaaaa', 'b']
+    assert list(join_chunks([], 5)) == []
+
+
+def test_token_lists_split_at_max_url_length(api, session, monkeypatch):
+    recorder = Recorder()
+    session.observers.append(recorder)
+    monkeypatch.setattr(coins, 'MAX_URL_LENGTH', 200)
+    tokens = [{'ethereum': f"0x{index:040x}"} for index in range(20)]
+
+    prices = coins.get_current_prices(tokens)
+
+    assert sorted(prices) == sorted(f"ethereum:0x{index:040x}" for index in range(20))
+    assert len(recorder.timings) > 1
+    assert all(len(timing.url) <= 200 for timing in recorder.timings)
+
+
+def test_concurrent_token_lists_share_transfers(api, session, monkeypatch):
+    recorder = Recorder()
+    session.observers.append(recorder)
+    monkeypatch.setattr(coins, 'MAX_URL_LENGTH', 200)
+    api.latency = 0.2
+    tokens = [{'ethereum': f"0x{index:040x}"} for index in range(20)]
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(coins.get_current_prices(tokens)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 4 and all(result == results[0] for result in results)
+    assert len(recorder.timings) == len({timing.url for timing in recorder.timings}) > 1
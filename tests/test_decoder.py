@@ -0,0 +1,44 @@
+import math
+
+import pytest
+
+from defillama import decoder
+
+DOCUMENT = b'{"name": "aave", "tvl": 1.5e9, "chains": ["Ethereum"], "listed": true}'
+
+
+@pytest.mark.parametrize('backend', decoder.available_backends())
+def test_backends_agree(backend):
+    assert decoder.loads(DOCUMENT, backend) == decoder.loads(DOCUMENT, 'json')
+    assert decoder.loads(memoryview(DOCUMENT), backend)['tvl'] == 1.5e9
+
+
+@pytest.mark.parametrize('backend', decoder.available_backends())
+def test_fallback_to_stdlib(backend):
+    data = decoder.loads(b'[NaN, 123456789012345678901234567890]', backend)
+
+    assert math.isnan(data[0]) and data[1] == 123456789012345678901234567890
+
+
+def test_invalid_document():
+    with pytest.raises(ValueError):
+        decoder.loads(b'{"a": ')
+
+
+def test_backend_selection():
+    default = decoder.get_backend()
+    assert default == decoder.available_backends()[0]
+
+    with decoder.use_backend('json'):
+        assert decoder.get_backend() == 'json'
+    assert decoder.get_backend() == default
+
+    decoder.set_backend('json')
+    try:
+        assert decoder.get_backend() == 'json'
+    finally:
+        decoder.set_backend()
+    assert decoder.get_backend() == default
+
+    with pytest.raises(ValueError):
+        decoder.set_backend('unknown')
@@ -0,0 +1,53 @@
+import pytest
+
+from defillama import export
+
+pa = pytest.importorskip('pyarrow')
+
+
+def test_fees_revenue_chart_fills_both_columns(api, session, tmp_path):
+    export.export('fees_revenue.chart', str(tmp_path / 'fees'), format='arrow')
+
+    table = pa.dataset.dataset(str(tmp_path / 'fees'), format='ipc').to_table()
+
+    assert table.num_rows > 0
+    assert table.column('fees').null_count == 0
+    assert table.column('revenue').null_count == 0
+
+
+@pytest.mark.parametrize('endpoint', sorted(export.ENDPOINTS))
+def test_endpoints_write_their_declared_schema(api, session, tmp_path, endpoint):
+    kwargs = {'pool': 'pool-1'} if endpoint == 'yields.pool_chart' else {}
+    assert export.export(endpoint, str(tmp_path / 'data'), format='arrow', **kwargs) > 0
+
+    table = pa.dataset.dataset(str(tmp_path / 'data'), format='arrow').to_table()
+
+    assert table.schema == export.schema(export.ENDPOINTS[endpoint].fields)
+
+
+def test_runs_share_a_schema(tmp_path):
+    fields = {'date': 'timestamp', 'value': 'float64'}
+    path = str(tmp_path / 'data')
+    export.write([{'date': 0, 'value': None}], path, 'arrow', fields=fields, infer=False)
+    export.write([{'date': 86400, 'value': 1, 'extra': 'new'}], path, 'arrow', fields=fields, infer=False)
+
+    table = pa.dataset.dataset(path, format='arrow').to_table()
+
+    assert table.schema == export.schema(fields)
+    assert sorted(table.column('value').to_pylist(), key=str) == [1.0, None]
+
+
+def test_write_infers_undeclared_fields(tmp_path):
+    records = [{'name': 'a', 'tvl': 1, 'flag': True, 'tags': ['x']}, {'name': 'b', 'tvl': 2.5}]
+    export.write(records, str(tmp_path / 'data'), fields={'name': 'string'}, partition_by=('name',))
+
+    table = pa.dataset.dataset(str(tmp_path / 'data'), partitioning='hive').to_table()
+
+    assert table.schema.field('tvl').type == pa.float64()
+    assert table.schema.field('flag').type == pa.bool_()
+    assert sorted(table.column('tags').to_pylist(), key=str) == [None, '["x"]']
+
+    with pytest.raises(ValueError):
+        export.write(records, str(tmp_path / 'other'), infer=False)
+    with pytest.raises(ValueError):
+        export.export('tvl.unknown', str(tmp_path / 'other'))
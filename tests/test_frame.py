@@ -0,0 +1,50 @@
+import math
+
+import pytest
+
+from defillama import tvl, yields
+
+np = pytest.importorskip('numpy')
+from defillama.frame import Frame  # noqa: E402
+
+
+def test_from_records():
+    frame = Frame.from_records([{'date': '1600000000', 'tvl': 1.5, 'name': 'a'},
+                                {'date': 1600086400, 'tvl': None, 'name': 'b'},
+                                {'date': 1600172800, 'tvl': '2.5', 'name': 'c'}], 'date')
+
+    assert list(frame) == ['date', 'tvl']
+    assert len(frame) == 3
+    assert frame.time.dtype == np.int64
+    assert frame.time.tolist() == [1600000000, 1600086400, 1600172800]
+    assert frame['tvl'][0] == 1.5 and math.isnan(frame['tvl'][1]) and frame['tvl'][2] == 2.5
+
+
+def test_iso_timestamps():
+    frame = Frame.from_records([{'timestamp': '2022-02-10T23:00:46.000Z', 'apy': 1}], 'timestamp')
+
+    assert frame.time.tolist() == [1644534046]
+
+
+def test_empty_series():
+    frame = Frame.from_records([], 'date', ['tvl'])
+
+    assert len(frame) == 0 and list(frame) == ['date', 'tvl']
+
+
+def test_endpoints_as_arrays(api, session):
+    records = tvl.get_charts('Ethereum')
+    frame = tvl.get_charts('Ethereum', as_arrays=True)
+
+    assert frame.time.tolist() == [int(record['date']) for record in records]
+    assert frame['totalLiquidityUSD'].tolist() == [record['totalLiquidityUSD'] for record in records]
+
+    pool = '747c1d2a-c668-4682-b9f9-296708a3dd90'
+    assert len(yields.get_pool_chart(pool, as_arrays=True)) == len(yields.get_pool_chart(pool))
+
+
+def test_to_arrow():
+    pa = pytest.importorskip('pyarrow')
+    frame = Frame.from_records([{'date': 1, 'tvl': 2.0}], 'date')
+
+    assert frame.to_arrow().equals(pa.table({'date': [1], 'tvl': [2.0]}))
@@ -0,0 +1,78 @@
+import pytest
+
+from defillama.index import ProtocolIndex
+
+PROTOCOLS = [
+    {'slug': 'a', 'tvl': 3, 'chains': ['Ethereum'], 'category': 'Dexes'},
+    {'slug': 'b', 'tvl': 1, 'chains': ['Ethereum'], 'category': 'Lending'},
+    {'slug': 'c', 'tvl': 2, 'chains': ['Solana'], 'category': 'Dexes'},
+]
+
+LISTING = PROTOCOLS + [
+    {'slug': 'd', 'tvl': None, 'mcap': 5e8, 'chains': ['Arbitrum', 'Ethereum'],
+     'category': 'Lending', 'oracles': ['Chainlink', 'Pyth'], 'forkedFrom': ['Aave']},
+    {'slug': 'e', 'tvl': '7', 'mcap': 2e9, 'chains': ['Arbitrum'], 'category': 'Dexes',
+     'oracles': ['Chainlink'], 'forkedFrom': ['Uniswap V2']},
+]
+
+
+def _slugs(rows):
+    return [row['slug'] for row in rows]
+
+
+def test_top():
+    index = ProtocolIndex(PROTOCOLS)
+
+    assert [row['slug'] for row in index.top(2)] == ['a', 'c']
+    assert [row['slug'] for row in index.top(5, chain='Ethereum')] == ['a', 'b']
+    assert [row['slug'] for row in index.top(1, ascending=True)] == ['b']
+
+
+@pytest.mark.parametrize('n', [0, -1])
+def test_top_without_rows(n):
+    index = ProtocolIndex(PROTOCOLS)
+
+    assert index.top(n) == []
+    assert index.top(n, category='Dexes') == []
+
+
+def test_filters_intersect_case_insensitively():
+    index = ProtocolIndex(LISTING)
+
+    assert _slugs(index.filter(chain='ethereum')) == ['a', 'b', 'd']
+    assert _slugs(index.filter(chain='Arbitrum', category='LENDING')) == ['d']
+    assert _slugs(index.filter(oracle=['Pyth', 'chainlink'])) == ['d', 'e']
+    assert _slugs(index.filter(forked_from='Uniswap V2', chain=None)) == ['e']
+    assert index.filter(chain='Base') == []
+    assert len(index.filter()) == len(index) == 5
+    assert index.count(category='Dexes') == 3
+    with pytest.raises(TypeError):
+        index.filter(country='FR')
+
+
+def test_keys_and_counts():
+    index = ProtocolIndex(LISTING)
+
+    assert index.keys('chain') == ['arbitrum', 'ethereum', 'solana']
+    assert index.counts('category') == {'dexes': 3, 'lending': 2}
+    assert index.get('e')['tvl'] == '7'
+    assert index.get('z') is None
+
+
+def test_sorted_fields_skip_missing_values():
+    index = ProtocolIndex(LISTING)
+
+    assert _slugs(index.top(10)) == ['e', 'a', 'c', 'b']
+    assert _slugs(index.top(1, by='mcap', oracle='Chainlink')) == ['e']
+    assert _slugs(index.range('tvl', 2, 3)) == ['c', 'a']
+    assert _slugs(index.range('mcap', low=1e9)) == ['e']
+    assert _slugs(index.range('tvl', high=2, chain='Ethereum')) == ['b']
+
+
+def test_fetch_indexes_the_listing(api, session):
+    index = ProtocolIndex.fetch()
+    slug = index.protocols[0]['slug']
+
+    assert len(index) > 0
+    assert index.get(slug) is index.protocols[0]
+    assert index.count(chain=index.keys('chain')[0]) > 0
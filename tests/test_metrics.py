@@ -0,0 +1,111 @@
+import pytest
+from urllib.parse import urlsplit
+
+from defillama import metrics, tvl
+from defillama.metrics import RequestTiming
+
+
+def _timing(url='https://api.llama.fi/protocol/aave', **options):
+    values = dict(namelookup=0.01, connect=0.02, appconnect=0.05, pretransfer=0.05,
+                  starttransfer=0.25, total=0.35, wire_bytes=100, decoded_bytes=400)
+    values.update(options)
+    return RequestTiming(url, 200, **values)
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://api.llama.fi/protocol/aave', '/protocol/{protocol}'),
+    ('https://api.llama.fi/charts/', '/charts'),
+    ('https://coins.llama.fi/prices/historical/1680000000/coingecko:ethereum',
+     '/prices/historical/{timestamp}/{coins}'),
+    ('http://127.0.0.1:8080/yields.llama.fi/chart/pool-1', '/chart/{pool}'),
+    ('https://api.llama.fi/unknown/a/b', '/unknown/{}/{}'),
+])
+def test_templates(url, expected):
+    assert metrics.template(url) == expected
+
+
+def test_phases_of_fresh_and_reused_connections():
+    phases = _timing().phases
+    assert phases == pytest.approx({'dns': 0.01, 'connect': 0.01, 'tls': 0.03, 'wait': 0.2, 'transfer': 0.1})
+
+    # The handshakes of a reused connection are reported as 0
+    reused = _timing(namelookup=0, connect=0, appconnect=0, pretransfer=0.001, reused=True)
+    assert reused.phases == pytest.approx({'dns': 0, 'connect': 0, 'tls': 0, 'wait': 0.249, 'transfer': 0.1})
+    assert reused.as_dict()['reused'] is True
+
+
+def test_recorder_breakdown():
+    recorder = metrics.Recorder(size=2)
+    first = _timing(observers=[recorder])
+    first.decoded(0.02)
+    for timing in (_timing(total=0.1, starttransfer=0.05), first, _timing(total=0.55)):
+        recorder.transfer(timing)
+
+    # Only the most recent timings are kept
+    assert len(recorder.timings) == 2
+    breakdown = recorder.breakdown()['api.llama.fi/protocol/{protocol}']
+    assert breakdown['requests'] == 2
+    assert breakdown['total'] == pytest.approx(0.45)
+    assert breakdown['decode'] == pytest.approx(0.02)
+
+    recorder.clear()
+    assert recorder.breakdown() == {}
+
+
+def test_session_observers_get_transfers_and_decodes(api, session):
+    recorder = metrics.Recorder()
+    session.observers.append(recorder)
+
+    tvl.get_protocols()
+
+    timing, = recorder.timings
+    assert timing.endpoint == '/protocols' and timing.status == 200
+    assert timing.decode is not None and timing.decode >= 0
+    assert timing.decoded_bytes > 0
+
+
+def test_prometheus_exporter(api, session):
+    prometheus_client = pytest.importorskip('prometheus_client')
+    registry = prometheus_client.CollectorRegistry()
+    session.observers.append(metrics.PrometheusExporter(registry))
+
+    tvl.get_protocols()
+
+    labels = {'host': urlsplit(tvl.BASE_URL).netloc, 'endpoint': '/protocols'}
+    assert registry.get_sample_value('defillama_requests_total', dict(labels, status='200')) == 1
+    assert registry.get_sample_value('defillama_decode_seconds_count', labels) == 1
+    assert registry.get_sample_value('defillama_request_phase_seconds_count', dict(labels, phase='wait')) == 1
+    assert registry.get_sample_value('defillama_response_bytes_total', dict(labels, kind='decoded')) > 0
+
+
+class _Histogram:
+    def __init__(self):
+        self.records = []
+
+    def record(self, value, attributes):
+        self.records.append((value, attributes))
+
+
+class _Meter:
+    def __init__(self):
+        self.histograms = {}
+
+    def create_histogram(self, name, unit='', description=''):
+        return self.histograms.setdefault(name, _Histogram())
+
+
+def test_opentelemetry_exporter():
+    pytest.importorskip('opentelemetry')
+    meter = _Meter()
+    exporter = metrics.OpenTelemetryExporter(meter)
+    timing = _timing(observers=[exporter])
+
+    exporter.transfer(timing)
+    timing.decoded(0.02)
+
+    duration, = meter.histograms['http.client.request.duration'].records
+    assert duration == (0.35, {'server.address': 'api.llama.fi', 'url.template': '/protocol/{protocol}',
+                               'http.request.method': 'GET', 'http.response.status_code': 200})
+    assert len(meter.histograms['defillama.request.phase.duration'].records) == len(metrics.PHASES)
+    assert meter.histograms['defillama.decode.duration'].records[0][0] == 0.02
+    assert meter.histograms['http.client.response.body.size'].records[0][0] == 100
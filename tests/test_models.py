@@ -0,0 +1,50 @@
+import pytest
+
+from defillama import coins, models, tvl, yields
+
+
+def test_decode_list():
+    pools = models.decode(b'{"data": [{"pool": "a", "tvlUsd": 1, "unknown": 2}]}',
+                          models.Pool, ('data',))
+
+    assert [(pool.pool, pool.tvlUsd, pool.chain) for pool in pools] == [('a', 1, None)]
+
+
+def test_decode_unexpected_container_falls_back():
+    pools = models.decode(b'{"data": {"k": {"pool": "a"}}}', models.Pool, ('data',))
+
+    assert pools['k'].pool == 'a'
+
+
+def test_decode_without_records():
+    with pytest.raises(ValueError):
+        models.decode(b'{"data": "none"}', models.Pool, ('data',))
+
+
+@pytest.mark.parametrize('call, model', [
+    (lambda **kwargs: yields.get_pools(**kwargs), models.Pool),
+    (lambda **kwargs: tvl.get_protocols(**kwargs), models.Protocol),
+    (lambda **kwargs: tvl.get_chains(**kwargs), models.Chain),
+])
+def test_endpoints_return_records_matching_dicts(api, session, call, model):
+    records, dicts = call(model=True), call()
+
+    assert len(records) == len(dicts) > 0
+    assert all(isinstance(record, model) for record in records)
+    # Known fields match, unknown ones are dropped
+    assert models.asdict(records[0]) == {name: dicts[0].get(name) for name in models.asdict(records[0])}
+
+
+def test_prices_are_records_keyed_by_coin(api, session):
+    tokens = [{'coingecko': 'ethereum'}, {'coingecko': 'bitcoin'}]
+    quotes = coins.get_current_prices(tokens, model=True)
+
+    assert sorted(quotes) == ['coingecko:bitcoin', 'coingecko:ethereum']
+    assert all(isinstance(quote, models.PriceQuote) and quote.price for quote in quotes.values())
+
+
+def test_convert_roundtrips_through_dicts():
+    pools = models.convert({'a': {'pool': 'a', 'tvlUsd': 1.5, 'extra': 1}}, models.Pool)
+
+    assert models.asdict(pools['a'])['tvlUsd'] == 1.5
+    assert models.from_dict(models.asdict(pools['a']), models.Pool) == pools['a']
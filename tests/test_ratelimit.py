@@ -0,0 +1,96 @@
+import pytest
+
+from defillama import tvl
+from defillama.batch import _MultiDriver
+from defillama.ratelimit import RateLimiter
+from defillama.session import Session
+
+
+def _limits(limiter, url):
+    return limiter._host(url.split('/')[2])[1]
+
+
+def test_cancel_releases_without_congestion():
+    limiter = RateLimiter(concurrency=8)
+    url = 'https://api.llama.fi/protocols'
+    assert limiter.admit(url) == 0
+
+    limiter.cancel(url)
+
+    limit = _limits(limiter, url)
+    assert (limit.in_flight, limit.limit) == (0, 8)
+
+
+def test_failed_transfer_is_congestion():
+    limiter = RateLimiter(concurrency=8)
+    url = 'https://api.llama.fi/protocols'
+    limiter.admit(url)
+
+    limiter.done(url, None)
+
+    assert _limits(limiter, url).limit == 4
+
+
+def test_hedge_loser_is_not_congestion(api):
+    url = f"{tvl.BASE_URL}/protocols"
+    limiter = RateLimiter(default_rate=1000, concurrency=8)
+    session = Session(hedge=True, limiter=limiter)
+    for _ in range(session.latency.min_samples):
+        session.latency.record(url, 0.001)
+
+    api.latency = 0.1
+    try:
+        assert session.request(url).status == 200
+    finally:
+        session.close()
+
+    limit = _limits(limiter, url)
+    assert limit.in_flight == 0
+    assert limit.limit >= 8
+
+
+def test_abandoned_stream_and_batch_are_not_congestion(api):
+    url = f"{tvl.BASE_URL}/protocols"
+    limiter = RateLimiter(default_rate=1000, concurrency=8)
+    session = Session(limiter=limiter)
+    try:
+        stream = session.stream(url)
+        next(stream)
+        stream.close()
+
+        api.latency = 0.2
+        driver = _MultiDriver(session, 4)
+        for day in range(4):
+            driver.add(f"{tvl.BASE_URL}/protocol/aave?day={day}")
+        driver._start()
+        driver.close()
+    finally:
+        session.close()
+
+    limit = _limits(limiter, url)
+    assert limit.in_flight == 0
+    assert limit.limit >= 8
+
+
+def test_admission_is_given_back_when_no_transfer_starts(api, monkeypatch):
+    url = f"{tvl.BASE_URL}/protocols"
+    limiter = RateLimiter(default_rate=1000, concurrency=8)
+    session = Session(limiter=limiter)
+
+    def prepare(curl, url, write=None):
+        raise ValueError('bad option')
+
+    monkeypatch.setattr(session, 'prepare', prepare)
+    with pytest.raises(ValueError):
+        session.request(url)
+    with pytest.raises(ValueError):
+        next(session.stream(url))
+
+    # A closed session has no handle to give
+    session.close()
+    with pytest.raises(RuntimeError):
+        session.request(url)
+
+    limit = _limits(limiter, url)
+    assert limit.in_flight == 0
+    assert limit.limit >= 8
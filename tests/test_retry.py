@@ -0,0 +1,80 @@
+import time
+import pycurl
+import pytest
+from email.utils import formatdate
+
+from defillama import retry
+from defillama.retry import DeadlineExceeded, LatencyTracker, RetryPolicy
+from defillama.session import Response
+
+URL = 'https://api.llama.fi/protocols'
+
+
+def _response(status, **headers):
+    return Response(URL, status, b'', headers)
+
+
+def test_backoff_is_bounded_and_attempts_counted():
+    policy = RetryPolicy(attempts=4, backoff=1, max_backoff=3)
+    error = pycurl.error(7, 'connection refused')
+
+    assert 0 <= policy.delay(0, error=error) <= 1
+    assert 0 <= policy.delay(2, error=error) <= 3
+    assert policy.delay(3, error=error) is None
+
+
+def test_only_transient_failures_are_retried():
+    policy = RetryPolicy()
+
+    assert policy.delay(0, error=pycurl.error(3, 'malformed url')) is None
+    assert policy.delay(0, response=_response(404)) is None
+    assert policy.delay(0, response=_response(200)) is None
+    assert policy.delay(0, response=_response(503)) is not None
+
+
+def test_retry_after_is_capped_at_max_backoff():
+    policy = RetryPolicy(backoff=0, max_backoff=5)
+
+    assert policy.delay(0, response=_response(429, **{'retry-after': '2'})) == 2
+    assert policy.delay(0, response=_response(429, **{'retry-after': '3600'})) == 5
+
+
+def test_retry_after_past_the_deadline_gives_up():
+    policy = RetryPolicy(backoff=0)
+
+    with retry.deadline(1):
+        assert policy.delay(0, response=_response(429, **{'retry-after': '0.5'})) == 0.5
+        assert policy.delay(0, response=_response(429, **{'retry-after': '10'})) is None
+
+
+def test_retry_after_header_forms():
+    assert retry.retry_after({'retry-after': '1.5'}) == 1.5
+    assert retry.retry_after({'retry-after': '-3'}) == 0
+    assert 55 < retry.retry_after({'retry-after': formatdate(time.time() + 60, usegmt=True)}) <= 60
+    assert retry.retry_after({'retry-after': 'soon'}) is None
+    assert retry.retry_after({}) is None
+
+
+def test_nested_deadlines_cannot_extend():
+    assert retry.remaining() is None
+
+    with retry.deadline(1):
+        with retry.deadline(60):
+            assert retry.remaining() <= 1
+        with retry.deadline(0):
+            with pytest.raises(DeadlineExceeded):
+                retry.check_deadline(URL)
+
+    assert retry.remaining() is None
+
+
+def test_hedge_threshold_needs_samples():
+    tracker = LatencyTracker(min_samples=10, quantile=0.9)
+    for index in range(9):
+        tracker.record(URL, index / 10)
+    assert tracker.threshold(URL) is None
+
+    tracker.record(URL, 0.9)
+    assert tracker.threshold(URL) == 0.9
+    # Other endpoints have their own latencies
+    assert tracker.threshold('https://api.llama.fi/protocol/aave') is None
@@ -0,0 +1,146 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+import pytest
+
+from defillama import tvl
+from defillama.retry import DeadlineExceeded, deadline
+from defillama.session import BandwidthStats, HTTPError, Session, get_session, set_session
+
+
+def _in_thread(func):
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = func()
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+
+    return thread, outcome
+
+
+def test_get_decodes_json(api, session):
+    chains = session.get(f"{tvl.BASE_URL}/chains")
+
+    assert isinstance(chains, list) and chains
+
+
+def test_error_status_raises(api, session):
+    with pytest.raises(HTTPError) as info:
+        session.get(f"{tvl.BASE_URL}/unknown")
+
+    assert info.value.response.status == 404
+
+
+def test_handles_are_pooled_per_host(api):
+    session = Session(pool_size=1)
+    url = f"{tvl.BASE_URL}/chains"
+    try:
+        curl = session.acquire(url)
+        session.release(url, curl)
+        assert session.acquire(url) is curl
+
+        other = session.acquire(url)
+        assert other is not curl
+        session.release(url, curl)
+        session.release(url, other)
+        assert session._pools[urlsplit(url).netloc] == [curl]
+    finally:
+        session.close()
+
+    with pytest.raises(RuntimeError):
+        session.acquire(url)
+
+
+def test_module_functions_use_the_shared_session(api):
+    session = Session()
+    previous = set_session(session)
+    try:
+        assert get_session() is session
+        assert tvl.get_chains()
+        assert session._pools
+    finally:
+        set_session(previous)
+        session.close()
+
+
+def test_single_flight_shares_transfer(api, session):
+    api.latency = 0.2
+    url = f"{tvl.BASE_URL}/protocols"
+    threads = [_in_thread(lambda: session.request(url)) for _ in range(4)]
+    for thread, _ in threads:
+        thread.join()
+
+    responses = [outcome['result'] for _, outcome in threads]
+    assert all(response is responses[0] for response in responses)
+
+
+def test_single_flight_follower_keeps_own_deadline(api, session):
+    api.latency = 0.5
+    url = f"{tvl.BASE_URL}/protocols"
+    leader, outcome = _in_thread(lambda: session.request(url))
+    time.sleep(0.05)
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded), deadline(0.1):
+        session.request(url)
+    assert time.monotonic() - start < 0.3
+
+    leader.join()
+    assert outcome['result'].status == 200
+
+
+def test_single_flight_follower_takes_over(api, session):
+    api.latency = 0.3
+    url = f"{tvl.BASE_URL}/protocols"
+
+    def lead():
+        with deadline(0.1):
+            return session.request(url)
+
+    leader, outcome = _in_thread(lead)
+    time.sleep(0.05)
+    response = session.request(url)
+    leader.join()
+
+    assert isinstance(outcome['error'], DeadlineExceeded)
+    assert response.status == 200
+
+
+def test_bandwidth_stats_by_endpoint():
+    stats = BandwidthStats()
+    stats.record('https://api.llama.fi/protocols', 100, 400, 'gzip')
+    stats.record('https://api.llama.fi/protocols?x=1', 50, 50, 'identity')
+    stats.record('https://api.llama.fi/chains', 10, 10)
+
+    assert stats.stats() == {
+        'api.llama.fi/protocols': {'requests': 2, 'compressed': 1, 'wire_bytes': 150,
+                                   'decoded_bytes': 450, 'ratio': 150 / 450},
+        'api.llama.fi/chains': {'requests': 1, 'compressed': 0, 'wire_bytes': 10,
+                                'decoded_bytes': 10, 'ratio': 1.0},
+    }
+
+    stats.reset()
+    assert stats.stats() == {}
+
+
+@pytest.mark.parametrize('compression', [True, False])
+def test_compressed_responses_are_decoded(api, compression):
+    url = f"{tvl.BASE_URL}/protocols"
+    with Session(compression=compression) as session:
+        response = session.request(url)
+        stats, = session.bandwidth.stats().values()
+
+    assert response.json()[0]['slug']
+    assert stats['decoded_bytes'] == len(response.body)
+    if compression:
+        assert stats['compressed'] == 1
+        assert stats['wire_bytes'] < stats['decoded_bytes'] / 2
+    else:
+        assert stats['compressed'] == 0
+        assert stats['wire_bytes'] == stats['decoded_bytes']
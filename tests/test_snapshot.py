@@ -0,0 +1,88 @@
+import math
+import os
+import pytest
+
+from defillama import snapshot
+
+FIELDS = {'pool': 'text', 'chain': 'text', 'tvlUsd': 'float', 'stablecoin': 'bool', 'rewardTokens': 'json'}
+
+POOLS = [
+    {'pool': 'p1', 'chain': 'Ethereum', 'tvlUsd': 10.5, 'stablecoin': True, 'rewardTokens': ['0xa']},
+    {'pool': 'p2', 'chain': 'Arbitrum', 'tvlUsd': None, 'stablecoin': False, 'rewardTokens': None},
+    {'pool': 'p3', 'chain': 'Ethereum', 'tvlUsd': 3, 'rewardTokens': []},
+    {'pool': 'p4', 'chain': None, 'tvlUsd': 'n/a', 'stablecoin': None},
+]
+
+
+@pytest.fixture
+def pools(tmp_path):
+    path = str(tmp_path / 'pools.snap')
+    snapshot.write(POOLS, path, FIELDS, indexed=('pool', 'chain'))
+    with snapshot.Snapshot(path) as pools:
+        yield pools
+
+
+def test_rows_roundtrip(pools):
+    assert len(pools) == 4
+    assert pools.row(0) == POOLS[0]
+    assert pools.get('p3') == {'pool': 'p3', 'chain': 'Ethereum', 'tvlUsd': 3.0,
+                               'stablecoin': None, 'rewardTokens': []}
+    assert pools.get('p4')['chain'] is None
+    assert pools.get('p2')['tvlUsd'] is None
+    assert pools.get('missing') is None
+    assert [pool['pool'] for pool in pools] == ['p1', 'p2', 'p3', 'p4']
+    with pytest.raises(IndexError):
+        pools.row(4)
+
+
+def test_lookups_by_indexed_field(pools):
+    assert list(pools.lookup('chain', 'Ethereum')) == [0, 2]
+    assert [pool['pool'] for pool in pools.find('chain', 'Arbitrum')] == ['p2']
+    assert pools.find('chain', 'Base') == []
+    assert pools.values('chain') == ['Arbitrum', 'Ethereum']
+    assert pools.values('pool', prefix='p') == ['p1', 'p2', 'p3', 'p4']
+    assert pools.values('chain', prefix='E') == ['Ethereum']
+    with pytest.raises(KeyError):
+        pools.lookup('tvlUsd', '1')
+
+
+def test_numeric_columns(pools):
+    tvl = pools.column('tvlUsd')
+    stable = pools.column('stablecoin')
+
+    assert tvl[0] == 10.5 and math.isnan(tvl[1]) and math.isnan(tvl[3])
+    assert list(stable) == [1, 0, -1, -1]
+    with pytest.raises(KeyError):
+        pools.column('chain')
+
+
+def test_reload_picks_up_a_new_file(pools):
+    assert not pools.reload()
+
+    snapshot.write(POOLS[:1], pools.path, FIELDS, indexed=('pool',))
+    # Make sure the replacement is seen even within the timestamp resolution
+    os.utime(pools.path, ns=(0, 0))
+
+    assert pools.reload()
+    assert len(pools) == 1
+
+
+def test_invalid_files_are_rejected(tmp_path):
+    path = tmp_path / 'other.snap'
+    path.write_bytes(b'0' * 64)
+
+    with pytest.raises(ValueError):
+        snapshot.Snapshot(str(path))
+    with pytest.raises(ValueError):
+        snapshot.write(POOLS, str(tmp_path / 'pools.snap'), FIELDS, indexed=('tvlUsd',))
+
+
+def test_build_from_the_api(api, session, tmp_path):
+    path = str(tmp_path / 'pools.snap')
+    count = snapshot.build(path)
+
+    with snapshot.Snapshot(path) as pools:
+        assert len(pools) == count > 0
+        first = pools.row(0)
+        assert pools.get(first['pool'])['pool'] == first['pool']
+        assert first in pools.find('chain', first['chain'])
@@ -0,0 +1,36 @@
+import time
+
+from defillama import store
+
+
+def test_settled():
+    assert store.settled(time.time() - store.SETTLED_AFTER - 10)
+    assert not store.settled(time.time() - store.SETTLED_AFTER + 10)
+
+
+def test_values_roundtrip(tmp_path):
+    path = str(tmp_path / 'nested' / 'history.db')
+    history = store.ImmutableStore(path)
+    history.put('block', 'ethereum@1', {'height': 1, 'timestamp': 1})
+    history.put_many('price', [(str(key), key / 2) for key in range(1200)])
+    history.put('block', 'ethereum@1', {'height': 2, 'timestamp': 1})
+    history.close()
+
+    history = store.ImmutableStore(path)
+    try:
+        assert history.get('block', 'ethereum@1') == {'height': 2, 'timestamp': 1}
+        assert history.get('price', 'ethereum@1') is None
+        found = history.get_many('price', [str(key) for key in range(0, 1300, 100)])
+        assert found == {str(key): key / 2 for key in range(0, 1200, 100)}
+    finally:
+        history.close()
+
+
+def test_set_store_returns_previous(tmp_path):
+    history = store.ImmutableStore(str(tmp_path / 'history.db'))
+    previous = store.set_store(history)
+    try:
+        assert store.get_store() is history
+    finally:
+        assert store.set_store(previous) is history
+        history.close()
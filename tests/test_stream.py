@@ -0,0 +1,61 @@
+import json
+from json import JSONDecodeError
+
+import pytest
+
+from benchmarks import fixtures
+from defillama._stream import ItemParser
+
+DOCUMENTS = [
+    ((), b'[1500.25, 3, -0.5e-3, 1E+2, 0, -7]'),
+    ((), b' [ {"a": [1, {"b": null}], "c": "d"} , true,false , "\\u00e9\\"\\\\", "\xc3\xa9\xe2\x82\xac"] '),
+    ((), b'[]'),
+    (('data',), b'{"status": 1.25e3, "skip": {"data": [9]}, "data": [{"x": 1.5}, 2.75, [3]], "after": 4.5}'),
+    (('data',), b'{"status": "success", "data": []}'),
+    (('a', 'b'), b'{"x": -12.5, "a": {"y": [1.0, 2e5], "b": [10.01, 20]}}'),
+]
+
+
+def _parse(chunks, path):
+    parser = ItemParser(path)
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    items.extend(parser.close())
+
+    return items
+
+
+def _expected(document, path):
+    value = json.loads(document)
+    for key in path:
+        value = value[key]
+
+    return value
+
+
+@pytest.mark.parametrize('path, document', DOCUMENTS)
+def test_every_split(path, document):
+    expected = _expected(document, path)
+
+    for offset in range(len(document) + 1):
+        assert _parse([document[:offset], document[offset:]], path) == expected, offset
+    assert _parse([document[offset:offset + 1] for offset in range(len(document))], path) == expected
+
+
+def test_payload_in_small_chunks():
+    document = fixtures.payload('api.llama.fi', '/protocols', {}, 0.01)
+    expected = json.loads(document)
+
+    for size in (1, 7, 4096):
+        chunks = [document[start:start + size] for start in range(0, len(document), size)]
+        assert _parse(chunks, ()) == expected
+
+
+def test_missing_path():
+    assert _parse([b'{"status": "ok", "other": [1]}'], ('data',)) == []
+
+
+def test_truncated_document():
+    with pytest.raises(JSONDecodeError):
+        _parse([b'[1, 2'], ())
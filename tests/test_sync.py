@@ -0,0 +1,74 @@
+import pytest
+
+from defillama.sync import ProtocolSync
+
+DAY = 86400
+
+
+@pytest.fixture
+def store(tmp_path):
+    with ProtocolSync(str(tmp_path / 'protocols.db')) as store:
+        yield store
+
+
+def _payload(*points, **chains):
+    return {'name': 'Aave', 'tvl': [{'date': date, 'totalLiquidityUSD': value} for date, value in points],
+            'chainTvls': {chain: {'tvl': [{'date': date, 'totalLiquidityUSD': value} for date, value in series]}
+                          for chain, series in chains.items()}}
+
+
+def test_update_appends_new_points(store):
+    assert store.update('aave', _payload((0, 1), (DAY, 2), Ethereum=[(0, 1)])) == 3
+    # The point of the last stored day moved, one day was added
+    assert store.update('aave', _payload((0, 1), (DAY + 60, 3), (2 * DAY, 4))) == 2
+
+    assert store.series('aave') == [{'date': 0, 'totalLiquidityUSD': 1},
+                                     {'date': DAY + 60, 'totalLiquidityUSD': 3},
+                                     {'date': 2 * DAY, 'totalLiquidityUSD': 4}]
+    assert store.series('aave', since=DAY + 61) == [{'date': 2 * DAY, 'totalLiquidityUSD': 4}]
+    assert store.series_names('aave') == ['chainTvls.Ethereum.tvl', 'tvl']
+    assert store.metadata('aave') == {'name': 'Aave'}
+    assert store.protocols() == ['aave']
+
+
+def test_duplicate_dates_keep_the_last_point(store):
+    assert store.update('aave', _payload((0, 1), (DAY, 2), (DAY, 3))) == 2
+
+    assert store.series('aave')[-1] == {'date': DAY, 'totalLiquidityUSD': 3}
+
+
+def test_failed_update_leaves_the_store_unchanged(store):
+    store.update('aave', _payload((0, 1)))
+
+    with pytest.raises(ValueError):
+        store.update('aave', _payload((DAY, 2), ('yesterday', 3)))
+
+    assert store.series('aave') == [{'date': 0, 'totalLiquidityUSD': 1}]
+
+
+def test_changed_follows_the_listing(store):
+    listing = [{'slug': 'aave', 'tvl': 10, 'change_1d': 1}, {'slug': 'uniswap', 'tvl': 5, 'change_1d': 0}]
+
+    assert store.changed(listing) == ['aave', 'uniswap']
+    store.update('aave', _payload((0, 1)))
+    store.update('uniswap', _payload((0, 1)))
+    assert store.changed(listing) == []
+
+    listing[0]['tvl'] = 11
+    assert store.changed(listing) == ['aave']
+
+
+def test_sync_reports_errors_per_protocol(api, session, store, monkeypatch):
+    update = store.update
+
+    def failing(slug, payload):
+        if slug == 'uniswap':
+            raise ValueError('bad point')
+        return update(slug, payload)
+
+    monkeypatch.setattr(store, 'update', failing)
+    results = store.sync(['aave', 'uniswap'])
+
+    assert isinstance(results['aave'], int) and results['aave'] > 0
+    assert isinstance(results['uniswap'], ValueError)
+    assert store.protocols() == ['aave']